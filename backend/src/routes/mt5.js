@@ -478,12 +478,12 @@ router.delete('/accounts/:id', async (req, res) => {
 // ================================================================================
 // GET /api/mt5/accounts/:id/history
 // ================================================================================
-// Busca histórico de snapshots
+// Busca histórico de snapshots (brutos ou agregados via ?resolution=1m|1h|1d)
 
 router.get('/accounts/:id/history', async (req, res) => {
   try {
     const { id } = req.params;
-    const { walletAddress, limit = 100 } = req.query;
+    const { walletAddress, limit = 100, resolution } = req.query;
 
     if (!walletAddress) {
       return res.status(400).json({ error: 'walletAddress required' });
@@ -512,6 +512,19 @@ router.get('/accounts/:id/history', async (req, res) => {
       return res.status(404).json({ error: 'Account not found or not owned by user' });
     }
 
+    // Histórico agregado (1m/1h/1d) gerado pelo snapshot_rollup.py
+    if (['1m', '1h', '1d'].includes(resolution)) {
+      const bars = await prisma.accountSnapshotRollup.findMany({
+        where: { tradingAccountId: id, resolution },
+        orderBy: { bucketStart: 'desc' },
+        take: parseInt(limit)
+      });
+
+      console.log(`✅ [GET /mt5/accounts/${id}/history] Encontradas ${bars.length} barras (${resolution})`);
+
+      return res.json({ resolution, bars });
+    }
+
     // Busca snapshots
     const snapshots = await prisma.accountSnapshot.findMany({
       where: { tradingAccountId: id },
@@ -563,6 +576,82 @@ router.get('/stats', async (req, res) => {
   }
 });
 
+// ================================================================================
+// SYNC HELPER
+// ================================================================================
+// Aplica um payload do coletor: atualiza a conta e grava um snapshot.
+// Retorna a conta atualizada ou null se a conta não existe.
+//
+// collectedAt (opcional, ISO): instante da coleta. Payloads reenviados pela
+// outbox do coletor chegam atrasados: o snapshot fica com o horário da
+// coleta e a conta só é atualizada se o payload for mais novo que o último.
+
+async function syncAccount(payload) {
+  const { accountId, balance, equity, margin, freeMargin, marginLevel, openTrades, openPL, dayPL, weekPL, monthPL, totalPL } = payload;
+
+  const parsedCollectedAt = payload.collectedAt ? new Date(payload.collectedAt) : null;
+  const collectedAt = parsedCollectedAt && !isNaN(parsedCollectedAt) ? parsedCollectedAt : new Date();
+
+  // Busca conta pelo ID
+  const account = await prisma.tradingAccount.findUnique({
+    where: { id: accountId }
+  });
+
+  if (!account) {
+    return null;
+  }
+
+  const snapshotData = {
+    tradingAccountId: accountId,
+    capturedAt: collectedAt,
+    balance: String(balance),
+    equity: String(equity),
+    margin: String(margin || 0),
+    freeMargin: String(freeMargin || 0),
+    marginLevel: String(marginLevel || 0),
+    openTrades: parseInt(openTrades || 0),
+    openPL: String(openPL || 0),
+    dayPL: String(dayPL || 0),
+    weekPL: String(weekPL || 0),
+    monthPL: String(monthPL || 0),
+    totalPL: String(totalPL || 0)
+  };
+
+  // Payload antigo (reenvio): só entra no histórico
+  if (account.lastSnapshotAt && collectedAt < account.lastSnapshotAt) {
+    await prisma.accountSnapshot.create({ data: snapshotData });
+    return account;
+  }
+
+  // Atualiza dados da conta
+  const updatedAccount = await prisma.tradingAccount.update({
+    where: { id: accountId },
+    data: {
+      balance: balance !== undefined ? String(balance) : account.balance,
+      equity: equity !== undefined ? String(equity) : account.equity,
+      margin: margin !== undefined ? String(margin) : account.margin,
+      freeMargin: freeMargin !== undefined ? String(freeMargin) : account.freeMargin,
+      marginLevel: marginLevel !== undefined ? String(marginLevel) : account.marginLevel,
+      openTrades: openTrades !== undefined ? parseInt(openTrades) : account.openTrades,
+      openPL: openPL !== undefined ? String(openPL) : account.openPL,
+      dayPL: dayPL !== undefined ? String(dayPL) : account.dayPL,
+      weekPL: weekPL !== undefined ? String(weekPL) : account.weekPL,
+      monthPL: monthPL !== undefined ? String(monthPL) : account.monthPL,
+      totalPL: totalPL !== undefined ? String(totalPL) : account.totalPL,
+      status: 'CONNECTED',
+      connected: true,
+      lastHeartbeat: new Date(),
+      lastSnapshotAt: collectedAt,
+      lastError: null
+    }
+  });
+
+  // Criar snapshot
+  await prisma.accountSnapshot.create({ data: snapshotData });
+
+  return updatedAccount;
+}
+
 // ================================================================================
 // POST /api/mt5/sync
 // ================================================================================
@@ -570,7 +659,7 @@ router.get('/stats', async (req, res) => {
 
 router.post('/sync', async (req, res) => {
   try {
-    const { accountId, balance, equity, margin, freeMargin, marginLevel, openTrades, openPL, dayPL, weekPL, monthPL, totalPL } = req.body;
+    const { accountId, balance, equity } = req.body;
 
     console.log(`🔄 [POST /mt5/sync] Sincronizando conta ${accountId}`);
 
@@ -579,56 +668,12 @@ router.post('/sync', async (req, res) => {
       return res.status(400).json({ error: 'accountId is required' });
     }
 
-    // Busca conta pelo ID
-    const account = await prisma.tradingAccount.findUnique({
-      where: { id: accountId }
-    });
+    const updatedAccount = await syncAccount(req.body);
 
-    if (!account) {
+    if (!updatedAccount) {
       return res.status(404).json({ error: 'Account not found' });
     }
 
-    // Atualiza dados da conta
-    const updatedAccount = await prisma.tradingAccount.update({
-      where: { id: accountId },
-      data: {
-        balance: balance !== undefined ? String(balance) : account.balance,
-        equity: equity !== undefined ? String(equity) : account.equity,
-        margin: margin !== undefined ? String(margin) : account.margin,
-        freeMargin: freeMargin !== undefined ? String(freeMargin) : account.freeMargin,
-        marginLevel: marginLevel !== undefined ? String(marginLevel) : account.marginLevel,
-        openTrades: openTrades !== undefined ? parseInt(openTrades) : account.openTrades,
-        openPL: openPL !== undefined ? String(openPL) : account.openPL,
-        dayPL: dayPL !== undefined ? String(dayPL) : account.dayPL,
-        weekPL: weekPL !== undefined ? String(weekPL) : account.weekPL,
-        monthPL: monthPL !== undefined ? String(monthPL) : account.monthPL,
-        totalPL: totalPL !== undefined ? String(totalPL) : account.totalPL,
-        status: 'CONNECTED',
-        connected: true,
-        lastHeartbeat: new Date(),
-        lastSnapshotAt: new Date(),
-        lastError: null
-      }
-    });
-
-    // Criar snapshot
-    await prisma.accountSnapshot.create({
-      data: {
-        tradingAccountId: accountId,
-        balance: String(balance),
-        equity: String(equity),
-        margin: String(margin || 0),
-        freeMargin: String(freeMargin || 0),
-        marginLevel: String(marginLevel || 0),
-        openTrades: parseInt(openTrades || 0),
-        openPL: String(openPL || 0),
-        dayPL: String(dayPL || 0),
-        weekPL: String(weekPL || 0),
-        monthPL: String(monthPL || 0),
-        totalPL: String(totalPL || 0)
-      }
-    });
-
     console.log(`✅ [POST /mt5/sync] Conta ${accountId} atualizada - Balance: $${balance}, Equity: $${equity}`);
 
     res.json({
@@ -648,6 +693,68 @@ router.post('/sync', async (req, res) => {
   }
 });
 
+// ================================================================================
+// POST /api/mt5/sync/batch
+// ================================================================================
+// Recebe vários payloads do coletor em uma única requisição (aceita gzip).
+// Cada item é aplicado de forma independente; a resposta traz o resultado
+// por conta para o coletor reenviar só o que falhou.
+
+const SYNC_BATCH_MAX_ITEMS = 500;
+
+router.post('/sync/batch', async (req, res) => {
+  try {
+    const { items } = req.body;
+
+    if (!Array.isArray(items)) {
+      return res.status(400).json({ error: 'items must be an array' });
+    }
+
+    if (items.length > SYNC_BATCH_MAX_ITEMS) {
+      return res.status(413).json({ error: `Batch too large (max ${SYNC_BATCH_MAX_ITEMS} items)` });
+    }
+
+    console.log(`🔄 [POST /mt5/sync/batch] Sincronizando ${items.length} conta(s)`);
+
+    const results = [];
+
+    for (const item of items) {
+      const accountId = item && item.accountId;
+
+      if (!accountId) {
+        results.push({ accountId: null, success: false, status: 400, error: 'accountId is required' });
+        continue;
+      }
+
+      try {
+        const updatedAccount = await syncAccount(item);
+
+        if (updatedAccount) {
+          results.push({ accountId, success: true, status: 200 });
+        } else {
+          results.push({ accountId, success: false, status: 404, error: 'Account not found' });
+        }
+      } catch (error) {
+        console.error(`❌ [POST /mt5/sync/batch] Conta ${accountId}:`, error.message);
+        results.push({ accountId, success: false, status: 500, error: error.message });
+      }
+    }
+
+    const synced = results.filter(result => result.success).length;
+    console.log(`✅ [POST /mt5/sync/batch] ${synced}/${items.length} conta(s) atualizada(s)`);
+
+    res.json({
+      success: synced === items.length,
+      synced,
+      results
+    });
+
+  } catch (error) {
+    console.error(`❌ [POST /mt5/sync/batch] Error:`, error);
+    res.status(500).json({ error: 'Failed to sync batch', details: error.message });
+  }
+});
+
 // ================================================================================
 // GET /api/mt5/brokers
 // ================================================================================
@@ -768,24 +875,51 @@ router.get('/brokers/:id/servers', async (req, res) => {
 // GET /api/mt5/accounts/all
 // ================================================================================
 // Retorna TODAS as contas MT5 com credenciais para o carrossel collector
+//
+// ETag = hash dos campos do roster (inclui a senha criptografada, sem
+// descriptografar). Coletor envia If-None-Match: roster sem mudança
+// responde 304 sem corpo e sem descriptografar nenhuma senha.
+
+function rosterEtag(accounts) {
+  const hash = crypto.createHash('sha1');
+  for (const account of accounts) {
+    hash.update(JSON.stringify([
+      account.id,
+      account.login,
+      account.server,
+      account.platform,
+      account.brokerName,
+      account.accountAlias,
+      account.credentials ? account.credentials.encryptedPassword : null
+    ]));
+  }
+  return `"${hash.digest('hex')}"`;
+}
 
 router.get('/accounts/all', async (req, res) => {
   try {
-    console.log(`📋 [GET /mt5/accounts/all] Buscando TODAS as contas para carrossel`);
-
-    // Busca todas as contas
+    // Busca todas as contas (com credenciais na mesma query)
     const accounts = await prisma.tradingAccount.findMany({
-      orderBy: { createdAt: 'asc' }
+      orderBy: { createdAt: 'asc' },
+      include: { credentials: true }
     });
 
-    // Para cada conta, busca credenciais e descriptografa
+    const etag = rosterEtag(accounts);
+    res.set('ETag', etag);
+
+    const ifNoneMatch = req.headers['if-none-match'];
+    if (ifNoneMatch && ifNoneMatch.split(',').map(tag => tag.trim()).includes(etag)) {
+      return res.status(304).end();
+    }
+
+    console.log(`📋 [GET /mt5/accounts/all] Buscando TODAS as contas para carrossel`);
+
+    // Para cada conta, descriptografa as credenciais
     const accountsWithCredentials = [];
 
     for (const account of accounts) {
       try {
-        const credential = await prisma.tradingAccountCredential.findUnique({
-          where: { tradingAccountId: account.id }
-        });
+        const credential = account.credentials;
 
         if (credential) {
           const password = decryptPassword(credential.encryptedPassword);
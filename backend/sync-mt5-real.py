@@ -1,12 +1,24 @@
 """
 Sincronização REAL de dados MT5 da GMI Markets
 Conecta na conta MT5 e atualiza banco de dados automaticamente
+
+Modos:
+- python sync-mt5-real.py          # Uma conta (MT5_LOGIN / MT5_WALLET_ADDRESS do .env)
+- python sync-mt5-real.py --all    # Todas as contas GMI vinculadas (lote)
+
+No modo --all as contas e os usuários vêm de um único SELECT com JOIN, o
+terminal é inicializado uma vez (só troca de login entre contas) e
+GmiAccount, User.monthlyVolume e TradingStat são gravados com
+INSERT ... ON CONFLICT DO UPDATE em uma única transação.
 """
 import MetaTrader5 as mt5
 from datetime import datetime, timedelta
+import argparse
+import json
 import sqlite3
 import sys
 import os
+import uuid
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -22,6 +34,22 @@ WALLET_ADDRESS = os.getenv('MT5_WALLET_ADDRESS', '0xdf3051d2982660ea265add9ef032
 # Caminho do banco de dados
 DB_PATH = Path(__file__).parent / 'prisma' / 'dev.db'
 
+def login_mt5(login, password, server):
+    """Login em uma conta no terminal já inicializado"""
+    try:
+        authorized = mt5.login(login=int(login), password=password, server=server)
+    except (TypeError, ValueError) as e:
+        print(f"❌ Login inválido {login}: {e}")
+        return False
+
+    if not authorized:
+        print(f"❌ Erro ao fazer login na conta {login}")
+        print("Último erro:", mt5.last_error())
+        return False
+
+    print(f"✅ Conectado na conta {login} @ {server}")
+    return True
+
 def connect_mt5():
     """Conecta no MetaTrader5"""
     if not mt5.initialize():
@@ -29,14 +57,10 @@ def connect_mt5():
         return False
 
     # Login
-    authorized = mt5.login(login=int(MT5_LOGIN), password=MT5_PASSWORD, server=MT5_SERVER)
-    if not authorized:
-        print(f"❌ Erro ao fazer login na conta {MT5_LOGIN}")
-        print("Último erro:", mt5.last_error())
+    if not login_mt5(MT5_LOGIN, MT5_PASSWORD, MT5_SERVER):
         mt5.shutdown()
         return False
 
-    print(f"✅ Conectado na conta {MT5_LOGIN} @ {MT5_SERVER}")
     return True
 
 def get_account_data():
@@ -95,23 +119,118 @@ def get_monthly_stats():
         'trades': total_trades
     }
 
-def get_user_id_from_wallet(cursor, wallet):
-    """Busca ID do usuário pela carteira"""
-    cursor.execute(
-        "SELECT id FROM User WHERE walletAddress = ? COLLATE NOCASE",
-        (wallet.lower(),)
+# Contas GMI vinculadas + usuário em uma consulta (em vez de um SELECT por conta)
+LINKED_ACCOUNTS_SQL = """
+    SELECT g.id, g.userId, g.accountNumber, g.server, g.encryptedPayload, g.accountHash, u.walletAddress
+    FROM GmiAccount g
+    JOIN User u ON u.id = g.userId
+"""
+
+def get_linked_accounts(cursor, wallet=None):
+    """
+    Contas GMI com o usuário dono (JOIN GmiAccount x User).
+
+    Args:
+        wallet: só a conta desta carteira (None = todas as vinculadas)
+    """
+    if wallet:
+        cursor.execute(LINKED_ACCOUNTS_SQL + " WHERE u.walletAddress = ? COLLATE NOCASE", (wallet.lower(),))
+    else:
+        cursor.execute(LINKED_ACCOUNTS_SQL + " ORDER BY g.server, g.accountNumber")
+
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def account_password(account):
+    """
+    Senha MT5 guardada em encryptedPayload (como o /api/dev/link-gmi grava).
+
+    Contas vinculadas pelo /api/link guardam só metadados
+    (JSON {accountNumber, server, platform}), sem senha: retorna None.
+    """
+    payload = account['encryptedPayload']
+    try:
+        metadata = json.loads(payload)
+    except (TypeError, ValueError):
+        return payload
+    return None if isinstance(metadata, dict) else payload
+
+def build_rows(account, account_data, monthly_stats, now):
+    """Parâmetros das três UPSERTs de uma conta"""
+    year = now.year
+    month = int(f"{year}{str(now.month).zfill(2)}")
+
+    net_profit = float(monthly_stats['profit']) - float(monthly_stats['loss'])
+    total_pnl = float(monthly_stats['profit']) + float(monthly_stats['loss'])
+    win_rate = (float(monthly_stats['profit']) / total_pnl * 100) if total_pnl > 0 else 0
+
+    synced_at = now.isoformat()
+    gmi = (
+        account['id'], account['userId'], account['accountNumber'], account['server'],
+        account['encryptedPayload'], account['accountHash'],
+        account_data['balance'], account_data['equity'],
+        monthly_stats['volume'], monthly_stats['profit'], monthly_stats['loss'], monthly_stats['trades'],
+        synced_at, synced_at
     )
-    result = cursor.fetchone()
-    return result[0] if result else None
-
-def get_gmi_account_id(cursor, user_id):
-    """Busca ID da conta GMI do usuário"""
-    cursor.execute(
-        "SELECT id FROM GmiAccount WHERE userId = ?",
-        (user_id,)
+    user = (account['userId'], account['walletAddress'], monthly_stats['volume'], synced_at)
+    stat = (
+        str(uuid.uuid4()), account['id'], month, year,
+        monthly_stats['volume'], monthly_stats['profit'], monthly_stats['loss'],
+        f"{net_profit:.2f}", monthly_stats['trades'], f"{win_rate:.2f}", synced_at
     )
-    result = cursor.fetchone()
-    return result[0] if result else None
+    return gmi, user, stat
+
+UPSERT_GMI_ACCOUNT_SQL = """
+    INSERT INTO GmiAccount (id, userId, accountNumber, server, encryptedPayload, accountHash,
+                            balance, equity, monthlyVolume, monthlyProfit, monthlyLoss, totalTrades,
+                            connected, lastSyncAt, updatedAt)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        balance = excluded.balance,
+        equity = excluded.equity,
+        monthlyVolume = excluded.monthlyVolume,
+        monthlyProfit = excluded.monthlyProfit,
+        monthlyLoss = excluded.monthlyLoss,
+        totalTrades = excluded.totalTrades,
+        connected = 1,
+        lastSyncAt = excluded.lastSyncAt,
+        updatedAt = excluded.updatedAt
+"""
+
+UPSERT_USER_VOLUME_SQL = """
+    INSERT INTO User (id, walletAddress, monthlyVolume, updatedAt)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        monthlyVolume = excluded.monthlyVolume,
+        updatedAt = excluded.updatedAt
+"""
+
+UPSERT_TRADING_STAT_SQL = """
+    INSERT INTO TradingStat (id, gmiAccountId, month, year, volume, profit, loss, netProfit, trades, winRate,
+                             updatedAt)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(gmiAccountId, month, year) DO UPDATE SET
+        volume = excluded.volume,
+        profit = excluded.profit,
+        loss = excluded.loss,
+        netProfit = excluded.netProfit,
+        trades = excluded.trades,
+        winRate = excluded.winRate,
+        updatedAt = excluded.updatedAt
+"""
+
+def write_accounts(conn, rows):
+    """
+    Grava GmiAccount, User.monthlyVolume e TradingStat de várias contas em
+    uma transação (tudo ou nada).
+
+    Args:
+        rows: lista de (gmi, user, stat) de build_rows
+    """
+    with conn:
+        conn.executemany(UPSERT_GMI_ACCOUNT_SQL, [gmi for gmi, _, _ in rows])
+        conn.executemany(UPSERT_USER_VOLUME_SQL, [user for _, user, _ in rows])
+        conn.executemany(UPSERT_TRADING_STAT_SQL, [stat for _, _, stat in rows])
 
 def update_database(account_data, monthly_stats):
     """Atualiza banco de dados SQLite"""
@@ -119,123 +238,98 @@ def update_database(account_data, monthly_stats):
     cursor = conn.cursor()
 
     try:
-        # Buscar usuário
-        user_id = get_user_id_from_wallet(cursor, WALLET_ADDRESS)
-        if not user_id:
-            print(f"❌ Usuário não encontrado: {WALLET_ADDRESS}")
+        # Buscar usuário e conta GMI (JOIN)
+        accounts = get_linked_accounts(cursor, WALLET_ADDRESS)
+        if not accounts:
+            print(f"❌ Conta GMI não encontrada para a carteira: {WALLET_ADDRESS}")
             return False
 
-        print(f"✅ Usuário encontrado: {user_id}")
-
-        # Buscar conta GMI
-        gmi_account_id = get_gmi_account_id(cursor, user_id)
-        if not gmi_account_id:
-            print(f"❌ Conta GMI não encontrada para usuário {user_id}")
-            return False
+        account = accounts[0]
+        print(f"✅ Usuário encontrado: {account['userId']}")
+        print(f"✅ Conta GMI encontrada: {account['id']}")
 
-        print(f"✅ Conta GMI encontrada: {gmi_account_id}")
-
-        # Atualizar GmiAccount
-        now = datetime.now().isoformat()
-        cursor.execute("""
-            UPDATE GmiAccount
-            SET balance = ?,
-                equity = ?,
-                monthlyVolume = ?,
-                monthlyProfit = ?,
-                monthlyLoss = ?,
-                totalTrades = ?,
-                connected = 1,
-                lastSyncAt = ?
-            WHERE id = ?
-        """, (
-            account_data['balance'],
-            account_data['equity'],
-            monthly_stats['volume'],
-            monthly_stats['profit'],
-            monthly_stats['loss'],
-            monthly_stats['trades'],
-            now,
-            gmi_account_id
-        ))
-
-        # Atualizar User com volume mensal
-        cursor.execute("""
-            UPDATE User
-            SET monthlyVolume = ?
-            WHERE id = ?
-        """, (monthly_stats['volume'], user_id))
-
-        # Atualizar TradingStat
-        year = datetime.now().year
-        month = int(f"{year}{str(datetime.now().month).zfill(2)}")
-
-        net_profit = float(monthly_stats['profit']) - float(monthly_stats['loss'])
-        total_pnl = float(monthly_stats['profit']) + float(monthly_stats['loss'])
-        win_rate = (float(monthly_stats['profit']) / total_pnl * 100) if total_pnl > 0 else 0
-
-        # Verificar se já existe
-        cursor.execute("""
-            SELECT id FROM TradingStat
-            WHERE gmiAccountId = ? AND month = ? AND year = ?
-        """, (gmi_account_id, month, year))
-
-        existing = cursor.fetchone()
-
-        if existing:
-            # Atualizar
-            cursor.execute("""
-                UPDATE TradingStat
-                SET volume = ?,
-                    profit = ?,
-                    loss = ?,
-                    netProfit = ?,
-                    trades = ?,
-                    winRate = ?
-                WHERE id = ?
-            """, (
-                monthly_stats['volume'],
-                monthly_stats['profit'],
-                monthly_stats['loss'],
-                f"{net_profit:.2f}",
-                monthly_stats['trades'],
-                f"{win_rate:.2f}",
-                existing[0]
-            ))
-        else:
-            # Inserir
-            cursor.execute("""
-                INSERT INTO TradingStat (gmiAccountId, month, year, volume, profit, loss, netProfit, trades, winRate)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                gmi_account_id,
-                month,
-                year,
-                monthly_stats['volume'],
-                monthly_stats['profit'],
-                monthly_stats['loss'],
-                f"{net_profit:.2f}",
-                monthly_stats['trades'],
-                f"{win_rate:.2f}"
-            ))
-
-        conn.commit()
+        write_accounts(conn, [build_rows(account, account_data, monthly_stats, datetime.now())])
         print("✅ Banco de dados atualizado com sucesso!")
         return True
 
     except Exception as e:
         print(f"❌ Erro ao atualizar banco: {e}")
-        conn.rollback()
         return False
     finally:
         conn.close()
 
+def sync_all_accounts():
+    """Modo lote: todas as contas GMI vinculadas, uma transação no fim"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        accounts = get_linked_accounts(conn.cursor())
+        if not accounts:
+            print("⚠️ Nenhuma conta GMI vinculada")
+            return 1
+
+        print(f"📋 {len(accounts)} conta(s) GMI vinculada(s)")
+
+        if not mt5.initialize():
+            print("❌ Erro ao inicializar MT5:", mt5.last_error())
+            return 1
+
+        # Coleta: um initialize, só troca de login entre contas
+        rows, failed, skipped = [], [], []
+        try:
+            for account in accounts:
+                password = account_password(account)
+                if password is None:
+                    skipped.append(account['accountNumber'])
+                    continue
+
+                if not login_mt5(account['accountNumber'], password, account['server']):
+                    failed.append(account['accountNumber'])
+                    continue
+
+                account_data = get_account_data()
+                if not account_data:
+                    failed.append(account['accountNumber'])
+                    continue
+
+                monthly_stats = get_monthly_stats()
+                print(f"   Saldo: ${account_data['balance']} | Volume: ${monthly_stats['volume']} | "
+                      f"Trades: {monthly_stats['trades']}")
+                rows.append(build_rows(account, account_data, monthly_stats, datetime.now()))
+        finally:
+            mt5.shutdown()
+            print("\n🔌 Desconectado do MT5")
+
+        # Gravação: três UPSERTs em lote, uma transação
+        print(f"\n💾 Gravando {len(rows)} conta(s) em uma transação...")
+        try:
+            write_accounts(conn, rows)
+        except sqlite3.Error as e:
+            print(f"❌ Erro ao atualizar banco: {e}")
+            return 1
+
+        print(f"\n✅ {len(rows)}/{len(accounts)} conta(s) sincronizada(s)")
+        if skipped:
+            print(f"⏭️ {len(skipped)} conta(s) sem senha MT5 salva (vinculada só com metadados): {', '.join(skipped)}")
+        if failed:
+            print(f"❌ Falha em {len(failed)} conta(s): {', '.join(failed)}")
+        return 0 if not failed else 1
+    finally:
+        conn.close()
+
 def main():
     """Função principal"""
+    parser = argparse.ArgumentParser(description='Sincronização MT5 → banco de dados')
+    parser.add_argument('--all', action='store_true',
+                        help='Sincroniza todas as contas GMI vinculadas em lote')
+    args = parser.parse_args()
+
     print("\n" + "="*50)
     print("🔄 SINCRONIZAÇÃO MT5 → BANCO DE DADOS")
     print("="*50 + "\n")
 
+    if args.all:
+        return sync_all_accounts()
+
     # Verificar senha
     if not MT5_PASSWORD:
         print("❌ ERRO: MT5_PASSWORD não configurada!")
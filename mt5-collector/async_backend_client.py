@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+ASYNC BACKEND CLIENT - ENVIO SEM BLOQUEAR O EVENT LOOP (AIOHTTP)
+============================================================================
+Os collectors MetaAPI (metaapi_collector, metaapi_daily_collector) rodam em
+asyncio, mas buscavam o roster e notificavam o backend com requests: cada
+chamada (timeout de 10 s) parava o event loop e todas as conexões MetaAPI
+em andamento.
+
+AsyncBackendClient é a versão asyncio do BackendClient:
+
+- aiohttp.ClientSession com pool de conexões keep-alive (pool_size) e
+  timeout total por requisição (BACKEND_TIMEOUT)
+- Mesmas rotas, lotes gzip e fallback item a item do BackendClient: as
+  regras vêm de BackendProtocol (backend_client.py), aqui só o aiohttp
+- Respostas lidas por inteiro e devolvidas como BackendResponse
+  (status_code, headers, json()), no formato que RosterCache já usa
+- Falhas de transporte viram requests.ConnectionError: roster e outbox
+  tratam os dois clientes do mesmo jeito
+
+A sessão é criada no primeiro uso, dentro do event loop que está rodando.
+Quem roda o loop fecha a sessão (await close()) antes de ele acabar: com o
+loop fechado o aiohttp não consegue mais fechar os sockets keep-alive. Se o
+loop mudar com a sessão ainda aberta, o vazamento vai para o log e uma
+nova sessão é criada.
+
+Requisitos:
+- pip install aiohttp (já vem com o metaapi-cloud-sdk)
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import json
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import requests
+
+from backend_client import (
+    BACKEND_BATCH_SIZE, BACKEND_GZIP_MIN_BYTES, BACKEND_TIMEOUT, BACKEND_URL, SYNC_BATCH_PATH, SYNC_PATH,
+    BackendProtocol,
+)
+
+logger = logging.getLogger(__name__)
+
+class BackendResponse:
+    """Resposta já lida (status, headers e corpo)"""
+
+    def __init__(self, status_code: int, headers, content: bytes):
+        # headers: CIMultiDict (sem diferença de maiúsculas, como no requests)
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+class AsyncBackendClient(BackendProtocol):
+    """Cliente asyncio do backend com sessão persistente e envio em lote"""
+
+    def __init__(self, base_url: str = BACKEND_URL, timeout: float = BACKEND_TIMEOUT,
+                 batch_size: int = BACKEND_BATCH_SIZE, gzip_min_bytes: int = BACKEND_GZIP_MIN_BYTES,
+                 pool_size: int = 10):
+        super().__init__(base_url, timeout, batch_size, gzip_min_bytes)
+        self.pool_size = pool_size
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _session(self) -> aiohttp.ClientSession:
+        """Sessão do event loop atual (criada no primeiro uso)"""
+        loop = asyncio.get_running_loop()
+        if self.session is not None and not self.session.closed and self.loop is not loop:
+            logger.warning("AsyncBackendClient: sessão de outro event loop não foi fechada (falta await close())")
+        if self.session is None or self.session.closed or self.loop is not loop:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self.loop = loop
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def request(self, method: str, path: str, **kwargs) -> BackendResponse:
+        """Requisição na sessão compartilhada; falha de transporte -> requests.ConnectionError"""
+        self.stats['requests'] += 1
+        try:
+            async with self._session().request(method, f"{self.base_url}{path}", **kwargs) as response:
+                content = await response.read()
+                return BackendResponse(response.status, response.headers.copy(), content)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise requests.ConnectionError(f"{method} {path}: {e!r}") from e
+
+    async def get(self, path: str, headers: Optional[Dict[str, str]] = None) -> BackendResponse:
+        """GET reutilizando a sessão"""
+        return await self.request('GET', path, headers=headers or {})
+
+    async def post_json(self, path: str, payload: Any, compress: bool = True) -> BackendResponse:
+        """POST JSON (gzip se o corpo for grande o bastante)"""
+        body, headers = self.encode(payload, compress)
+        return await self.request('POST', path, data=body, headers=headers)
+
+    # ------------------------------------------------------------------
+    # SYNC (regras em BackendProtocol; aqui só o transporte)
+    # ------------------------------------------------------------------
+
+    async def sync(self, data: Dict) -> bool:
+        """Envia o payload de uma conta (POST /api/mt5/sync)"""
+        try:
+            response = await self.post_json(SYNC_PATH, data, compress=False)
+        except requests.RequestException as e:
+            return self.sync_failed(data, e)
+        return self.sync_result(data, response)
+
+    async def sync_items(self, items: List[Dict]) -> List[bool]:
+        """
+        Envia vários payloads, em lotes de batch_size.
+
+        Returns:
+            Lista (na ordem de items) indicando se cada payload foi aceito
+        """
+        delivered: List[bool] = []
+
+        for chunk, batched in self.plan_chunks(items):
+            if not batched:
+                delivered.extend([await self.sync(item) for item in chunk])
+                continue
+
+            try:
+                response = await self.post_json(SYNC_BATCH_PATH, {'items': chunk})
+            except requests.RequestException as e:
+                delivered.extend(self.batch_failed(chunk, e))
+                continue
+
+            outcome = self.batch_result(chunk, response)
+            if outcome is None:
+                outcome = [await self.sync(item) for item in chunk]
+            delivered.extend(outcome)
+
+        return delivered
+
+    async def sync_batch(self, items: List[Dict]) -> Dict[str, bool]:
+        """
+        Envia vários payloads, em lotes de batch_size.
+
+        Returns:
+            Dict accountId -> enviado com sucesso
+        """
+        return self.by_account(items, await self.sync_items(items))
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+BACKEND CLIENT - ENVIO DOS COLLECTORS PARA O BACKEND (SESSÃO + LOTES)
+============================================================================
+Cliente HTTP compartilhado pelos collectors (mt5_collector, mt5_carrossel,
+metaapi_collector, metaapi_daily_collector).
+
+- requests.Session com pool de conexões: keep-alive, sem novo handshake
+  TCP/TLS a cada conta
+- Lote: vários payloads em um único POST /api/mt5/sync/batch, comprimido
+  com gzip acima de BACKEND_GZIP_MIN_BYTES
+- Fallback: se o lote falha no nível HTTP (backend antigo sem o endpoint,
+  413, 5xx), os itens do lote são enviados um a um em /api/mt5/sync
+- BackendProtocol: essas regras sem transporte (corpo, lotes, fallback,
+  leitura dos resultados), usadas também pelo AsyncBackendClient
+- Buffer: enqueue() acumula payloads e envia ao atingir BACKEND_BATCH_SIZE
+  ou quando o mais antigo espera há BACKEND_BATCH_DELAY segundos; flush()
+  envia o restante (ex: fim do ciclo)
+- stats['errors'] conta falhas de transporte (exceção, 5xx): a outbox usa
+  para separar "backend fora do ar" de "conta recusada pelo backend"
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+import gzip
+import json
+import time
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:5001')
+
+# Payloads por POST /api/mt5/sync/batch (backend aceita até 500)
+BACKEND_BATCH_SIZE = int(os.getenv('BACKEND_BATCH_SIZE', '100'))
+
+# Espera máxima (s) de um payload no buffer antes do envio
+BACKEND_BATCH_DELAY = float(os.getenv('BACKEND_BATCH_DELAY', '5'))
+
+# Corpos menores que isso vão sem gzip (não compensa a compressão)
+BACKEND_GZIP_MIN_BYTES = int(os.getenv('BACKEND_GZIP_MIN_BYTES', '1024'))
+
+BACKEND_TIMEOUT = float(os.getenv('BACKEND_TIMEOUT', '10'))
+
+# Status do POST em lote que indicam "tente item a item"
+FALLBACK_STATUS = {404, 405, 413, 500, 502, 503, 504}
+
+# Rotas do backend
+SYNC_PATH = '/api/mt5/sync'
+SYNC_BATCH_PATH = '/api/mt5/sync/batch'
+
+class BackendProtocol:
+    """
+    Regras de envio sem transporte, compartilhadas por BackendClient
+    (requests) e AsyncBackendClient (aiohttp): corpo JSON/gzip, divisão em
+    lotes, fallback item a item e leitura dos resultados. Os clientes só
+    fazem o HTTP e chamam estes métodos com a resposta (status_code, json()).
+    """
+
+    def __init__(self, base_url: str = BACKEND_URL, timeout: float = BACKEND_TIMEOUT,
+                 batch_size: int = BACKEND_BATCH_SIZE, gzip_min_bytes: int = BACKEND_GZIP_MIN_BYTES):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.gzip_min_bytes = gzip_min_bytes
+
+        # Desligado ao receber 404/405 do endpoint (backend sem /sync/batch)
+        self.batch_supported = True
+
+        self.stats = {'requests': 0, 'batches': 0, 'items': 0, 'fallbacks': 0, 'bytes_sent': 0, 'errors': 0}
+
+    def encode(self, payload: Any, compress: bool = True) -> Tuple[bytes, Dict[str, str]]:
+        """Corpo JSON (gzip se for grande o bastante) e headers do POST"""
+        body = json.dumps(payload, default=str).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+
+        if compress and len(body) >= self.gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+
+        self.stats['bytes_sent'] += len(body)
+        return body, headers
+
+    def plan_chunks(self, items: List[Dict]) -> Iterator[Tuple[List[Dict], bool]]:
+        """
+        Lotes de batch_size: (itens, enviar em /sync/batch?).
+
+        Um item só (ou backend sem /sync/batch) vai no endpoint individual;
+        batch_supported é lido a cada lote (pode desligar no meio do envio).
+        """
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            yield chunk, len(chunk) > 1 and self.batch_supported
+
+    def sync_result(self, data: Dict, response) -> bool:
+        """Resposta de POST /api/mt5/sync"""
+        if response.status_code >= 500:
+            self.stats['errors'] += 1
+        if response.status_code != 200:
+            logger.warning(f"❌ Erro ao enviar conta {data.get('accountId')}: {response.status_code}")
+            return False
+        return True
+
+    def sync_failed(self, data: Dict, error: Exception) -> bool:
+        """Falha de transporte em POST /api/mt5/sync"""
+        self.stats['errors'] += 1
+        logger.warning(f"❌ Exceção ao enviar conta {data.get('accountId')}: {error}")
+        return False
+
+    def batch_failed(self, chunk: List[Dict], error: Exception) -> List[bool]:
+        """Falha de transporte no lote: backend fora do ar, item a item também falharia"""
+        self.stats['errors'] += 1
+        logger.warning(f"❌ Exceção ao enviar lote de {len(chunk)} conta(s): {error}")
+        return [False] * len(chunk)
+
+    def batch_result(self, chunk: List[Dict], response) -> Optional[List[bool]]:
+        """
+        Resposta de POST /api/mt5/sync/batch.
+
+        Returns:
+            Aceito/recusado por item (na ordem do lote) ou None se o lote
+            deve ser reenviado item a item (FALLBACK_STATUS)
+        """
+        if response.status_code in FALLBACK_STATUS:
+            if response.status_code in (404, 405):
+                self.batch_supported = False
+            logger.warning(f"⚠️ Lote recusado ({response.status_code}), enviando item a item")
+            self.stats['fallbacks'] += 1
+            return None
+
+        if response.status_code != 200:
+            self.stats['errors'] += 1
+            logger.warning(f"❌ Erro ao enviar lote: {response.status_code}")
+            return [False] * len(chunk)
+
+        self.stats['batches'] += 1
+        self.stats['items'] += len(chunk)
+        results = response.json().get('results', [])
+        self.stats['errors'] += sum(1 for r in results if (r.get('status') or 0) >= 500)
+
+        # Backend responde um resultado por item, na ordem do lote
+        if len(results) == len(chunk):
+            return [bool(r.get('success')) for r in results]
+        by_account = {r.get('accountId'): bool(r.get('success')) for r in results}
+        return [by_account.get(item.get('accountId'), False) for item in chunk]
+
+    @staticmethod
+    def by_account(items: List[Dict], delivered: List[bool]) -> Dict[str, bool]:
+        """Resultado de sync_items como accountId -> enviado com sucesso"""
+        return {item.get('accountId'): ok for item, ok in zip(items, delivered)}
+
+class BackendClient(BackendProtocol):
+    """Cliente do backend com sessão persistente e envio em lote"""
+
+    def __init__(self, base_url: str = BACKEND_URL, timeout: float = BACKEND_TIMEOUT,
+                 batch_size: int = BACKEND_BATCH_SIZE, batch_delay: float = BACKEND_BATCH_DELAY,
+                 gzip_min_bytes: int = BACKEND_GZIP_MIN_BYTES, pool_size: int = 10):
+        super().__init__(base_url, timeout, batch_size, gzip_min_bytes)
+        self.batch_delay = batch_delay
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.pending: List[Dict] = []
+        self.oldest_pending: Optional[float] = None
+
+    def close(self):
+        self.session.close()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        """GET reutilizando a sessão"""
+        kwargs.setdefault('timeout', self.timeout)
+        self.stats['requests'] += 1
+        return self.session.get(f"{self.base_url}{path}", **kwargs)
+
+    def post_json(self, path: str, payload: Any, compress: bool = True) -> requests.Response:
+        """POST JSON (gzip se o corpo for grande o bastante)"""
+        body, headers = self.encode(payload, compress)
+        self.stats['requests'] += 1
+        return self.session.post(f"{self.base_url}{path}", data=body, headers=headers, timeout=self.timeout)
+
+    # ------------------------------------------------------------------
+    # SYNC
+    # ------------------------------------------------------------------
+
+    def sync(self, data: Dict) -> bool:
+        """Envia o payload de uma conta (POST /api/mt5/sync)"""
+        try:
+            response = self.post_json(SYNC_PATH, data, compress=False)
+        except requests.RequestException as e:
+            return self.sync_failed(data, e)
+        return self.sync_result(data, response)
+
+    def sync_items(self, items: List[Dict]) -> List[bool]:
+        """
+        Envia vários payloads, em lotes de batch_size.
+
+        Returns:
+            Lista (na ordem de items) indicando se cada payload foi aceito;
+            útil quando há vários payloads da mesma conta (ex: backfill)
+        """
+        delivered: List[bool] = []
+
+        for chunk, batched in self.plan_chunks(items):
+            if not batched:
+                delivered.extend(self.sync(item) for item in chunk)
+                continue
+
+            try:
+                response = self.post_json(SYNC_BATCH_PATH, {'items': chunk})
+            except requests.RequestException as e:
+                delivered.extend(self.batch_failed(chunk, e))
+                continue
+
+            outcome = self.batch_result(chunk, response)
+            if outcome is None:
+                outcome = [self.sync(item) for item in chunk]
+            delivered.extend(outcome)
+
+        return delivered
+
+    def sync_batch(self, items: List[Dict]) -> Dict[str, bool]:
+        """
+        Envia vários payloads, em lotes de batch_size.
+
+        Returns:
+            Dict accountId -> enviado com sucesso
+        """
+        return self.by_account(items, self.sync_items(items))
+
+    # ------------------------------------------------------------------
+    # BUFFER
+    # ------------------------------------------------------------------
+
+    def enqueue(self, data: Dict) -> Optional[Dict[str, bool]]:
+        """
+        Acumula um payload; envia o buffer se encheu ou se o mais antigo
+        passou de batch_delay.
+
+        Returns:
+            Resultado do envio (se houve) ou None
+        """
+        if not self.pending:
+            self.oldest_pending = time.monotonic()
+        self.pending.append(data)
+
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.oldest_pending >= self.batch_delay:
+            return self.flush()
+        return None
+
+    def flush(self) -> Dict[str, bool]:
+        """Envia tudo que está no buffer"""
+        items, self.pending = self.pending, []
+        self.oldest_pending = None
+        if not items:
+            return {}
+        return self.sync_batch(items)
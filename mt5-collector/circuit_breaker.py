@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+CIRCUIT BREAKER - FALHAS DE LOGIN POR CONTA
+============================================================================
+Conta com senha vencida/errada não deve gastar um timeout de login MT5 a
+cada ciclo. O breaker conta falhas de login consecutivas por TradingAccount:
+
+- CLOSED:    normal, login permitido
+- OPEN:      após FAILURE_THRESHOLD falhas seguidas; bloqueada até retry_at
+             (backoff exponencial com jitter)
+- HALF_OPEN: retry_at venceu; uma única tentativa de teste (as demais
+             esperam o resultado dela). Sucesso fecha o circuito, falha
+             reabre com backoff maior; teste sem resultado (ex: erro de
+             terminal) libera outro após base_backoff
+
+O estado é gravado no lastError da conta (visível no dashboard/admin) e
+restaurado dele ao reiniciar o collector:
+    Login failed: (...) | circuit=OPEN failures=5 retry_at=2025-11-20T10:00:00+00:00
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import re
+import random
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+CLOSED = 'CLOSED'
+OPEN = 'OPEN'
+HALF_OPEN = 'HALF_OPEN'
+
+STATE_PATTERN = re.compile(r"circuit=(\w+) failures=(\d+) retry_at=(\S+)")
+
+class LoginCircuitBreaker:
+    """Circuit breaker de falhas de login por conta"""
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 300,
+                 max_backoff: float = 21600, jitter: float = 0.2):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+        # account_id -> {'state', 'failures', 'retry_at'}
+        self.circuits: Dict[str, Dict] = {}
+
+    def _circuit(self, account_id: str) -> Dict:
+        return self.circuits.setdefault(account_id, {'state': CLOSED, 'failures': 0, 'retry_at': 0.0})
+
+    def state(self, account_id: str) -> str:
+        return self._circuit(account_id)['state']
+
+    def retry_at(self, account_id: str) -> Optional[float]:
+        """Horário da próxima tentativa permitida (None se o circuito está fechado)"""
+        circuit = self._circuit(account_id)
+        return circuit['retry_at'] if circuit['state'] != CLOSED else None
+
+    def allow(self, account_id: str, now: float) -> bool:
+        """Verifica se a conta pode tentar login agora (OPEN vencido -> HALF_OPEN)"""
+        circuit = self._circuit(account_id)
+        if circuit['state'] == CLOSED:
+            return True
+        if now < circuit['retry_at']:
+            return False
+
+        # Uma tentativa de teste: retry_at passa a ser o prazo dela
+        circuit['state'] = HALF_OPEN
+        circuit['retry_at'] = now + self.base_backoff
+        return True
+
+    def backoff(self, failures: int) -> float:
+        """Backoff exponencial com jitter para a n-ésima falha"""
+        exponent = max(failures - self.failure_threshold, 0)
+        delay = min(self.base_backoff * (2 ** exponent), self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def record(self, result: Dict, now: float) -> str:
+        """
+        Atualiza o circuito com o resultado de process_account.
+
+        Só falhas de login (status DISCONNECTED) contam; erros de terminal
+        não são culpa da conta e não alteram o circuito.
+        """
+        circuit = self._circuit(result['account_id'])
+
+        if result['status'] == 'CONNECTED':
+            circuit.update(state=CLOSED, failures=0, retry_at=0.0)
+        elif result['status'] == 'DISCONNECTED':
+            circuit['failures'] += 1
+            if circuit['state'] == HALF_OPEN or circuit['failures'] >= self.failure_threshold:
+                circuit['state'] = OPEN
+                circuit['retry_at'] = now + self.backoff(circuit['failures'])
+
+        return circuit['state']
+
+    def describe(self, account_id: str) -> str:
+        """Estado do circuito no formato gravado em lastError"""
+        circuit = self._circuit(account_id)
+        retry_at = datetime.fromtimestamp(circuit['retry_at'], tz=timezone.utc).isoformat()
+        return f"circuit={circuit['state']} failures={circuit['failures']} retry_at={retry_at}"
+
+    def annotate(self, result: Dict):
+        """Acrescenta o estado do circuito ao erro do resultado (se não estiver fechado)"""
+        if self.state(result['account_id']) != CLOSED and result['error']:
+            result['error'] = f"{result['error']} | {self.describe(result['account_id'])}"
+
+    def restore(self, account_id: str, last_error: Optional[str]):
+        """Recupera o estado gravado em lastError (ex: após reiniciar o collector)"""
+        if account_id in self.circuits or not last_error:
+            return
+
+        match = STATE_PATTERN.search(last_error)
+        if not match:
+            return
+
+        state, failures, retry_at = match.groups()
+        try:
+            retry_ts = datetime.fromisoformat(retry_at).timestamp()
+        except ValueError:
+            return
+
+        self.circuits[account_id] = {
+            # HALF_OPEN interrompido volta como OPEN (tentativa ainda não feita)
+            'state': OPEN if state in (OPEN, HALF_OPEN) else CLOSED,
+            'failures': int(failures),
+            'retry_at': retry_ts,
+        }
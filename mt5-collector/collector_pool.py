@@ -7,12 +7,21 @@ MT5 COLLECTOR - WORKER POOL ARCHITECTURE
 Sistema de coleta de dados MT5 com pool de workers para múltiplas contas.
 
 Arquitetura:
-- Worker Pool com 5-10 workers (configurável)
+- Pool de terminais: um worker por instalação MT5 (MT5_TERMINALS)
+- Contas distribuídas entre terminais por hash estável (login@server)
 - Cada worker processa contas sequencialmente (limitação MT5)
-- Coleta a cada 30 segundos
+- Sessão MT5 persistente por worker (initialize uma vez, reinicializa só em falha de IPC)
+- Agendamento adaptativo por conta: 30s com posições abertas, 5min flat,
+  backoff exponencial em falha (fila de prioridade por deadline)
+- Circuit breaker por conta para falhas de login (estado em lastError)
+- Afinidade de login: contas de cada terminal agrupadas por servidor
 - Calcula P/L corretamente (apenas trades: deal.type in [0, 1])
-- Armazena snapshots históricos
+- Ledger local de deals: busca só deals novos (high-water mark por conta)
+- Armazena snapshots históricos (micro-lotes gravados enquanto a coleta segue)
+- Snapshot só é gravado quando os dados mudam (senão apenas lastHeartbeat)
 - Credenciais criptografadas (AES-256/Fernet)
+- Tempo por conta e por fase (timing_ledger): JSONL, p50/p95/p99 por
+  ciclo e endpoint /metrics
 
 Autor: iDeepX Team
 Data: 2025-11-17
@@ -22,14 +31,18 @@ Data: 2025-11-17
 import os
 import sys
 import time
+import queue
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from multiprocessing import Pool, cpu_count
 from typing import List, Dict, Optional
 import pytz
 
-# MT5
-import MetaTrader5 as mt5
+# MT5 (MT5_FAKE=1 usa o terminal simulado fake_mt5 para testes em Linux)
+if os.getenv('MT5_FAKE', '').lower() in ('1', 'true', 'yes'):
+    import fake_mt5 as mt5
+else:
+    import MetaTrader5 as mt5
 
 # Database (SQLite via direct connection)
 import sqlite3
@@ -38,6 +51,27 @@ from contextlib import contextmanager
 # Encryption
 from cryptography.fernet import Fernet
 
+# Ledger incremental de deals
+from deal_ledger import DealLedger
+
+# Gravação em lote dos resultados
+from db_writer import BatchWriter, StreamingWriter
+
+# Agendamento adaptativo por conta
+from scheduler import AccountScheduler
+
+# Circuit breaker de falhas de login
+from circuit_breaker import LoginCircuitBreaker
+
+# Diff incremental do roster
+from roster import diff_roster
+
+# Ordem de login com afinidade de servidor
+from cycle_planner import AffinityStats, count_server_switches, plan_by_server, terminal_for_account
+
+# Tempo por conta/fase + /metrics
+from timing_ledger import METRICS_PORT, MetricsServer, PhaseTimer, TimingLedger
+
 # Environment
 from dotenv import load_dotenv
 
@@ -70,12 +104,52 @@ logger = logging.getLogger(__name__)
 NUM_WORKERS = int(os.getenv('NUM_WORKERS', '5'))
 COLLECT_INTERVAL = int(os.getenv('COLLECT_INTERVAL', '30'))  # segundos
 
+# Agendamento adaptativo: COLLECT_INTERVAL para contas com posições abertas,
+# IDLE_INTERVAL para contas flat e backoff exponencial para contas com falha
+IDLE_INTERVAL = int(os.getenv('IDLE_INTERVAL', '300'))
+RETRY_BASE_INTERVAL = int(os.getenv('RETRY_BASE_INTERVAL', '60'))
+RETRY_MAX_INTERVAL = int(os.getenv('RETRY_MAX_INTERVAL', '3600'))
+
+# Circuit breaker: após N falhas de login seguidas a conta fica bloqueada
+# (backoff exponencial com jitter, estado visível em lastError)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+CIRCUIT_BASE_BACKOFF = int(os.getenv('CIRCUIT_BASE_BACKOFF', '300'))
+CIRCUIT_MAX_BACKOFF = int(os.getenv('CIRCUIT_MAX_BACKOFF', '21600'))
+
 # MT5 Terminal Path
 MT5_PATH = os.getenv('MT5_PATH', r'C:\mt5_terminal1\terminal64.exe')
 
+# Pool de terminais: uma instalação MT5 por worker (separadas por ';' ou ',')
+# Ex: C:\mt5_terminal1\terminal64.exe;C:\mt5_terminal2\terminal64.exe
+MT5_TERMINALS = [
+    path.strip()
+    for path in os.getenv('MT5_TERMINALS', MT5_PATH).replace(',', ';').split(';')
+    if path.strip()
+][:NUM_WORKERS]
+
+# Sessão persistente: cada worker inicializa o terminal uma única vez e o
+# reutiliza entre contas e ciclos (só reinicializa em falha de IPC)
+PERSISTENT_SESSION = os.getenv('PERSISTENT_SESSION', 'true').lower() in ('1', 'true', 'yes')
+
+# Afinidade de login: agrupa as contas de cada terminal por servidor para
+# evitar reconexões do terminal a cada troca de trade server
+LOGIN_AFFINITY = os.getenv('LOGIN_AFFINITY', 'true').lower() in ('1', 'true', 'yes')
+
 # Database
 DATABASE_PATH = os.getenv('DATABASE_URL', 'file:../backend/prisma/dev.db').replace('file:', '')
 
+# Micro-lotes de gravação: grava a cada N resultados ou após X segundos;
+# lote que falha é regravado até WRITE_BATCH_RETRIES vezes
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '20'))
+WRITE_BATCH_DELAY = float(os.getenv('WRITE_BATCH_DELAY', '1.0'))
+WRITE_BATCH_RETRIES = int(os.getenv('WRITE_BATCH_RETRIES', '3'))
+
+# Snapshot sem mudança vira só heartbeat; keep-alive a cada SNAPSHOT_MAX_GAP
+SNAPSHOT_MAX_GAP = int(os.getenv('SNAPSHOT_MAX_GAP', '900'))
+
+# Ledger local de deals (high-water mark + agregados de P/L por conta)
+DEAL_LEDGER_PATH = os.getenv('DEAL_LEDGER_PATH', 'deal_ledger.db')
+
 # Encryption
 ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
 if not ENCRYPTION_KEY:
@@ -142,10 +216,10 @@ def minimize_mt5_windows():
     return len(windows)
 
 def initialize_mt5() -> bool:
-    """Inicializa terminal MT5"""
-    if not mt5.initialize(path=MT5_PATH):
+    """Inicializa o terminal MT5 do worker"""
+    if not mt5.initialize(path=_terminal_path):
         logger.error(f"MT5 initialize() failed, error: {mt5.last_error()}")
-        logger.error(f"MT5 Path: {MT5_PATH}")
+        logger.error(f"MT5 Path: {_terminal_path}")
         return False
 
     # Minimizar janelas do MT5 após inicializar
@@ -154,6 +228,70 @@ def initialize_mt5() -> bool:
 
     return True
 
+# ============================================================================
+# SESSÃO PERSISTENTE POR WORKER
+# ============================================================================
+
+# Códigos RES_E_INTERNAL_FAIL_* do MetaTrader5: comunicação com o terminal perdida
+IPC_ERROR_CODES = {-10001, -10002, -10003, -10004, -10005}
+
+# Estado da sessão MT5 do processo worker atual
+_session_active = False
+
+# Terminal MT5 exclusivo do worker atual (definido pelo initializer)
+_terminal_path = MT5_PATH
+
+# Ledger de deals do worker (uma conexão SQLite por processo)
+_deal_ledger: Optional[DealLedger] = None
+
+def get_deal_ledger() -> DealLedger:
+    """Abre (uma vez por worker) o ledger local de deals"""
+    global _deal_ledger
+    if _deal_ledger is None:
+        _deal_ledger = DealLedger(DEAL_LEDGER_PATH)
+    return _deal_ledger
+
+def worker_init(terminal_path: str = MT5_PATH):
+    """Initializer do Pool: vincula o worker a um terminal e abre a sessão MT5"""
+    global _session_active, _terminal_path
+    _terminal_path = terminal_path
+    if PERSISTENT_SESSION:
+        _session_active = initialize_mt5()
+        if _session_active:
+            logger.info(f"[Worker {os.getpid()}] Sessão MT5 inicializada")
+
+def ensure_mt5_session() -> bool:
+    """Garante terminal inicializado (reutiliza a sessão do worker se ativa)"""
+    global _session_active
+    if not PERSISTENT_SESSION:
+        return initialize_mt5()
+
+    if not _session_active:
+        _session_active = initialize_mt5()
+    return _session_active
+
+def release_mt5_session(force: bool = False):
+    """Encerra a sessão MT5 (no modo persistente, apenas se force=True)"""
+    global _session_active
+    if PERSISTENT_SESSION and not force:
+        return
+    mt5.shutdown()
+    _session_active = False
+
+def is_ipc_failure() -> bool:
+    """Verifica se o último erro MT5 indica perda de comunicação com o terminal"""
+    try:
+        code = mt5.last_error()[0]
+    except Exception:
+        return False
+    return code in IPC_ERROR_CODES
+
+def reset_mt5_session() -> bool:
+    """Reinicializa a sessão MT5 após falha de IPC"""
+    logger.warning(f"[Worker {os.getpid()}] Falha de IPC detectada, reinicializando MT5...")
+    release_mt5_session(force=True)
+    return ensure_mt5_session()
+
 def login_mt5(login: int, password: str, server: str) -> bool:
     """Faz login em conta MT5"""
     try:
@@ -202,94 +340,17 @@ def get_positions_info() -> Dict:
         logger.error(f"Error getting positions: {e}")
         return {'open_trades': 0, 'open_pl': "0"}
 
-def calculate_pl(start_time: datetime, end_time: datetime) -> float:
-    """
-    Calcula P/L entre duas datas
-
-    CRÍTICO: Apenas deal.type in [0, 1] (BUY/SELL trades)
-    Exclui deposits, withdrawals, etc.
-    """
-    try:
-        deals = mt5.history_deals_get(start_time, end_time)
-        if deals is None:
-            return 0.0
-
-        # Filtro CRÍTICO: apenas trades (type 0=BUY, 1=SELL)
-        profit = sum(
-            deal.profit
-            for deal in deals
-            if deal.type in [0, 1]  # DEAL_TYPE_BUY, DEAL_TYPE_SELL
-        )
-
-        return profit
-    except Exception as e:
-        logger.error(f"Error calculating P/L: {e}")
-        return 0.0
-
-def get_pl_metrics() -> Dict:
+def get_pl_metrics(account_id: str) -> Dict:
     """
     Calcula P/L por período (Day, Week, Month, Total) baseado em calendário UTC.
 
-    IMPORTANTE: Usa períodos de calendário (início do dia/semana/mês UTC)
-    em vez de períodos relativos (últimas 24h/7d/30d).
+    Usa o ledger local de deals: só busca no MT5 os deals mais novos que o
+    high-water mark da conta; os períodos são agregados incrementais.
     """
     try:
-        from datetime import timezone
-
-        now = datetime.now(timezone.utc)
-
-        # Início do dia (00:00 UTC)
-        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-
-        # Início da semana (segunda-feira 00:00 UTC)
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-
-        # Início do mês (dia 1, 00:00 UTC)
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        # Busca todos os deals do mês (otimização: uma única query)
-        deals = mt5.history_deals_get(start_of_month, now)
-
-        if deals is None:
-            return {
-                'day_pl': "0",
-                'week_pl': "0",
-                'month_pl': "0",
-                'total_pl': "0"
-            }
-
-        day_pl = 0.0
-        week_pl = 0.0
-        month_pl = 0.0
-
-        for deal in deals:
-            # Apenas trades (type 0=BUY, 1=SELL), não depósitos/transferências
-            if deal.type in [0, 1]:
-                profit = deal.profit
-
-                # Converte timestamp do deal para datetime UTC
-                deal_time = datetime.fromtimestamp(deal.time, tz=timezone.utc)
-
-                # Acumula por período
-                month_pl += profit
-
-                if deal_time >= start_of_week:
-                    week_pl += profit
+        metrics = get_deal_ledger().sync(account_id, mt5.history_deals_get)
 
-                if deal_time >= start_of_day:
-                    day_pl += profit
-
-        # Total P/L (últimos 365 dias como proxy)
-        total_start = now - timedelta(days=365)
-        total_pl = calculate_pl(total_start, now)
-
-        return {
-            'day_pl': str(day_pl),
-            'week_pl': str(week_pl),
-            'month_pl': str(month_pl),
-            'total_pl': str(total_pl)
-        }
+        return {key: str(value) for key, value in metrics.items()}
     except Exception as e:
         logger.error(f"Error calculating P/L metrics: {e}")
         return {
@@ -319,16 +380,21 @@ def process_account(account: Dict) -> Dict:
 
     logger.info(f"[Worker] Processando conta {login}@{server}")
 
+    timer = PhaseTimer()
     result = {
         'account_id': account_id,
+        'terminal': _terminal_path,
         'status': 'ERROR',
         'error': None,
-        'data': None
+        'data': None,
+        'timings': timer.phases
     }
 
     try:
-        # 1. Inicializa MT5
-        if not initialize_mt5():
+        # 1. Inicializa MT5 (ou reutiliza a sessão do worker)
+        with timer.phase('mt5_init'):
+            session_ok = ensure_mt5_session()
+        if not session_ok:
             result['error'] = "Failed to initialize MT5"
             return result
 
@@ -336,28 +402,35 @@ def process_account(account: Dict) -> Dict:
         password = decrypt_password(account['encrypted_password'])
         if not password:
             result['error'] = "Failed to decrypt password"
-            mt5.shutdown()
             return result
 
-        # 3. Login
-        if not login_mt5(login, password, server):
+        # 3. Login (uma nova tentativa se o terminal perdeu o IPC)
+        with timer.phase('login'):
+            authorized = login_mt5(login, password, server)
+            if not authorized and is_ipc_failure() and reset_mt5_session():
+                authorized = login_mt5(login, password, server)
+
+        if not authorized:
             result['error'] = f"Login failed: {mt5.last_error()}"
             result['status'] = 'DISCONNECTED'
-            mt5.shutdown()
             return result
 
         # 4. Coleta dados da conta
-        account_info = get_account_info()
+        with timer.phase('account_info'):
+            account_info = get_account_info()
         if account_info is None:
             result['error'] = "Failed to get account info"
-            mt5.shutdown()
+            if is_ipc_failure():
+                release_mt5_session(force=True)
             return result
 
         # 5. Coleta posições
-        positions_info = get_positions_info()
+        with timer.phase('positions'):
+            positions_info = get_positions_info()
 
-        # 6. Calcula P/L
-        pl_metrics = get_pl_metrics()
+        # 6. Calcula P/L (incremental via ledger de deals)
+        with timer.phase('deals'):
+            pl_metrics = get_pl_metrics(account_id)
 
         # 7. Monta dados completos
         result['data'] = {
@@ -373,13 +446,106 @@ def process_account(account: Dict) -> Dict:
     except Exception as e:
         logger.error(f"[Worker] ❌ Erro ao processar {login}@{server}: {e}")
         result['error'] = str(e)
+        if is_ipc_failure():
+            release_mt5_session(force=True)
 
     finally:
-        # Sempre desconecta
-        mt5.shutdown()
+        # Modo persistente mantém a sessão viva para a próxima conta
+        release_mt5_session()
 
     return result
 
+# ============================================================================
+# POOL DE TERMINAIS (SHARDING)
+# ============================================================================
+
+class TerminalPool:
+    """
+    Pool de terminais MT5: um worker (processo) por terminal.
+
+    Cada terminal atende uma sessão por vez, então cada instalação ganha um
+    Pool dedicado de 1 processo e as contas são distribuídas entre terminais
+    por hash estável - a mesma conta sempre cai no mesmo terminal.
+
+    Com login_affinity, cada shard é despachado agrupado por servidor,
+    começando pelo servidor em que o terminal parou no despacho anterior.
+    """
+
+    def __init__(self, terminals: List[str], login_affinity: bool = LOGIN_AFFINITY):
+        self.terminals = terminals
+        self.login_affinity = login_affinity
+        self.pools = [
+            Pool(processes=1, initializer=worker_init, initargs=(path,))
+            for path in terminals
+        ]
+        # Último servidor despachado em cada terminal (sessão MT5 fica nele)
+        self.last_server: List[Optional[str]] = [None] * len(terminals)
+        self.last_switches = 0
+        self.affinity_stats = AffinityStats()
+
+    def shard(self, accounts: List[Dict]) -> List[List[Dict]]:
+        """Distribui as contas entre os terminais"""
+        shards = [[] for _ in self.terminals]
+        for account in accounts:
+            shards[terminal_for_account(account, len(self.terminals))].append(account)
+        return shards
+
+    def plan(self, accounts: List[Dict]) -> List[List[Dict]]:
+        """Shards na ordem de despacho (agrupados por servidor se login_affinity)"""
+        shards = self.shard(accounts)
+        if self.login_affinity:
+            shards = [plan_by_server(shard, self.last_server[i]) for i, shard in enumerate(shards)]
+
+        self.last_switches = sum(
+            count_server_switches(shard, self.last_server[i]) for i, shard in enumerate(shards)
+        )
+        for i, shard in enumerate(shards):
+            if shard:
+                self.last_server[i] = shard[-1]['server']
+        return shards
+
+    def map(self, accounts: List[Dict]) -> List[Dict]:
+        """Processa as contas em paralelo (um shard por terminal)"""
+        pending = [
+            pool.map_async(process_account, shard)
+            for pool, shard in zip(self.pools, self.plan(accounts))
+            if shard
+        ]
+
+        results = []
+        for async_result in pending:
+            results.extend(async_result.get())
+        return results
+
+    def imap_unordered(self, accounts: List[Dict]):
+        """Gera os resultados na ordem em que as contas terminam (todos os terminais)"""
+        results = queue.Queue()
+
+        for shard_pool, shard in zip(self.pools, self.plan(accounts)):
+            for account in shard:
+                shard_pool.apply_async(
+                    process_account, (account,),
+                    callback=results.put,
+                    error_callback=lambda e, account=account: results.put({
+                        'account_id': account['id'],
+                        'terminal': None,
+                        'status': 'ERROR',
+                        'error': str(e),
+                        'data': None,
+                        'timings': {}
+                    })
+                )
+
+        for _ in accounts:
+            yield results.get()
+
+    def close(self):
+        """Encerra todos os workers"""
+        for pool in self.pools:
+            pool.terminate()
+        for pool in self.pools:
+            pool.join()
+
 # ============================================================================
 # DATABASE OPERATIONS
 # ============================================================================
@@ -399,6 +565,7 @@ def fetch_active_accounts() -> List[Dict]:
                 ta.platform,
                 ta.accountAlias,
                 ta.brokerName,
+                ta.lastError as last_error,
                 tac.encryptedPassword as encrypted_password
             FROM TradingAccount ta
             INNER JOIN TradingAccountCredential tac ON ta.id = tac.tradingAccountId
@@ -412,129 +579,46 @@ def fetch_active_accounts() -> List[Dict]:
         logger.info(f"Encontradas {len(accounts)} contas ativas para processar")
         return accounts
 
-def update_account(account_id: str, status: str, data: Optional[Dict], error: Optional[str]):
-    """Atualiza dados da conta no banco"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        if data:
-            # Atualiza TradingAccount com dados coletados
-            cursor.execute("""
-                UPDATE TradingAccount SET
-                    status = ?,
-                    connected = ?,
-                    balance = ?,
-                    equity = ?,
-                    margin = ?,
-                    freeMargin = ?,
-                    marginLevel = ?,
-                    openTrades = ?,
-                    openPL = ?,
-                    dayPL = ?,
-                    weekPL = ?,
-                    monthPL = ?,
-                    totalPL = ?,
-                    lastHeartbeat = ?,
-                    lastError = ?,
-                    updatedAt = CURRENT_TIMESTAMP,
-                    lastSnapshotAt = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (
-                status,
-                1 if status == 'CONNECTED' else 0,
-                data['balance'],
-                data['equity'],
-                data['margin'],
-                data['free_margin'],
-                data['margin_level'],
-                data['open_trades'],
-                data['open_pl'],
-                data['day_pl'],
-                data['week_pl'],
-                data['month_pl'],
-                data['total_pl'],
-                data['last_heartbeat'],
-                error,
-                account_id
-            ))
-
-            # Cria snapshot histórico
-            cursor.execute("""
-                INSERT INTO AccountSnapshot (
-                    tradingAccountId, capturedAt,
-                    balance, equity, margin, freeMargin, marginLevel,
-                    openTrades, openPL,
-                    dayPL, weekPL, monthPL, totalPL
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                account_id,
-                data['last_heartbeat'],
-                data['balance'],
-                data['equity'],
-                data['margin'],
-                data['free_margin'],
-                data['margin_level'],
-                data['open_trades'],
-                data['open_pl'],
-                data['day_pl'],
-                data['week_pl'],
-                data['month_pl'],
-                data['total_pl']
-            ))
-
-            logger.info(f"✅ Conta {account_id} atualizada: {status}")
-        else:
-            # Apenas atualiza status e erro
-            cursor.execute("""
-                UPDATE TradingAccount SET
-                    status = ?,
-                    connected = 0,
-                    lastError = ?,
-                    updatedAt = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (status, error, account_id))
-
-            logger.warning(f"⚠️ Conta {account_id} com erro: {error}")
-
-        conn.commit()
-
 # ============================================================================
 # MAIN COLLECTOR LOOP
 # ============================================================================
 
-def collector_cycle():
-    """Executa um ciclo de coleta completo"""
+def collector_cycle(pool: TerminalPool, writer: BatchWriter, accounts: List[Dict],
+                    breaker: Optional[LoginCircuitBreaker] = None,
+                    ledger: Optional[TimingLedger] = None) -> List[Dict]:
+    """Coleta as contas vencidas usando o pool de terminais e retorna os resultados"""
     logger.info("=" * 80)
-    logger.info("🚀 Iniciando ciclo de coleta MT5")
+    logger.info(f"🚀 Coletando {len(accounts)} conta(s) com {len(pool.terminals)} terminal(is)...")
     logger.info("=" * 80)
 
-    # 1. Busca contas ativas
-    accounts = fetch_active_accounts()
-
-    if not accounts:
-        logger.info("Nenhuma conta ativa para processar")
-        return
-
-    # 2. Processa contas em paralelo com worker pool
-    logger.info(f"Processando {len(accounts)} contas com {NUM_WORKERS} workers...")
-
     start_time = time.time()
 
-    with Pool(processes=NUM_WORKERS) as pool:
-        results = pool.map(process_account, accounts)
-
-    # 3. Atualiza banco de dados com resultados
-    for result in results:
-        update_account(
-            account_id=result['account_id'],
-            status=result['status'],
-            data=result['data'],
-            error=result['error']
-        )
+    # Pipeline: cada resultado vai para o writer assim que chega
+    # (micro-lotes gravados em paralelo com a coleta das demais contas)
+    stream = StreamingWriter(writer, WRITE_BATCH_SIZE, WRITE_BATCH_DELAY, ledger=ledger,
+                             retries=WRITE_BATCH_RETRIES)
+    servers = {account['id']: account['server'] for account in accounts}
+    results = []
+    try:
+        for result in pool.imap_unordered(accounts):
+            if ledger is not None:
+                ledger.record(result['account_id'], servers.get(result['account_id']), result.get('timings') or {},
+                              ok=result['status'] == 'CONNECTED', terminal=result['terminal'])
+
+            # Estado do circuit breaker vai junto no lastError
+            if breaker is not None:
+                breaker.record(result, time.time())
+                breaker.annotate(result)
+
+            results.append(result)
+            stream.submit(result)
+    finally:
+        write_stats = stream.close()
 
     elapsed = time.time() - start_time
+    pool.affinity_stats.record(pool.login_affinity, elapsed, len(results), pool.last_switches)
 
-    # 4. Resumo
+    # Resumo
     success = sum(1 for r in results if r['status'] == 'CONNECTED')
     failed = len(results) - success
 
@@ -542,34 +626,142 @@ def collector_cycle():
     logger.info(f"✅ Ciclo concluído em {elapsed:.2f}s")
     logger.info(f"   - Sucesso: {success}/{len(results)}")
     logger.info(f"   - Falhas: {failed}/{len(results)}")
+    logger.info(f"   - DB: {write_stats['rows']} linhas em {write_stats['batches']} lote(s), "
+                f"{write_stats['elapsed'] * 1000:.1f}ms ({write_stats['rows_per_sec']:.0f} linhas/s), "
+                f"{write_stats['snapshots_skipped']} snapshot(s) sem mudança, "
+                f"{write_stats['retries']} nova(s) tentativa(s), {len(write_stats['failed'])} não gravado(s)")
+    logger.info(f"   - Trocas de servidor: {pool.last_switches} "
+                f"({'agrupado por servidor' if pool.login_affinity else 'sem agrupamento'})")
+    for mode, stats in pool.affinity_stats.summary().items():
+        logger.info(f"   - Média {mode}: {stats['seconds_per_account']:.2f}s/conta, "
+                    f"{stats['switches_per_account']:.2f} troca(s)/conta em {stats['cycles']} ciclo(s)")
+    if ledger is not None:
+        ledger.log_summary(ledger.end_cycle())
     logger.info("=" * 80)
 
+    # Lotes não gravados: as contas saem dos resultados e o scheduler_tick
+    # as devolve à fila em retry_base (coleta de novo em vez de perder)
+    failed_writes = set(write_stats['failed'])
+    if failed_writes:
+        logger.error(f"❌ {len(failed_writes)} resultado(s) não gravado(s), coleta será refeita: "
+                     f"{', '.join(sorted(failed_writes))}")
+        results = [r for r in results if r['account_id'] not in failed_writes]
+
+    return results
+
+def scheduler_tick(pool: TerminalPool, writer: BatchWriter, scheduler: AccountScheduler,
+                   breaker: LoginCircuitBreaker, ledger: Optional[TimingLedger] = None) -> int:
+    """Despacha as contas vencidas e reagenda cada uma conforme o resultado"""
+    now = time.time()
+    due_accounts = []
+    for account in scheduler.pop_due(now):
+        if breaker.allow(account['id'], now):
+            due_accounts.append(account)
+        else:
+            # Circuito aberto: nem tenta o login, volta para a fila em retry_at
+            scheduler.defer(account['id'], breaker.retry_at(account['id']))
+
+    if not due_accounts:
+        return 0
+
+    lag = scheduler.lag_summary()
+    logger.info(f"📈 Lag de agendamento: p50={lag['p50']:.1f}s p95={lag['p95']:.1f}s max={lag['max']:.1f}s")
+
+    rescheduled = set()
+    try:
+        results = collector_cycle(pool, writer, due_accounts, breaker, ledger)
+
+        now = time.time()
+        for result in results:
+            scheduler.reschedule(result, now, not_before=breaker.retry_at(result['account_id']))
+            rescheduled.add(result['account_id'])
+    finally:
+        # Ciclo abortou (ex: banco travado, worker morto): as contas já saíram
+        # do heap e só voltam por aqui; sem isso nunca mais seriam coletadas
+        retry_at = time.time() + scheduler.retry_base
+        for account in due_accounts:
+            if account['id'] not in rescheduled:
+                scheduler.defer(account['id'], retry_at)
+
+    return len(results)
+
 def main():
     """Loop principal do collector"""
     logger.info("=" * 80)
     logger.info("MT5 COLLECTOR - WORKER POOL")
     logger.info("=" * 80)
-    logger.info(f"Workers: {NUM_WORKERS}")
-    logger.info(f"Intervalo: {COLLECT_INTERVAL}s")
+    logger.info(f"Workers: {len(MT5_TERMINALS)} (um por terminal)")
+    for path in MT5_TERMINALS:
+        logger.info(f"   - {path}")
+    logger.info(f"Intervalo (posições abertas): {COLLECT_INTERVAL}s")
+    logger.info(f"Intervalo (flat): {IDLE_INTERVAL}s")
+    logger.info(f"Backoff em falha: {RETRY_BASE_INTERVAL}s..{RETRY_MAX_INTERVAL}s")
+    logger.info(f"Circuit breaker: {CIRCUIT_FAILURE_THRESHOLD} falhas de login, "
+                f"backoff {CIRCUIT_BASE_BACKOFF}s..{CIRCUIT_MAX_BACKOFF}s")
     logger.info(f"Database: {DATABASE_PATH}")
+    logger.info(f"Sessão persistente: {'sim' if PERSISTENT_SESSION else 'não'}")
+    logger.info(f"Afinidade de login por servidor: {'sim' if LOGIN_AFFINITY else 'não'}")
     logger.info("=" * 80)
 
+    # Pool criado uma única vez: os workers mantêm a sessão MT5 entre ciclos
+    pool = TerminalPool(MT5_TERMINALS)
+    writer = BatchWriter(DATABASE_PATH, snapshot_max_gap=SNAPSHOT_MAX_GAP)
+    scheduler = AccountScheduler(
+        active_interval=COLLECT_INTERVAL,
+        idle_interval=IDLE_INTERVAL,
+        retry_base=RETRY_BASE_INTERVAL,
+        retry_max=RETRY_MAX_INTERVAL
+    )
+    breaker = LoginCircuitBreaker(
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        base_backoff=CIRCUIT_BASE_BACKOFF,
+        max_backoff=CIRCUIT_MAX_BACKOFF
+    )
+    next_roster_refresh = 0.0
+    roster: Dict[str, Dict] = {}
+
+    # Tempo por conta/fase (JSONL + percentis por ciclo) e /metrics
+    ledger = TimingLedger('pool')
+    metrics = MetricsServer(ledger, gauges=lambda: {
+        'scheduled_accounts': len(scheduler.entries),
+        'scheduler_lag_seconds': scheduler.lag_by_account(),
+    })
+    if METRICS_PORT:
+        metrics.start()
+
     try:
         while True:
             try:
-                collector_cycle()
+                # Roster (contas ativas) recarregado a cada COLLECT_INTERVAL;
+                # o agendador recebe só as contas adicionadas/removidas/alteradas
+                if time.time() >= next_roster_refresh:
+                    roster, diff = diff_roster(roster, fetch_active_accounts())
+                    for account in diff.added:
+                        breaker.restore(account['id'], account['last_error'])
+                    scheduler.apply_diff(diff.added, diff.removed, diff.changed, time.time())
+                    if diff:
+                        logger.info(f"📋 Roster: {diff.summary()}")
+                    next_roster_refresh = time.time() + COLLECT_INTERVAL
+
+                scheduler_tick(pool, writer, scheduler, breaker, ledger)
             except Exception as e:
                 logger.error(f"❌ Erro no ciclo de coleta: {e}", exc_info=True)
 
-            # Aguarda próximo ciclo
-            logger.info(f"⏳ Aguardando {COLLECT_INTERVAL}s até próximo ciclo...\n")
-            time.sleep(COLLECT_INTERVAL)
+            # Dorme até a próxima conta vencer (ou o próximo refresh do roster)
+            next_due = scheduler.next_due()
+            wake_at = min(next_due, next_roster_refresh) if next_due is not None else next_roster_refresh
+            time.sleep(min(max(wake_at - time.time(), 1), COLLECT_INTERVAL))
 
     except KeyboardInterrupt:
         logger.info("\n🛑 Collector interrompido pelo usuário")
     except Exception as e:
         logger.error(f"❌ Erro fatal: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        pool.close()
+        writer.close()
+        metrics.stop()
+        ledger.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+COLLECTOR SUPERVISOR - VÁRIAS CONTAS DO MT5_COLLECTOR EM UM PROCESSO
+============================================================================
+mt5_collector.py roda uma conta por processo: N contas = N interpretadores
+Python, cada um com seu run_loop/time.sleep, disputando o mesmo terminal.
+
+O supervisor carrega as contas via fetch_account_credentials e roda cada
+uma como task cooperativa:
+
+- Um event loop asyncio: cada conta coleta a cada SYNC_INTERVAL
+- Pool de terminais compartilhado: um processo worker por terminal
+  (MT5_TERMINALS), sessão MT5 mantida entre contas; a conta vai sempre
+  para o mesmo terminal (hash login@server) e cada terminal atende uma
+  conta por vez
+- Uma sessão HTTP (BackendClient) e uma outbox para todas as contas
+- Rate limit global de logins (SUPERVISOR_LOGIN_RATE por segundo)
+- --all: roster do backend em cache (RosterCache, 304 se nada mudou),
+  recarregado a cada SUPERVISOR_ROSTER_INTERVAL; contas novas ganham
+  task, removidas são canceladas, alteradas trocam as credenciais. Roda
+  até Ctrl+C, mesmo com o roster vazio por um tempo
+- Worker de terminal que morre (BrokenProcessPool) é recriado na próxima
+  coleta daquele terminal
+- Memória (RSS do supervisor + workers) reportada por conta gerenciada
+- Tempo por conta/fase no ledger do mt5_collector (p50/p95/p99 a cada
+  relatório) e endpoint /metrics
+
+Uso:
+    python collector_supervisor.py <account_id> [<account_id> ...]
+    python collector_supervisor.py --all
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+import sys
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import mt5_collector
+from mt5_collector import mt5, MT5Collector, MT5_PATH, SYNC_INTERVAL, RETRY_DELAY, fetch_account_credentials
+from cycle_planner import terminal_for_account
+from roster import RosterCache, RosterDiff
+from timing_ledger import METRICS_PORT, MetricsServer
+
+# ==========================================
+# CONFIGURAÇÕES
+# ==========================================
+
+# Terminais compartilhados (um worker por instalação, separados por ';')
+MT5_TERMINALS = [
+    path.strip()
+    for path in os.getenv('MT5_TERMINALS', MT5_PATH).replace(',', ';').split(';')
+    if path.strip()
+]
+
+# Logins por segundo somando todas as contas/terminais
+SUPERVISOR_LOGIN_RATE = float(os.getenv('SUPERVISOR_LOGIN_RATE', '2'))
+
+# Intervalo (s) do relatório de memória/coletas
+SUPERVISOR_REPORT_INTERVAL = int(os.getenv('SUPERVISOR_REPORT_INTERVAL', '300'))
+
+# Intervalo (s) entre buscas do roster no modo --all
+SUPERVISOR_ROSTER_INTERVAL = int(os.getenv('SUPERVISOR_ROSTER_INTERVAL', '60'))
+
+# Backoff máximo (s) de uma conta com falhas seguidas
+MAX_RETRY_DELAY = 300
+
+# ==========================================
+# WORKER (um processo por terminal)
+# ==========================================
+
+_terminal_path = MT5_PATH
+
+# Sessão MT5 do worker: inicializada uma vez, mantida entre contas
+_session_active = False
+
+# Códigos RES_E_INTERNAL_FAIL_* do MetaTrader5 (mesmos do collector_pool):
+# comunicação com o terminal perdida
+IPC_ERROR_CODES = {-10001, -10002, -10003, -10004, -10005}
+
+def worker_init(terminal_path: str):
+    """Initializer do worker: vincula o processo a um terminal"""
+    global _terminal_path
+    _terminal_path = terminal_path
+
+def ensure_mt5_session() -> bool:
+    """Inicializa o terminal do worker na primeira coleta (ou após perder o IPC)"""
+    global _session_active
+    if not _session_active:
+        _session_active = mt5.initialize(path=_terminal_path)
+        if not _session_active:
+            print(f"❌ [Worker {os.getpid()}] Erro ao inicializar MT5: {mt5.last_error()}")
+    return _session_active
+
+def release_mt5_session():
+    """Encerra a sessão do worker; a próxima coleta inicializa de novo"""
+    global _session_active
+    mt5.shutdown()
+    _session_active = False
+
+def is_ipc_failure() -> bool:
+    """Último erro MT5 indica perda de comunicação com o terminal"""
+    try:
+        return mt5.last_error()[0] in IPC_ERROR_CODES
+    except Exception:
+        return False
+
+def collect_account(account: Dict) -> Dict:
+    """
+    Login + coleta de uma conta no terminal do worker.
+
+    A sessão MT5 fica aberta entre contas: login recusado não derruba o
+    terminal; só uma falha de IPC encerra a sessão (reinicializada na
+    próxima coleta).
+    """
+    started = time.monotonic()
+    collector = MT5Collector(
+        account_id=account['id'],
+        login=int(account['login']),
+        password=account['password'],
+        server=account['server'],
+        terminal_path=_terminal_path
+    )
+
+    data = None
+    with collector.timer.phase('mt5_init'):
+        session_ok = ensure_mt5_session()
+    if session_ok and collector.attach():
+        data = collector.get_account_data()
+    if data is None and is_ipc_failure():
+        release_mt5_session()
+
+    return {
+        'accountId': account['id'],
+        'data': data,
+        'elapsed': time.monotonic() - started,
+        'timings': collector.take_timings(),
+        'pid': os.getpid(),
+    }
+
+# ==========================================
+# RATE LIMIT / MEMÓRIA
+# ==========================================
+
+class LoginRateLimiter:
+    """Espaça os logins de todas as contas em 1/rate segundos"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+def process_rss(pid: int) -> Optional[int]:
+    """Memória residente (bytes) de um processo; None se não der para medir"""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    # Sem psutil: /proc (Linux)
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+# ==========================================
+# SUPERVISOR
+# ==========================================
+
+class CollectorSupervisor:
+    """Roda várias contas do mt5_collector como tasks de um único event loop"""
+
+    def __init__(self, terminals: List[str] = MT5_TERMINALS, sync_interval: float = SYNC_INTERVAL,
+                 login_rate: float = SUPERVISOR_LOGIN_RATE, report_interval: float = SUPERVISOR_REPORT_INTERVAL,
+                 retry_delay: float = RETRY_DELAY, roster_interval: float = SUPERVISOR_ROSTER_INTERVAL):
+        self.terminals = terminals
+        self.sync_interval = sync_interval
+        self.report_interval = report_interval
+        self.roster_interval = roster_interval
+        self.retry_delay = retry_delay
+        self.login_rate = login_rate
+
+        self.executors = [self.new_executor(path) for path in terminals]
+        self.limiter: Optional[LoginRateLimiter] = None
+
+        # account_id -> estado da conta gerenciada / task da conta
+        self.accounts: Dict[str, Dict] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.cycles: Optional[int] = None
+        self.worker_pids = set()
+
+    @staticmethod
+    def new_executor(terminal_path: str) -> ProcessPoolExecutor:
+        """Um processo worker vinculado ao terminal"""
+        return ProcessPoolExecutor(max_workers=1, initializer=worker_init, initargs=(terminal_path,))
+
+    def restart_executor(self, terminal: int, broken: ProcessPoolExecutor):
+        """
+        Recria o worker de um terminal que morreu: um pool quebrado levanta
+        BrokenProcessPool em todo submit seguinte. Tasks da mesma conta/terminal
+        que falharem juntas só recriam uma vez (compara com o executor quebrado).
+        """
+        if self.executors[terminal] is not broken:
+            return
+        print(f"♻️ Worker do terminal {terminal} morreu, recriando: {self.terminals[terminal]}")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executors[terminal] = self.new_executor(self.terminals[terminal])
+
+    async def load_accounts(self, account_ids: List[str]) -> List[Dict]:
+        """Busca as credenciais das contas (em paralelo, mesma sessão HTTP)"""
+        credentials = await asyncio.gather(
+            *(asyncio.to_thread(fetch_account_credentials, account_id) for account_id in account_ids)
+        )
+        return [c for c in credentials if c is not None]
+
+    def add_account(self, account: Dict):
+        """Passa a gerenciar a conta (estado + task)"""
+        if account['id'] in self.accounts:
+            return
+        self.accounts[account['id']] = {
+            'account': account,
+            'terminal': terminal_for_account(account, len(self.terminals)),
+            'collections': 0,
+            'errors': 0,
+            'consecutive_errors': 0,
+            'last_sync': None,
+            'last_elapsed': 0.0,
+        }
+        self.tasks[account['id']] = asyncio.create_task(self.run_account(account['id'], self.cycles))
+
+    def remove_account(self, account_id: str):
+        """Para de gerenciar a conta (cancela a task)"""
+        task = self.tasks.pop(account_id, None)
+        if task is not None:
+            task.cancel()
+        self.accounts.pop(account_id, None)
+
+    def apply_roster(self, diff: RosterDiff):
+        """Aplica só as mudanças do roster nas tasks em execução"""
+        for account_id in diff.removed:
+            self.remove_account(account_id)
+        for account in diff.changed:
+            state = self.accounts.get(account['id'])
+            if state is not None:
+                state['account'] = account
+                state['terminal'] = terminal_for_account(account, len(self.terminals))
+        for account in diff.added:
+            self.add_account(account)
+
+    async def roster_loop(self, roster: RosterCache):
+        while True:
+            await asyncio.sleep(self.roster_interval)
+            try:
+                diff = await asyncio.to_thread(roster.refresh)
+            except Exception as e:
+                print(f"⚠️ Roster: erro ao atualizar: {e}")
+                continue
+            if diff:
+                print(f"📋 Roster: {diff.summary()}")
+                self.apply_roster(diff)
+
+    async def collect_once(self, state: Dict) -> bool:
+        """Uma coleta da conta: rate limit -> terminal -> outbox"""
+        await self.limiter.acquire()
+
+        loop = asyncio.get_running_loop()
+        terminal = state['terminal']
+        executor = self.executors[terminal]
+        try:
+            result = await loop.run_in_executor(executor, collect_account, state['account'])
+        except BrokenProcessPool as e:
+            print(f"❌ [{state['account']['login']}] Worker do terminal morreu: {e}")
+            self.restart_executor(terminal, executor)
+            result = {'data': None, 'elapsed': 0.0, 'timings': {}, 'pid': None}
+        except Exception as e:
+            print(f"❌ [{state['account']['login']}] Erro no worker do terminal: {e}")
+            result = {'data': None, 'elapsed': 0.0, 'timings': {}, 'pid': None}
+
+        if result['pid']:
+            self.worker_pids.add(result['pid'])
+        state['last_elapsed'] = result['elapsed']
+
+        account = state['account']
+        timings = result['timings']
+        data = result['data']
+        if data is None:
+            mt5_collector.get_ledger().record(account['id'], account['server'], timings, ok=False)
+            state['errors'] += 1
+            state['consecutive_errors'] += 1
+            return False
+
+        started = time.perf_counter()
+        mt5_collector.get_outbox().append(data)
+        mt5_collector.get_drainer().notify()
+        timings['outbox_write'] = time.perf_counter() - started
+        mt5_collector.get_ledger().record(account['id'], account['server'], timings)
+        state['collections'] += 1
+        state['consecutive_errors'] = 0
+        state['last_sync'] = datetime.now()
+        return True
+
+    async def run_account(self, account_id: str, cycles: Optional[int] = None):
+        """Loop cooperativo de uma conta (substitui o run_loop/time.sleep por processo)"""
+        loop = asyncio.get_running_loop()
+        state = self.accounts[account_id]
+        done = 0
+
+        while cycles is None or done < cycles:
+            started = loop.time()
+            success = await self.collect_once(state)
+            done += 1
+
+            if success:
+                delay = self.sync_interval - (loop.time() - started)
+            else:
+                errors = state['consecutive_errors']
+                delay = min(self.retry_delay * 2 ** (errors - 1), MAX_RETRY_DELAY)
+
+            if (cycles is None or done < cycles) and delay > 0:
+                await asyncio.sleep(delay)
+
+    def memory_report(self) -> Dict:
+        """RSS do supervisor + workers, total e por conta gerenciada"""
+        pids = [os.getpid()] + sorted(self.worker_pids)
+        sizes = [process_rss(pid) for pid in pids]
+        measured = [size for size in sizes if size is not None]
+        total = sum(measured) if measured else None
+        accounts = len(self.accounts)
+
+        return {
+            'accounts': accounts,
+            'processes': len(pids),
+            'rss_total': total,
+            'rss_per_account': total / accounts if total is not None and accounts else None,
+        }
+
+    def print_report(self):
+        memory = self.memory_report()
+        collections = sum(s['collections'] for s in self.accounts.values())
+        errors = sum(s['errors'] for s in self.accounts.values())
+
+        print("\n" + "="*60)
+        print(f"📊 SUPERVISOR: {memory['accounts']} conta(s), {len(self.terminals)} terminal(is)")
+        print(f"   ✅ Coletas: {collections} | ❌ Falhas: {errors} | 📬 Outbox pendente: {mt5_collector.get_outbox().pending()}")
+        if memory['rss_total'] is not None:
+            print(f"   🧠 Memória: {memory['rss_total'] / 2**20:.1f} MB em {memory['processes']} processo(s) "
+                  f"= {memory['rss_per_account'] / 2**20:.2f} MB/conta")
+        else:
+            print("   🧠 Memória: n/d (instale psutil)")
+        ledger = mt5_collector.get_ledger()
+        ledger.log_summary(ledger.end_cycle(), log=print)
+        print("="*60)
+
+    async def report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.print_report()
+
+    async def run(self, account_ids: Optional[List[str]] = None, cycles: Optional[int] = None,
+                  roster: Optional[RosterCache] = None) -> Dict:
+        """
+        Carrega as contas e roda até Ctrl+C (ou `cycles` coletas por conta).
+
+        Args:
+            account_ids: contas fixas (credenciais via fetch_account_credentials)
+            cycles: coletas por conta (None = sem fim)
+            roster: modo --all, contas do roster com atualização incremental
+
+        Returns:
+            memory_report() ao final
+        """
+        self.limiter = LoginRateLimiter(self.login_rate)
+        self.cycles = cycles
+
+        if roster is not None:
+            await asyncio.to_thread(roster.refresh)
+            accounts = roster.list()
+        else:
+            accounts = await self.load_accounts(account_ids or [])
+
+        if not accounts and roster is None:
+            print("❌ Nenhuma conta carregada. Abortando...")
+            return self.memory_report()
+
+        print(f"🤖 {len(accounts)} conta(s) em {len(self.terminals)} terminal(is), "
+              f"intervalo {self.sync_interval}s, até {self.login_rate} login(s)/s")
+
+        mt5_collector.get_drainer().start()
+        for account in accounts:
+            self.add_account(account)
+
+        metrics = MetricsServer(mt5_collector.get_ledger(), gauges=lambda: {
+            'accounts': len(self.accounts), 'outbox_pending': mt5_collector.get_outbox().pending(),
+        })
+        if METRICS_PORT:
+            metrics.start()
+
+        background = [asyncio.create_task(self.report_loop())]
+        try:
+            if roster is not None:
+                # --all: roda até ser cancelado; um roster vazio só esvazia as
+                # tasks até a próxima atualização trazer contas de volta
+                roster_task = asyncio.create_task(self.roster_loop(roster))
+                background.append(roster_task)
+                await roster_task
+            else:
+                # Contas fixas: termina quando todas fizerem suas `cycles` coletas
+                while True:
+                    running = [task for task in self.tasks.values() if not task.done()]
+                    if not running:
+                        break
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in background + list(self.tasks.values()):
+                task.cancel()
+            self.print_report()
+            report = self.memory_report()
+            metrics.stop()
+            self.close()
+        return report
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(cancel_futures=True)
+
+# ==========================================
+# MAIN
+# ==========================================
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("❌ Uso: python collector_supervisor.py <account_id> [<account_id> ...]")
+        print("   ou:  python collector_supervisor.py --all")
+        sys.exit(1)
+
+    print(f"\n{'='*60}")
+    print("🤖 iDeepX MT5 Collector - Supervisor")
+    print(f"{'='*60}\n")
+
+    supervisor = CollectorSupervisor()
+    try:
+        if sys.argv[1] == '--all':
+            asyncio.run(supervisor.run(roster=RosterCache(mt5_collector.get_backend())))
+        else:
+            asyncio.run(supervisor.run(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print("\n⏹️ Supervisor interrompido pelo usuário")
+    finally:
+        mt5_collector.get_drainer().stop()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+CYCLE PLANNER - ORDEM DE LOGIN COM AFINIDADE DE SERVIDOR
+============================================================================
+Cada mt5.login em um servidor diferente do anterior (GMI -> Doo Prime ->
+GMI ...) obriga o terminal a reconectar em outro trade server. Na ordem do
+backend/lastHeartbeat as contas vêm misturadas e quase todo login troca de
+servidor.
+
+O planner agrupa as contas por `server` (e por terminal, quando há
+sharding) e ordena os grupos para que logins consecutivos fiquem no mesmo
+servidor:
+
+- Dentro do grupo, a ordem original é mantida (mais atrasadas primeiro)
+- Grupos na ordem da primeira conta de cada um (prioridade preservada)
+- O grupo do servidor em que o terminal já está logado vem primeiro
+
+terminal_for_account fixa cada conta em um terminal (hash estável), usado
+pelo collector_pool e pelo collector_supervisor.
+
+AffinityStats acumula tempo por conta e trocas de servidor por modo
+(agrupado / sem agrupamento) para comparar os dois.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import zlib
+from typing import Dict, List, Optional
+
+def terminal_for_account(account: Dict, num_terminals: int) -> int:
+    """Índice do terminal da conta (hash estável de login@server)"""
+    key = f"{account['login']}@{account['server']}".encode()
+    return zlib.crc32(key) % num_terminals
+
+def plan_by_server(accounts: List[Dict], current_server: Optional[str] = None) -> List[Dict]:
+    """
+    Reordena as contas agrupando por servidor.
+
+    Args:
+        accounts: contas na ordem de prioridade
+        current_server: servidor em que o terminal está logado agora
+
+    Returns:
+        Nova lista com as mesmas contas, agrupadas por servidor
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for account in accounts:
+        groups.setdefault(account['server'], []).append(account)
+
+    order = list(groups)
+    if current_server in groups:
+        order.remove(current_server)
+        order.insert(0, current_server)
+
+    return [account for server in order for account in groups[server]]
+
+def count_server_switches(accounts: List[Dict], current_server: Optional[str] = None) -> int:
+    """Quantos logins trocam de servidor em relação ao login anterior"""
+    switches = 0
+    previous = current_server
+    for account in accounts:
+        if previous is not None and account['server'] != previous:
+            switches += 1
+        previous = account['server']
+    return switches
+
+class AffinityStats:
+    """Tempo por conta e trocas de servidor acumulados por modo de ordenação"""
+
+    def __init__(self):
+        # modo ('agrupado' / 'sem agrupamento') -> totais
+        self.modes: Dict[str, Dict] = {}
+
+    def record(self, grouped: bool, elapsed: float, accounts: int, switches: int):
+        mode = self.modes.setdefault(
+            'agrupado' if grouped else 'sem agrupamento',
+            {'cycles': 0, 'elapsed': 0.0, 'accounts': 0, 'switches': 0}
+        )
+        mode['cycles'] += 1
+        mode['elapsed'] += elapsed
+        mode['accounts'] += accounts
+        mode['switches'] += switches
+
+    def summary(self) -> Dict[str, Dict]:
+        """Por modo: ciclos, segundos por conta e trocas por conta"""
+        return {
+            name: {
+                'cycles': mode['cycles'],
+                'seconds_per_account': mode['elapsed'] / mode['accounts'] if mode['accounts'] else 0.0,
+                'switches_per_account': mode['switches'] / mode['accounts'] if mode['accounts'] else 0.0,
+            }
+            for name, mode in self.modes.items()
+        }
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+DB WRITER - GRAVAÇÃO EM LOTE DOS RESULTADOS DO COLLECTOR
+============================================================================
+Aplica os resultados de um ciclo inteiro em UMA transação:
+- UPDATE TradingAccount (contas coletadas) via executemany
+- INSERT AccountSnapshot via executemany
+- UPDATE TradingAccount (contas com erro) via executemany
+
+Detecção de mudança: cada conta guarda em memória o fingerprint do último
+snapshot gravado. Se balance/equity/posições/P&L não mudaram, a conta só
+tem lastHeartbeat/lastSnapshotAt atualizados (sem novo AccountSnapshot).
+Um snapshot de keep-alive é gravado a cada `snapshot_max_gap` segundos
+mesmo sem mudança, para o histórico não ficar com buracos.
+
+StreamingWriter grava em micro-lotes à medida que os resultados chegam
+(thread dedicada), sobrepondo a persistência com a coleta. Lote cuja
+transação falha é regravado algumas vezes (backoff); se ainda falhar, as
+contas dele saem em stats['failed'] para o chamador coletar de novo.
+
+Conexão persistente em modo WAL: o backend Prisma continua lendo o mesmo
+dev.db enquanto o collector grava, e o fsync acontece uma vez por lote em
+vez de uma vez por conta.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+# Campos que definem se o snapshot mudou (lastHeartbeat fica de fora)
+FINGERPRINT_FIELDS = (
+    'balance', 'equity', 'margin', 'free_margin', 'margin_level',
+    'open_trades', 'open_pl', 'day_pl', 'week_pl', 'month_pl', 'total_pl'
+)
+
+def snapshot_fingerprint(status: str, data: Dict) -> Tuple:
+    """Fingerprint do snapshot de uma conta"""
+    return (status,) + tuple(str(data[field]) for field in FINGERPRINT_FIELDS)
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# STATEMENTS (preparados uma vez e reutilizados pelo cache do sqlite3)
+# ============================================================================
+
+UPDATE_CONNECTED_SQL = """
+    UPDATE TradingAccount SET
+        status = ?,
+        connected = ?,
+        balance = ?,
+        equity = ?,
+        margin = ?,
+        freeMargin = ?,
+        marginLevel = ?,
+        openTrades = ?,
+        openPL = ?,
+        dayPL = ?,
+        weekPL = ?,
+        monthPL = ?,
+        totalPL = ?,
+        lastHeartbeat = ?,
+        lastError = ?,
+        updatedAt = CURRENT_TIMESTAMP,
+        lastSnapshotAt = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+INSERT_SNAPSHOT_SQL = """
+    INSERT INTO AccountSnapshot (
+        tradingAccountId, capturedAt,
+        balance, equity, margin, freeMargin, marginLevel,
+        openTrades, openPL,
+        dayPL, weekPL, monthPL, totalPL
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Snapshot sem mudança: a conta foi coletada, então lastSnapshotAt avança
+# também (o dashboard usa para "coletadas hoje" / última coleta)
+UPDATE_HEARTBEAT_SQL = """
+    UPDATE TradingAccount SET
+        lastHeartbeat = ?,
+        updatedAt = CURRENT_TIMESTAMP,
+        lastSnapshotAt = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+UPDATE_ERROR_SQL = """
+    UPDATE TradingAccount SET
+        status = ?,
+        connected = 0,
+        lastError = ?,
+        updatedAt = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+class BatchWriter:
+    """Grava resultados de coleta em lote (uma transação por chamada)"""
+
+    def __init__(self, database_path: str, snapshot_max_gap: float = 900):
+        self.database_path = database_path
+        self.snapshot_max_gap = snapshot_max_gap
+        # account_id -> (fingerprint, monotonic do último snapshot gravado)
+        self.last_written: Dict[str, Tuple[Tuple, float]] = {}
+        # isolation_level=None: controle explícito de BEGIN/COMMIT
+        # check_same_thread=False: usada pela thread do StreamingWriter
+        self.conn = sqlite3.connect(
+            database_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def close(self):
+        self.conn.close()
+
+    def write(self, results: List[Dict]) -> Dict:
+        """
+        Aplica os resultados em uma única transação.
+
+        Args:
+            results: lista de resultados de process_account
+
+        Returns:
+            Dict com rows, elapsed, rows_per_sec e snapshots_skipped
+        """
+        connected_rows = []
+        snapshot_rows = []
+        heartbeat_rows = []
+        error_rows = []
+        written = {}
+        now = time.monotonic()
+
+        for result in results:
+            data = result['data']
+            if data:
+                fingerprint = snapshot_fingerprint(result['status'], data)
+                previous = self.last_written.get(result['account_id'])
+                if (previous is not None and previous[0] == fingerprint
+                        and now - previous[1] < self.snapshot_max_gap):
+                    # Nada mudou: só o heartbeat
+                    heartbeat_rows.append((data['last_heartbeat'], result['account_id']))
+                    continue
+
+                written[result['account_id']] = (fingerprint, now)
+                connected_rows.append((
+                    result['status'],
+                    1 if result['status'] == 'CONNECTED' else 0,
+                    data['balance'],
+                    data['equity'],
+                    data['margin'],
+                    data['free_margin'],
+                    data['margin_level'],
+                    data['open_trades'],
+                    data['open_pl'],
+                    data['day_pl'],
+                    data['week_pl'],
+                    data['month_pl'],
+                    data['total_pl'],
+                    data['last_heartbeat'],
+                    result['error'],
+                    result['account_id']
+                ))
+                snapshot_rows.append((
+                    result['account_id'],
+                    data['last_heartbeat'],
+                    data['balance'],
+                    data['equity'],
+                    data['margin'],
+                    data['free_margin'],
+                    data['margin_level'],
+                    data['open_trades'],
+                    data['open_pl'],
+                    data['day_pl'],
+                    data['week_pl'],
+                    data['month_pl'],
+                    data['total_pl']
+                ))
+            else:
+                error_rows.append((result['status'], result['error'], result['account_id']))
+                self.last_written.pop(result['account_id'], None)
+                logger.warning(f"⚠️ Conta {result['account_id']} com erro: {result['error']}")
+
+        start = time.perf_counter()
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if connected_rows:
+                self.conn.executemany(UPDATE_CONNECTED_SQL, connected_rows)
+            if snapshot_rows:
+                self.conn.executemany(INSERT_SNAPSHOT_SQL, snapshot_rows)
+            if heartbeat_rows:
+                self.conn.executemany(UPDATE_HEARTBEAT_SQL, heartbeat_rows)
+            if error_rows:
+                self.conn.executemany(UPDATE_ERROR_SQL, error_rows)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        # Fingerprints só valem depois do COMMIT
+        self.last_written.update(written)
+
+        elapsed = time.perf_counter() - start
+        rows = len(connected_rows) + len(snapshot_rows) + len(heartbeat_rows) + len(error_rows)
+
+        return {
+            'rows': rows,
+            'elapsed': elapsed,
+            'rows_per_sec': rows / elapsed if elapsed > 0 else 0.0,
+            'snapshots_skipped': len(heartbeat_rows),
+        }
+
+class StreamingWriter:
+    """
+    Writer dedicado (thread) que persiste resultados em micro-lotes.
+
+    Cada resultado entra na fila assim que o worker termina; o lote é gravado
+    quando atinge `batch_size` resultados ou quando o mais antigo espera há
+    `max_delay` segundos - contas rápidas aparecem no dashboard sem esperar
+    a conta mais lenta do ciclo.
+    """
+
+    def __init__(self, writer: BatchWriter, batch_size: int = 20, max_delay: float = 1.0, ledger=None,
+                 retries: int = 3, retry_delay: float = 0.5):
+        """
+        Args:
+            ledger: TimingLedger opcional (fase db_write de cada lote)
+            retries: novas tentativas de um lote que falhou (ex: database is locked)
+            retry_delay: espera antes da 1ª nova tentativa (dobra a cada uma)
+        """
+        self.writer = writer
+        self.ledger = ledger
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue()
+        self.stats = {'rows': 0, 'elapsed': 0.0, 'batches': 0, 'rows_per_sec': 0.0, 'snapshots_skipped': 0,
+                      'retries': 0, 'failed': []}
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, result: Dict):
+        """Enfileira um resultado para gravação"""
+        self.queue.put(result)
+
+    def close(self) -> Dict:
+        """
+        Grava o que restou na fila, encerra a thread e retorna as estatísticas.
+
+        stats['failed'] lista os account_id de lotes que não foram gravados
+        nem depois das novas tentativas.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        return self.stats
+
+    def _flush(self, batch: List[Dict]):
+        if not batch:
+            return
+
+        attempt = 0
+        while True:
+            try:
+                batch_stats = self.writer.write(batch)
+                break
+            except Exception as e:
+                if attempt >= self.retries:
+                    logger.error(f"❌ Lote de {len(batch)} resultado(s) não gravado após "
+                                 f"{attempt + 1} tentativa(s): {e}")
+                    self.stats['failed'].extend(result['account_id'] for result in batch)
+                    return
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f"⚠️ Erro ao gravar lote de {len(batch)} resultado(s): {e} "
+                               f"(nova tentativa em {delay:.1f}s)")
+                attempt += 1
+                self.stats['retries'] += 1
+                time.sleep(delay)
+
+        if self.ledger is not None:
+            self.ledger.record(None, None, {'db_write': batch_stats['elapsed']}, rows=batch_stats['rows'])
+
+        self.stats['rows'] += batch_stats['rows']
+        self.stats['elapsed'] += batch_stats['elapsed']
+        self.stats['batches'] += 1
+        self.stats['snapshots_skipped'] += batch_stats['snapshots_skipped']
+        if self.stats['elapsed'] > 0:
+            self.stats['rows_per_sec'] = self.stats['rows'] / self.stats['elapsed']
+
+    def _run(self):
+        batch = []
+        oldest = None
+
+        while True:
+            timeout = None if oldest is None else max(oldest + self.max_delay - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False  # prazo do lote expirou
+
+            if item is None:
+                self._flush(batch)
+                return
+
+            if item is not False:
+                if not batch:
+                    oldest = time.monotonic()
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or (batch and time.monotonic() - oldest >= self.max_delay):
+                self._flush(batch)
+                batch = []
+                oldest = None
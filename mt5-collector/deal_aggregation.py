@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+DEAL AGGREGATION - P/L POR PERÍODO VETORIZADO (NUMPY)
+============================================================================
+Agregação de deals compartilhada pelos collectors MT5.
+
+Em vez de percorrer os deals em Python (datetime.fromtimestamp + comparação
+de datetimes a cada deal), os deals viram um array estruturado NumPy:
+
+1. Filtro por type/entry com máscara booleana
+2. Valor do deal: profit (+ commission + swap, conforme a regra do collector)
+3. Ordenação por time + soma acumulada
+4. Cada período [início, fim) vira dois np.searchsorted na coluna time
+
+Custo: O(n log n) uma vez por conta + O(log n) por período, independente
+de quantos períodos (dia/semana/mês/customizados) são calculados.
+
+history_deals_get do MetaTrader5 devolve uma tupla de TradeDeal
+(namedtuples); to_deal_array converte coluna a coluna (np.fromiter).
+Arrays estruturados já prontos são aceitos sem conversão por deal.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Apenas trades entram no P/L (DEAL_TYPE_BUY, DEAL_TYPE_SELL)
+TRADE_DEAL_TYPES = (0, 1)
+
+# Saídas de posição (DEAL_ENTRY_OUT, DEAL_ENTRY_INOUT)
+EXIT_DEAL_ENTRIES = (1, 2)
+
+DEAL_DTYPE = np.dtype([
+    ('ticket', np.int64),
+    ('time', np.int64),
+    ('type', np.int32),
+    ('entry', np.int32),
+    ('profit', np.float64),
+    ('commission', np.float64),
+    ('swap', np.float64),
+])
+
+def period_starts(now: datetime) -> Dict[str, int]:
+    """Início do dia/semana/mês (calendário UTC) como timestamps"""
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_week = start_of_day - timedelta(days=now.weekday())
+    start_of_month = start_of_day.replace(day=1)
+
+    return {
+        'day': int(start_of_day.timestamp()),
+        'week': int(start_of_week.timestamp()),
+        'month': int(start_of_month.timestamp()),
+    }
+
+def to_deal_array(deals) -> np.ndarray:
+    """
+    Converte deals do MT5 em array estruturado DEAL_DTYPE.
+
+    Aceita None, tupla/lista de TradeDeal (ou qualquer objeto com os
+    atributos de DEAL_DTYPE) e arrays estruturados NumPy.
+    """
+    if deals is None or len(deals) == 0:
+        return np.empty(0, dtype=DEAL_DTYPE)
+
+    if isinstance(deals, np.ndarray) and deals.dtype.names:
+        if deals.dtype == DEAL_DTYPE:
+            return deals
+        array = np.zeros(len(deals), dtype=DEAL_DTYPE)
+        for name in DEAL_DTYPE.names:
+            if name in deals.dtype.names:
+                array[name] = deals[name]
+        return array
+
+    # Coluna a coluna: map(attrgetter) roda em C, sem tupla intermediária por deal
+    array = np.empty(len(deals), dtype=DEAL_DTYPE)
+    for name in DEAL_DTYPE.names:
+        array[name] = np.fromiter(map(attrgetter(name), deals), dtype=DEAL_DTYPE[name], count=len(deals))
+    return array
+
+class DealSeries:
+    """Deals filtrados, ordenados por time, com soma acumulada para consulta por período"""
+
+    def __init__(self, deals, types: Optional[Iterable[int]] = TRADE_DEAL_TYPES,
+                 entries: Optional[Iterable[int]] = None, include_costs: bool = True):
+        """
+        Args:
+            deals: deals do MT5 (ver to_deal_array)
+            types: deal.type aceitos (None = todos)
+            entries: deal.entry aceitos (None = todos)
+            include_costs: soma commission + swap ao profit
+        """
+        array = to_deal_array(deals)
+
+        mask = np.ones(len(array), dtype=bool)
+        if types is not None:
+            mask &= np.isin(array['type'], tuple(types))
+        if entries is not None:
+            mask &= np.isin(array['entry'], tuple(entries))
+        array = array[mask]
+
+        values = array['profit']
+        if include_costs:
+            values = values + array['commission'] + array['swap']
+
+        order = np.argsort(array['time'])
+        self.times = array['time'][order]
+        self.cumulative = np.concatenate(([0.0], np.cumsum(values[order])))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def total(self, start: Optional[int] = None, end: Optional[int] = None) -> float:
+        """Soma dos deals com start <= time < end (None = sem limite)"""
+        lo = 0 if start is None else int(np.searchsorted(self.times, start, side='left'))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, end, side='left'))
+        if hi <= lo:
+            return 0.0
+        return float(self.cumulative[hi] - self.cumulative[lo])
+
+    def totals(self, periods: Dict[str, Tuple[Optional[int], Optional[int]]]) -> Dict[str, float]:
+        """Soma por período nomeado: {nome: (início, fim)}"""
+        return {name: self.total(start, end) for name, (start, end) in periods.items()}
+
+def calendar_pl(deals, now: datetime, **rules) -> Dict[str, float]:
+    """
+    P/L de dia/semana/mês (calendário UTC) a partir de `now`.
+
+    Args:
+        deals: deals do MT5
+        now: instante de referência (timezone aware)
+        **rules: types / entries / include_costs (ver DealSeries)
+
+    Returns:
+        Dict com day_pl, week_pl, month_pl
+    """
+    series = DealSeries(deals, **rules)
+    starts = period_starts(now)
+    return {f'{period}_pl': series.total(start) for period, start in starts.items()}
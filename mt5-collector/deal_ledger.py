@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+DEAL LEDGER - HISTÓRICO INCREMENTAL DE DEALS POR CONTA
+============================================================================
+Cache local (SQLite) dos deals de cada conta MT5, indexado pelo ticket.
+
+Em vez de baixar o mês inteiro + 365 dias de histórico a cada ciclo, o
+ledger guarda um high-water mark por conta e só busca deals mais novos que
+o último visto. P/L de dia/semana/mês é mantido como agregados
+incrementais; na virada de dia/semana/mês apenas o bucket é recalculado a
+partir dos deals locais (sem nova consulta ao MT5).
+
+Regra de P/L (mesma do collector_pool):
+- Apenas deal.type in [0, 1] (BUY/SELL), soma de deal.profit
+- Total = janela móvel de TOTAL_HISTORY_DAYS dias, somada dos deals locais
+  (mesmo significado do totalPL de antes do ledger)
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import sqlite3
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# Agregação vetorizada compartilhada (period_starts reexportado para os testes)
+from deal_aggregation import DealSeries, period_starts, to_deal_array, TRADE_DEAL_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Histórico baixado na primeira sincronização de uma conta
+TOTAL_HISTORY_DAYS = 365
+
+# Re-consulta alguns segundos antes do high-water mark (deals no mesmo
+# segundo / registrados com atraso); duplicados são descartados pelo ticket
+HIGH_WATER_OVERLAP = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    account_id  TEXT    NOT NULL,
+    ticket      INTEGER NOT NULL,
+    time        INTEGER NOT NULL,
+    type        INTEGER NOT NULL,
+    entry       INTEGER NOT NULL,
+    profit      REAL    NOT NULL,
+    commission  REAL    NOT NULL,
+    swap        REAL    NOT NULL,
+    PRIMARY KEY (account_id, ticket)
+);
+CREATE INDEX IF NOT EXISTS deals_account_time ON deals (account_id, time);
+
+CREATE TABLE IF NOT EXISTS ledger_state (
+    account_id   TEXT PRIMARY KEY,
+    high_water   INTEGER NOT NULL,
+    day_start    INTEGER NOT NULL,
+    week_start   INTEGER NOT NULL,
+    month_start  INTEGER NOT NULL,
+    day_pl       REAL    NOT NULL,
+    week_pl      REAL    NOT NULL,
+    month_pl     REAL    NOT NULL,
+    total_pl     REAL    NOT NULL
+);
+"""
+
+class DealLedger:
+    """Ledger local de deals com high-water mark e agregados de P/L por conta"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        # WAL: workers de terminais diferentes escrevem no mesmo arquivo
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _sum_since(self, account_id: str, since: int) -> float:
+        """Recalcula um bucket a partir dos deals locais"""
+        row = self.conn.execute(f"""
+            SELECT COALESCE(SUM(profit), 0) FROM deals
+            WHERE account_id = ? AND time >= ?
+              AND type IN ({','.join('?' * len(TRADE_DEAL_TYPES))})
+        """, (account_id, since, *TRADE_DEAL_TYPES)).fetchone()
+        return float(row[0])
+
+    def sync(self, account_id: str, fetch_deals: Callable, now: Optional[datetime] = None) -> Dict[str, float]:
+        """
+        Busca apenas os deals novos da conta e atualiza os agregados de P/L.
+
+        Args:
+            account_id: ID da TradingAccount
+            fetch_deals: função (date_from, date_to) -> deals (ex: mt5.history_deals_get)
+            now: instante de referência (UTC, default: agora)
+
+        Returns:
+            Dict com day_pl, week_pl, month_pl, total_pl
+        """
+        now = now or datetime.now(timezone.utc)
+        starts = period_starts(now)
+
+        state = self.conn.execute(
+            "SELECT * FROM ledger_state WHERE account_id = ?", (account_id,)
+        ).fetchone()
+
+        if state is None:
+            fetch_from = now - timedelta(days=TOTAL_HISTORY_DAYS)
+            high_water = 0
+        else:
+            high_water = state['high_water']
+            fetch_from = datetime.fromtimestamp(
+                max(high_water - HIGH_WATER_OVERLAP, 0), tz=timezone.utc
+            )
+
+        deals = fetch_deals(fetch_from, now)
+        if deals is None:
+            # Falha na consulta: mantém os agregados atuais sem avançar o HWM
+            if state is None:
+                return {'day_pl': 0.0, 'week_pl': 0.0, 'month_pl': 0.0, 'total_pl': 0.0}
+            return {key: state[key] for key in ('day_pl', 'week_pl', 'month_pl', 'total_pl')}
+
+        # Descarta deals já registrados (janela de overlap)
+        known = np.fromiter((
+            row[0] for row in self.conn.execute(
+                "SELECT ticket FROM deals WHERE account_id = ? AND time >= ?",
+                (account_id, int(fetch_from.timestamp()))
+            )
+        ), dtype=np.int64)
+        deals = to_deal_array(deals)
+        new_deals = deals[~np.isin(deals['ticket'], known)]
+
+        # Colunas de DEAL_DTYPE na mesma ordem da tabela deals
+        self.conn.executemany("""
+            INSERT OR IGNORE INTO deals (account_id, ticket, time, type, entry, profit, commission, swap)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(account_id, *deal) for deal in new_deals.tolist()])
+
+        trades = DealSeries(new_deals, types=TRADE_DEAL_TYPES, include_costs=False)
+
+        # Buckets: mesmo período -> soma incremental; período virou -> recalcula local
+        buckets = {}
+        for period in ('day', 'week', 'month'):
+            start = starts[period]
+            if state is not None and state[f'{period}_start'] == start:
+                buckets[period] = state[f'{period}_pl'] + trades.total(start)
+            else:
+                buckets[period] = self._sum_since(account_id, start)
+
+        # Total: janela móvel (deals antigos saem da soma), consulta indexada local
+        total_pl = self._sum_since(account_id, int((now - timedelta(days=TOTAL_HISTORY_DAYS)).timestamp()))
+
+        if len(new_deals):
+            high_water = max(high_water, int(new_deals['time'].max()))
+
+        self.conn.execute("""
+            INSERT OR REPLACE INTO ledger_state (
+                account_id, high_water, day_start, week_start, month_start,
+                day_pl, week_pl, month_pl, total_pl
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            account_id, high_water, starts['day'], starts['week'], starts['month'],
+            buckets['day'], buckets['week'], buckets['month'], total_pl
+        ))
+        self.conn.commit()
+
+        if len(new_deals):
+            logger.debug(f"Ledger {account_id}: {len(new_deals)} deal(s) novo(s), HWM={high_water}")
+
+        return {
+            'day_pl': buckets['day'],
+            'week_pl': buckets['week'],
+            'month_pl': buckets['month'],
+            'total_pl': total_pl,
+        }
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+FAKE METATRADER5 - TERMINAL SIMULADO PARA TESTES EM LINUX
+============================================================================
+Substituto do pacote MetaTrader5 com a mesma API usada pelos coletores.
+Ativado com MT5_FAKE=1 (ex: collector_pool.py importa este módulo no lugar
+do MetaTrader5).
+
+Simula:
+- Latência de initialize/login configurável
+- Um terminal = uma sessão: chamadas ao mesmo terminal são serializadas
+  (lock de arquivo por caminho), como no terminal real
+- Histórico de deals determinístico por login
+- Falha de login para senhas "bad"/"wrong"
+
+Variáveis de ambiente:
+- FAKE_MT5_INIT_LATENCY   (padrão 0.2s)
+- FAKE_MT5_LOGIN_LATENCY  (padrão 0.1s)
+- FAKE_MT5_DEALS_PER_DAY  (padrão 5)
+- FAKE_MT5_SERVER_SWITCH_LATENCY (padrão 0s) - custo extra do login quando
+  o servidor muda em relação ao login anterior do mesmo processo
+============================================================================
+"""
+
+import os
+import time
+import zlib
+import fcntl
+import random
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+# ============================================================================
+# CONSTANTES (mesmos valores do MetaTrader5)
+# ============================================================================
+
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_TYPE_BALANCE = 2
+
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_ENTRY_INOUT = 2
+
+RES_S_OK = 1
+RES_E_INVALID_PARAMS = -2
+RES_E_AUTH_FAILED = -6
+RES_E_INTERNAL_FAIL_SEND = -10001
+RES_E_INTERNAL_FAIL_INIT = -10003
+
+INIT_LATENCY = float(os.getenv('FAKE_MT5_INIT_LATENCY', '0.2'))
+LOGIN_LATENCY = float(os.getenv('FAKE_MT5_LOGIN_LATENCY', '0.1'))
+DEALS_PER_DAY = int(os.getenv('FAKE_MT5_DEALS_PER_DAY', '5'))
+SERVER_SWITCH_LATENCY = float(os.getenv('FAKE_MT5_SERVER_SWITCH_LATENCY', '0'))
+
+# Histórico simulado cobre ~400 dias antes da primeira consulta
+HISTORY_DAYS = 400
+
+# ============================================================================
+# ESTRUTURAS (namedtuples com os campos do MetaTrader5)
+# ============================================================================
+
+AccountInfo = namedtuple('AccountInfo', [
+    'login', 'name', 'server', 'currency', 'balance', 'equity', 'profit',
+    'margin', 'margin_free', 'margin_level'
+])
+
+TerminalInfo = namedtuple('TerminalInfo', ['path', 'connected', 'build'])
+
+TradePosition = namedtuple('TradePosition', [
+    'ticket', 'time', 'type', 'volume', 'price_open', 'symbol', 'profit'
+])
+
+TradeDeal = namedtuple('TradeDeal', [
+    'ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'magic',
+    'position_id', 'reason', 'volume', 'price', 'commission', 'swap',
+    'profit', 'fee', 'symbol', 'comment', 'external_id'
+])
+
+# ============================================================================
+# ESTADO DO "TERMINAL"
+# ============================================================================
+
+_state = {
+    'path': None,
+    'login': None,
+    'server': None,
+    'last_error': (RES_S_OK, 'Success'),
+}
+
+# Histórico gerado por login (cache por processo)
+_deals_cache: Dict[int, Tuple] = {}
+
+# Âncora temporal do histórico (fixa por processo para ser determinística)
+_history_anchor = int(time.time())
+
+def _set_error(code: int, message: str):
+    _state['last_error'] = (code, message)
+
+def _terminal_lock_path(path: str) -> str:
+    key = zlib.crc32((path or 'default').encode())
+    return os.path.join(tempfile.gettempdir(), f"fake_mt5_terminal_{key:08x}.lock")
+
+def _occupy_terminal(seconds: float):
+    """Ocupa o terminal por `seconds` (exclusivo entre processos no mesmo caminho)"""
+    with open(_terminal_lock_path(_state['path']), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            time.sleep(seconds)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _generate_deals(login: int) -> Tuple:
+    """Gera histórico determinístico de deals para um login"""
+    rng = random.Random(login)
+    start = _history_anchor - HISTORY_DAYS * 86400
+    deals = []
+    ticket = login * 1000000
+
+    # Depósito inicial (não entra no P/L)
+    ticket += 1
+    deals.append(TradeDeal(
+        ticket, 0, start, start * 1000, DEAL_TYPE_BALANCE, DEAL_ENTRY_IN, 0,
+        0, 0, 0.0, 0.0, 0.0, 0.0, 10000.0, 0.0, '', 'Deposit', ''
+    ))
+
+    spacing = 86400 // max(DEALS_PER_DAY, 1)
+    t = start + spacing
+    while t < _history_anchor:
+        ticket += 1
+        deal_type = rng.choice((DEAL_TYPE_BUY, DEAL_TYPE_SELL))
+        deals.append(TradeDeal(
+            ticket, ticket, t, t * 1000, deal_type, DEAL_ENTRY_OUT, 0,
+            ticket, 0, 0.1, 1.1, -0.7, round(rng.uniform(-0.5, 0.1), 2),
+            round(rng.uniform(-50, 60), 2), 0.0, 'EURUSD', '', ''
+        ))
+        t += spacing + rng.randint(-60, 60)
+
+    return tuple(deals)
+
+def _to_timestamp(value) -> int:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    return int(value)
+
+# ============================================================================
+# API PÚBLICA (compatível com MetaTrader5)
+# ============================================================================
+
+def initialize(path: Optional[str] = None, **kwargs) -> bool:
+    _state['path'] = path
+    _occupy_terminal(INIT_LATENCY)
+    _set_error(RES_S_OK, 'Success')
+    return True
+
+def shutdown():
+    _state['path'] = None
+    _state['login'] = None
+    _state['server'] = None
+
+def last_error() -> Tuple[int, str]:
+    return _state['last_error']
+
+def login(login: int, password: str = '', server: str = '', timeout: int = 60000) -> bool:
+    if _state['path'] is None and not initialize():
+        return False
+
+    # Troca de trade server: terminal reconecta antes de autenticar
+    switching = _state['server'] is not None and _state['server'] != server
+    _occupy_terminal(LOGIN_LATENCY + (SERVER_SWITCH_LATENCY if switching else 0))
+
+    if password in ('', 'bad', 'wrong'):
+        _set_error(RES_E_AUTH_FAILED, 'Terminal: Authorization failed')
+        return False
+
+    _state['login'] = int(login)
+    _state['server'] = server
+    _set_error(RES_S_OK, 'Success')
+    return True
+
+def terminal_info() -> Optional[TerminalInfo]:
+    if _state['path'] is None:
+        _set_error(RES_E_INTERNAL_FAIL_INIT, 'Terminal: Not initialized')
+        return None
+    return TerminalInfo(_state['path'], True, 4755)
+
+def account_info() -> Optional[AccountInfo]:
+    if _state['login'] is None:
+        _set_error(RES_E_INTERNAL_FAIL_SEND, 'Terminal: Not logged in')
+        return None
+
+    login_ = _state['login']
+    balance = 10000.0 + (login_ % 1000)
+    profit = sum(p.profit for p in positions_get())
+    equity = balance + profit
+    margin = 100.0 * len(positions_get())
+    return AccountInfo(
+        login_, f"Fake {login_}", _state['server'], 'USD', balance, equity,
+        profit, margin, equity - margin, (equity / margin * 100) if margin else 0.0
+    )
+
+def positions_get(**kwargs) -> Tuple:
+    if _state['login'] is None:
+        return None
+
+    login_ = _state['login']
+    # Contas com login múltiplo de 3 ficam "flat"
+    count = login_ % 3
+    return tuple(
+        TradePosition(login_ * 10 + i, _history_anchor, i % 2, 0.1, 1.1, 'EURUSD', 12.5 - 5 * i)
+        for i in range(count)
+    )
+
+def history_deals_get(date_from, date_to, **kwargs) -> Optional[Tuple]:
+    if _state['login'] is None:
+        _set_error(RES_E_INTERNAL_FAIL_SEND, 'Terminal: Not logged in')
+        return None
+
+    login_ = _state['login']
+    if login_ not in _deals_cache:
+        _deals_cache[login_] = _generate_deals(login_)
+
+    start = _to_timestamp(date_from)
+    end = _to_timestamp(date_to)
+    return tuple(d for d in _deals_cache[login_] if start <= d.time <= end)
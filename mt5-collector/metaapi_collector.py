@@ -4,13 +4,17 @@
 Coleta dados de MÚLTIPLAS contas MT5 via MetaAPI Cloud.
 
 Vantagens sobre o carrossel:
-- Conexões PARALELAS (não sequenciais)
+- Conexões PARALELAS com limite (METAAPI_CONCURRENCY contas por vez,
+  METAAPI_RATE req/s e backoff em 429 - ver metaapi_limiter.py)
 - Sem necessidade de MT5 Terminal local
 - Escalável para 100+ contas
-- Dados em tempo real
+- Dados em tempo real: conexão de streaming por conta mantida entre ciclos
+  (ver metaapi_streaming.py)
+- Tempo por conta e por fase (timing_ledger.py): JSONL, p50/p95/p99 por
+  ciclo e GET /metrics na porta METRICS_PORT
 
 Requisitos:
-- pip install metaapi-cloud-sdk requests
+- pip install metaapi-cloud-sdk requests aiohttp
 
 Como usar:
 - python metaapi_collector.py         # Loop contínuo
@@ -18,11 +22,20 @@ Como usar:
 """
 
 import asyncio
-import requests
 import sys
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import datetime
 from typing import Dict, List, Optional
 
+from backend_client import BackendClient
+from async_backend_client import AsyncBackendClient
+from roster import RosterCache
+from outbox import Outbox, OutboxDrainer, OUTBOX_DRAIN_TIMEOUT
+from metaapi_limiter import MetaApiLimiter
+from metaapi_index import MetaApiAccountIndex
+from metaapi_streaming import StreamingConnectionManager
+from timing_ledger import METRICS_PORT, MetricsServer, PhaseTimer, TimingLedger
+
 # ==========================================
 # CONFIGURAÇÕES
 # ==========================================
@@ -31,85 +44,77 @@ METAAPI_TOKEN = "eyJhbGciOiJSUzUxMiIsInR5cCI6IkpXVCJ9.eyJfaWQiOiIxNzUxZWNiMWZhMT
 
 BACKEND_URL = "http://localhost:5001"
 
+# Envio ao backend: sessão keep-alive + lotes gzip em /api/mt5/sync/batch
+# (BackendClient na thread do drainer; AsyncBackendClient dentro do event loop)
+backend = BackendClient(BACKEND_URL)
+async_backend = AsyncBackendClient(BACKEND_URL)
+
+# Roster de contas em cache (If-None-Match: 304 quando nada mudou)
+roster = RosterCache(async_backend)
+
+# Tempo por conta/fase (lookup, conexão, leitura, outbox, envio HTTP)
+ledger = TimingLedger('metaapi')
+
+# Payloads vão primeiro para a outbox local; o drainer envia com retry
+outbox = Outbox()
+drainer = OutboxDrainer(outbox, backend, ledger=ledger)
+
 # Intervalo entre ciclos de coleta
 CYCLE_INTERVAL = 60  # segundos
 
 # ==========================================
-# CACHE DE CONTAS METAAPI
+# ÍNDICE DE CONTAS METAAPI
 # ==========================================
 
-# Mapeia login MT5 -> MetaAPI account ID
-metaapi_accounts_cache: Dict[str, str] = {}
+# Login MT5 -> MetaAPI account ID (uma listagem, persistido com TTL)
+account_index = MetaApiAccountIndex()
 
 # ==========================================
-# FUNÇÕES AUXILIARES
+# CONEXÕES METAAPI
 # ==========================================
 
-def fetch_accounts_from_backend() -> List[Dict]:
-    """Busca todas as contas MT5 do backend"""
-    try:
-        url = f"{BACKEND_URL}/api/mt5/accounts/all"
-        print("📋 Buscando contas do backend...")
+# Cliente MetaAPI e conexões de streaming vivem entre ciclos
+metaapi_client = None
+streams = StreamingConnectionManager()
 
-        response = requests.get(url, timeout=10)
+# ==========================================
+# FUNÇÕES AUXILIARES
+# ==========================================
 
-        if response.status_code == 200:
-            accounts = response.json()
-            print(f"✅ {len(accounts)} conta(s) encontrada(s)")
-            return accounts
-        else:
-            print(f"❌ Erro ao buscar contas: {response.status_code}")
-            return []
+async def fetch_accounts_from_backend() -> List[Dict]:
+    """Busca todas as contas MT5 do backend (condicional: 304 se o roster não mudou)"""
+    print("📋 Buscando contas do backend...")
 
-    except Exception as e:
-        print(f"❌ Exceção ao buscar contas: {e}")
-        return []
+    diff = await roster.refresh_async()
+    accounts = roster.list()
+    print(f"✅ {len(accounts)} conta(s) | roster {diff.summary()}")
+    return accounts
 
 def send_to_backend(data: Dict) -> bool:
-    """Envia dados para o backend"""
-    try:
-        url = f"{BACKEND_URL}/api/mt5/sync"
+    """Grava os dados na outbox (o drainer envia ao backend)"""
+    print(f"💾 Dados gravados na outbox...")
+    print(f"   Balance: ${data['balance']:.2f}")
+    print(f"   Equity: ${data['equity']:.2f}")
+    print(f"   Open Trades: {data['openTrades']}")
 
-        print(f"📤 Enviando dados para backend...")
-        print(f"   Balance: ${data['balance']:.2f}")
-        print(f"   Equity: ${data['equity']:.2f}")
-        print(f"   Open Trades: {data['openTrades']}")
-
-        response = requests.post(url, json=data, timeout=10)
-
-        if response.status_code == 200:
-            print(f"✅ Dados enviados com sucesso!")
-            return True
-        else:
-            print(f"❌ Erro ao enviar: {response.status_code}")
-            return False
-
-    except Exception as e:
-        print(f"❌ Exceção ao enviar: {e}")
-        return False
+    outbox.append(data)
+    drainer.notify()
+    return True
 
 # ==========================================
 # METAAPI FUNCTIONS
 # ==========================================
 
-async def get_or_create_metaapi_account(api, account_data: Dict) -> Optional[str]:
+async def get_or_create_metaapi_account(api, account_data: Dict, limiter: MetaApiLimiter) -> Optional[str]:
     """Obtém ou cria uma conta no MetaAPI"""
     login = str(account_data['login'])
 
-    # Verifica cache primeiro
-    if login in metaapi_accounts_cache:
-        print(f"   📦 Usando conta em cache: {metaapi_accounts_cache[login]}")
-        return metaapi_accounts_cache[login]
-
     try:
-        # Busca contas existentes
-        accounts = await api.metatrader_account_api.get_accounts_with_infinite_scroll_pagination()
-
-        for acc in accounts:
-            if str(acc.login) == login:
-                print(f"   📦 Conta existente encontrada: {acc.id}")
-                metaapi_accounts_cache[login] = acc.id
-                return acc.id
+        # Busca no índice (lista o MetaAPI só se expirou ou o login é novo)
+        metaapi_id = await account_index.lookup(api, login, limiter.call)
+        if metaapi_id:
+            print(f"   📦 Conta MetaAPI: {metaapi_id}")
+            return metaapi_id
 
         # Cria nova conta
         print(f"   🆕 Criando nova conta MetaAPI para {login}...")
@@ -119,7 +124,7 @@ async def get_or_create_metaapi_account(api, account_data: Dict) -> Optional[str
         platform = account_data.get('platform', 'mt5').lower()
         print(f"      Platform: {platform}")
 
-        account = await api.metatrader_account_api.create_account({
+        account = await limiter.call(api.metatrader_account_api.create_account, {
             'name': f"iDeepX - {login}",
             'type': 'cloud',
             'login': login,
@@ -130,7 +135,7 @@ async def get_or_create_metaapi_account(api, account_data: Dict) -> Optional[str
         })
 
         print(f"   ✅ Conta criada: {account.id}")
-        metaapi_accounts_cache[login] = account.id
+        account_index.put(login, account.id)
         return account.id
 
     except Exception as e:
@@ -148,26 +153,25 @@ async def get_or_create_metaapi_account(api, account_data: Dict) -> Optional[str
 
         return None
 
-async def collect_account_data(api, metaapi_account_id: str, backend_account_id: str) -> Optional[Dict]:
-    """Coleta dados de uma conta via MetaAPI"""
+async def collect_account_data(api, metaapi_account_id: str, backend_account_id: str,
+                               limiter: MetaApiLimiter, timer: Optional[PhaseTimer] = None) -> Optional[Dict]:
+    """Coleta dados de uma conta via MetaAPI (conexão de streaming reaproveitada entre ciclos)"""
+    timer = timer or PhaseTimer()
     try:
-        # Obtém a conta
-        account = await api.metatrader_account_api.get_account(metaapi_account_id)
-
-        # Deploy se necessário
-        if account.state != 'DEPLOYED':
-            print(f"   🚀 Fazendo deploy...")
-            await account.deploy()
-            await account.wait_deployed()
-
-        # Conecta
-        connection = account.get_rpc_connection()
-        await connection.connect()
-        await connection.wait_synchronized()
+        # Conexão sincronizada da conta (só conecta na primeira vez ou após desconexão)
+        with timer.phase('connect'):
+            connection = await streams.get(api, backend_account_id, metaapi_account_id, limiter.call)
 
-        # Busca dados básicos
-        account_info = await connection.get_account_information()
-        positions = await connection.get_positions()
+        # Estado local sincronizado: account info, posições e deals sem RPC
+        started = time.monotonic()
+        try:
+            with timer.phase('read'):
+                state = streams.read(connection)
+        except Exception:
+            streams.mark_stale(backend_account_id)
+            raise
+        account_info = state['account_info']
+        positions = state['positions']
 
         # Calcula valores básicos
         balance = account_info.get('balance', 0)
@@ -179,58 +183,10 @@ async def collect_account_data(api, metaapi_account_id: str, backend_account_id:
         open_trades = len(positions) if positions else 0
         open_pl = sum([pos.get('profit', 0) for pos in positions]) if positions else 0
 
-        # Calcula P/L por período usando histórico de deals
-        # IMPORTANTE: MetaAPI limita a 1000 deals por consulta
-        # Por isso fazemos consultas separadas para cada período
-        day_pl = 0.0
-        week_pl = 0.0
-        month_pl = 0.0
-
-        try:
-            # Define períodos (timezone aware) - baseado em calendário UTC
-            now = datetime.now(timezone.utc)
-            start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            start_of_week = now - timedelta(days=now.weekday())
-            start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-            start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-            # Função auxiliar para calcular P/L de uma lista de deals
-            def calc_pl_from_deals(deals_list):
-                total = 0.0
-                for deal in deals_list:
-                    deal_type = deal.get('type', '')
-                    if 'BALANCE' in str(deal_type):
-                        continue
-                    profit = deal.get('profit', 0) or 0
-                    swap = deal.get('swap', 0) or 0
-                    commission = deal.get('commission', 0) or 0
-                    total += profit + swap + commission
-                return total
-
-            # Busca deals SEPARADAMENTE para cada período para evitar limite de 1000
-            # 1. Dia (hoje)
-            day_response = await connection.get_deals_by_time_range(start_of_day, now)
-            day_deals = day_response.get('deals', []) if isinstance(day_response, dict) else day_response
-            day_pl = calc_pl_from_deals(day_deals)
-
-            # 2. Semana (desde segunda)
-            week_response = await connection.get_deals_by_time_range(start_of_week, now)
-            week_deals = week_response.get('deals', []) if isinstance(week_response, dict) else week_response
-            week_pl = calc_pl_from_deals(week_deals)
-
-            # 3. Mês (desde dia 1)
-            month_response = await connection.get_deals_by_time_range(start_of_month, now)
-            month_deals = month_response.get('deals', []) if isinstance(month_response, dict) else month_response
-            month_pl = calc_pl_from_deals(month_deals)
-
-            print(f"   📊 P/L calculado: Dia=${day_pl:.2f} ({len(day_deals)} deals), Semana=${week_pl:.2f} ({len(week_deals)} deals), Mês=${month_pl:.2f} ({len(month_deals)} deals)")
-        except Exception as e:
-            print(f"   ⚠️ Não foi possível calcular P/L histórico: {e}")
-            import traceback
-            traceback.print_exc()
-
-        # Fecha conexão
-        await connection.close()
+        # P/L por período do histórico local (mês ou semana, o que começar antes)
+        day_pl, week_pl, month_pl = state['day_pl'], state['week_pl'], state['month_pl']
+        print(f"   📊 P/L calculado: Dia=${day_pl:.2f}, Semana=${week_pl:.2f}, Mês=${month_pl:.2f} "
+              f"({state['deals']} deals, leitura em {(time.monotonic() - started) * 1000:.1f}ms)")
 
         return {
             'accountId': backend_account_id,
@@ -249,9 +205,13 @@ async def collect_account_data(api, metaapi_account_id: str, backend_account_id:
 
     except Exception as e:
         print(f"   ❌ Erro ao coletar dados: {e}")
+
+        # Conta apagada no MetaAPI: sai do índice (recriada no próximo ciclo)
+        if type(e).__name__ == 'NotFoundException':
+            account_index.forget(metaapi_account_id)
         return None
 
-async def process_single_account(api, account: Dict) -> bool:
+async def process_single_account(api, account: Dict, limiter: MetaApiLimiter) -> bool:
     """Processa uma única conta"""
     login = account['login']
     backend_id = account['id']
@@ -260,28 +220,36 @@ async def process_single_account(api, account: Dict) -> bool:
     print(f"🎯 Processando: {login}@{account['server']}")
     print(f"{'='*50}")
 
-    # 1. Obtém ou cria conta MetaAPI
-    metaapi_id = await get_or_create_metaapi_account(api, account)
-    if not metaapi_id:
-        return False
+    timer = PhaseTimer()
+    ok = False
+    try:
+        # 1. Obtém ou cria conta MetaAPI
+        with timer.phase('metaapi_lookup'):
+            metaapi_id = await get_or_create_metaapi_account(api, account, limiter)
+        if not metaapi_id:
+            return False
 
-    # 2. Coleta dados
-    data = await collect_account_data(api, metaapi_id, backend_id)
-    if not data:
-        return False
+        # 2. Coleta dados
+        data = await collect_account_data(api, metaapi_id, backend_id, limiter, timer)
+        if not data:
+            return False
 
-    # 3. Envia para backend
-    return send_to_backend(data)
+        # 3. Envia para backend
+        with timer.phase('outbox_write'):
+            ok = send_to_backend(data)
+        return ok
+    finally:
+        ledger.record(backend_id, account['server'], timer.phases, ok=ok)
 
-async def process_all_accounts_parallel(api, accounts: List[Dict]) -> int:
-    """Processa TODAS as contas em paralelo"""
-    print(f"\n🚀 Processando {len(accounts)} contas em PARALELO...")
+async def process_all_accounts_parallel(api, accounts: List[Dict], limiter: MetaApiLimiter) -> int:
+    """Processa as contas em paralelo, no máximo limiter.concurrency por vez"""
+    print(f"\n🚀 Processando {len(accounts)} contas em PARALELO ({limiter.concurrency} por vez)...")
 
-    # Cria tasks para todas as contas
-    tasks = [process_single_account(api, acc) for acc in accounts]
+    results = await limiter.map(accounts, lambda account: process_single_account(api, account, limiter))
 
-    # Executa em paralelo
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            print(f"❌ Erro ao processar {account['login']}: {result}")
 
     # Conta sucessos
     success_count = sum(1 for r in results if r is True)
@@ -307,26 +275,36 @@ async def run_collection_cycle() -> int:
         return 0
 
     # Busca contas do backend
-    accounts = fetch_accounts_from_backend()
+    accounts = await fetch_accounts_from_backend()
     if not accounts:
         print("⚠️ Nenhuma conta encontrada!")
         return 0
 
-    # Conecta ao MetaAPI
-    print("\n📡 Conectando ao MetaAPI...")
-    api = MetaApi(METAAPI_TOKEN)
+    # Conecta ao MetaAPI (uma vez; as conexões de streaming dependem do cliente)
+    global metaapi_client
+    if metaapi_client is None:
+        print("\n📡 Conectando ao MetaAPI...")
+        metaapi_client = MetaApi(METAAPI_TOKEN)
+    api = metaapi_client
 
-    # Processa contas (sequencial por ora, paralelo pode sobrecarregar)
-    success_count = 0
-    for account in accounts:
-        try:
-            if await process_single_account(api, account):
-                success_count += 1
-        except Exception as e:
-            print(f"❌ Erro ao processar {account['login']}: {e}")
+    # Contas que saíram do roster fecham a conexão
+    await streams.retain(account['id'] for account in accounts)
+
+    # Processa contas em paralelo com concorrência e taxa limitadas
+    limiter = MetaApiLimiter()
+    account_index.new_cycle()
+    started = time.monotonic()
+    success_count = await process_all_accounts_parallel(api, accounts, limiter)
 
     print("\n" + "="*60)
-    print(f"✅ CICLO COMPLETO: {success_count}/{len(accounts)} contas")
+    print(f"✅ CICLO COMPLETO: {success_count}/{len(accounts)} contas em {time.monotonic() - started:.1f}s")
+    print(f"🚦 MetaAPI: {limiter.stats['requests']} requisição(ões), {limiter.stats['throttled']} 429, "
+          f"até {limiter.stats['max_in_flight']} conta(s) simultânea(s)")
+    print(f"🗂️ Índice MetaAPI: {len(account_index)} conta(s), {account_index.stats['listings']} listagem(ns)")
+    print(f"🔗 Streaming: {len(streams)} conexão(ões) | {streams.stats['connects']} conexão(ões) aberta(s), "
+          f"{streams.stats['reuses']} reaproveitada(s), {streams.stats['reconnects']} reconexão(ões)")
+    print(f"📬 Outbox: {drainer.stats['sent']} enviada(s), {outbox.pending()} pendente(s)")
+    ledger.log_summary(ledger.end_cycle(), log=print)
     print("="*60)
 
     return success_count
@@ -341,23 +319,46 @@ async def run_collector_loop():
     print("="*60)
 
     cycle_count = 0
+    drainer.start()
 
-    while True:
-        try:
-            cycle_count += 1
-            print(f"\n🔄 Ciclo #{cycle_count}")
-
-            await run_collection_cycle()
-
-            print(f"\n⏰ Próximo ciclo em {CYCLE_INTERVAL}s...")
-            await asyncio.sleep(CYCLE_INTERVAL)
+    # GET /metrics: percentis do último ciclo + conexões e outbox
+    metrics = MetricsServer(ledger, gauges=lambda: {
+        'streaming_connections': len(streams),
+        'outbox_pending': outbox.pending(),
+    })
+    if METRICS_PORT:
+        metrics.start()
 
-        except KeyboardInterrupt:
-            print("\n⏹️ Collector interrompido pelo usuário")
-            break
-        except Exception as e:
-            print(f"❌ Erro no loop: {e}")
-            await asyncio.sleep(5)
+    try:
+        while True:
+            try:
+                cycle_count += 1
+                print(f"\n🔄 Ciclo #{cycle_count}")
+
+                await run_collection_cycle()
+
+                print(f"\n⏰ Próximo ciclo em {CYCLE_INTERVAL}s...")
+                await asyncio.sleep(CYCLE_INTERVAL)
+
+            except KeyboardInterrupt:
+                print("\n⏹️ Collector interrompido pelo usuário")
+                drainer.stop()
+                break
+            except Exception as e:
+                print(f"❌ Erro no loop: {e}")
+                await asyncio.sleep(5)
+    finally:
+        metrics.stop()
+        await streams.close_all()
+        await async_backend.close()
+
+async def run_once() -> int:
+    """Ciclo único (fecha as conexões de streaming no fim)"""
+    try:
+        return await run_collection_cycle()
+    finally:
+        await streams.close_all()
+        await async_backend.close()
 
 # ==========================================
 # MAIN
@@ -366,7 +367,9 @@ async def run_collector_loop():
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--once":
         print("🎯 Modo: Ciclo único")
-        asyncio.run(run_collection_cycle())
+        asyncio.run(run_once())
+        if not drainer.drain(OUTBOX_DRAIN_TIMEOUT):
+            print(f"📬 {outbox.pending()} payload(s) na outbox para a próxima execução")
     else:
         print("🎯 Modo: Loop contínuo")
         asyncio.run(run_collector_loop())
@@ -5,21 +5,39 @@ Coleta dados MT5 uma vez por dia para economizar custos MetaAPI.
 
 Funcionalidades:
 - Deploy sob demanda (não mantém contas ativas 24/7)
+- Pipeline por conta em paralelo (METAAPI_DAILY_CONCURRENCY contas deployadas
+  por vez): deploy -> coleta assim que DEPLOYED -> undeploy imediato
+- Relatório de segundos deployados por conta (custo real MetaAPI)
 - Coleta automática na virada do dia forex (17:00 EST = 22:00 UTC)
 - Pode ser acionado manualmente via API
 - Suporta coleta de data específica (histórico)
+- Backfill --from/--to: um deploy por conta, uma varredura paginada de
+  deals e um snapshot por dia calculado localmente, enviados em lote
+- Tempo por conta e por fase (lookup, deploy, coleta, undeploy, envio) no
+  timing ledger; GET /metrics no modo --scheduler (timing_ledger.py)
 
 Economia: ~99% redução de custos MetaAPI
 - Antes: 24h/dia deployed = ~720h/mês por conta
 - Agora: ~5min/dia deployed = ~2.5h/mês por conta
 """
 
+import os
+import time
 import asyncio
-import requests
 import sys
 import argparse
-from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
+import functools
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from backend_client import BackendClient
+from async_backend_client import AsyncBackendClient
+from roster import RosterCache
+from outbox import Outbox, OutboxDrainer, OUTBOX_DRAIN_TIMEOUT
+from metaapi_index import MetaApiAccountIndex
+from metaapi_deals import calendar_pl, daily_snapshots, fetch_deals, history_start
+from metaapi_limiter import MetaApiLimiter
+from timing_ledger import METRICS_PORT, MetricsServer, PhaseTimer, TimingLedger
 
 # ==========================================
 # CONFIGURAÇÕES
@@ -29,61 +47,56 @@ METAAPI_TOKEN = "eyJhbGciOiJSUzUxMiIsInR5cCI6IkpXVCJ9.eyJfaWQiOiIxNzUxZWNiMWZhMT
 
 BACKEND_URL = "http://localhost:5001"
 
+# Envio ao backend: sessão keep-alive + lotes gzip em /api/mt5/sync/batch
+# (BackendClient na thread do drainer; AsyncBackendClient dentro do event loop)
+backend = BackendClient(BACKEND_URL)
+async_backend = AsyncBackendClient(BACKEND_URL)
+
+# Roster de contas em cache (If-None-Match: 304 quando nada mudou)
+roster = RosterCache(async_backend)
+
+# Tempo por conta/fase (lookup, deploy, coleta, undeploy, envio HTTP)
+ledger = TimingLedger('metaapi_daily')
+
+# Payloads vão primeiro para a outbox local; o drainer envia com retry
+outbox = Outbox()
+drainer = OutboxDrainer(outbox, backend, ledger=ledger)
+
 # Horário de coleta forex (17:00 EST = 22:00 UTC)
 FOREX_DAY_END_HOUR_UTC = 22
 
+# Contas deployadas ao mesmo tempo (cada uma: deploy -> coleta -> undeploy)
+DAILY_CONCURRENCY = int(os.getenv('METAAPI_DAILY_CONCURRENCY', '10'))
+
 # ==========================================
-# CACHE DE CONTAS METAAPI
+# ÍNDICE DE CONTAS METAAPI
 # ==========================================
 
-metaapi_accounts_cache: Dict[str, str] = {}
+# Login MT5 -> MetaAPI account ID (uma listagem, persistido com TTL)
+account_index = MetaApiAccountIndex()
 
 # ==========================================
 # FUNÇÕES AUXILIARES
 # ==========================================
 
-def fetch_accounts_from_backend() -> List[Dict]:
-    """Busca todas as contas MT5 do backend"""
-    try:
-        url = f"{BACKEND_URL}/api/mt5/accounts/all"
-        print("📋 Buscando contas do backend...")
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            accounts = response.json()
-            print(f"✅ {len(accounts)} conta(s) encontrada(s)")
-            return accounts
-        else:
-            print(f"❌ Erro ao buscar contas: {response.status_code}")
-            return []
-    except Exception as e:
-        print(f"❌ Exceção ao buscar contas: {e}")
-        return []
+async def fetch_accounts_from_backend() -> List[Dict]:
+    """Busca todas as contas MT5 do backend (condicional: 304 se o roster não mudou)"""
+    print("📋 Buscando contas do backend...")
 
-def send_to_backend(data: Dict) -> bool:
-    """Envia dados para o backend"""
-    try:
-        url = f"{BACKEND_URL}/api/mt5/sync"
-        response = requests.post(url, json=data, timeout=10)
-        if response.status_code == 200:
-            print(f"✅ Dados enviados com sucesso!")
-            return True
-        else:
-            print(f"❌ Erro ao enviar: {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"❌ Exceção ao enviar: {e}")
-        return False
+    diff = await roster.refresh_async()
+    accounts = roster.list()
+    print(f"✅ {len(accounts)} conta(s) | roster {diff.summary()}")
+    return accounts
 
-def notify_backend_collection_status(status: str, details: Dict) -> bool:
+async def notify_backend_collection_status(status: str, details: Dict) -> bool:
     """Notifica o backend sobre o status da coleta"""
     try:
-        url = f"{BACKEND_URL}/api/mt5/collection-status"
         data = {
             "status": status,
             "timestamp": datetime.now(timezone.utc).isoformat(),
             **details
         }
-        response = requests.post(url, json=data, timeout=10)
+        response = await async_backend.post_json('/api/mt5/collection-status', data, compress=False)
         return response.status_code == 200
     except:
         return False
@@ -92,35 +105,25 @@ def notify_backend_collection_status(status: str, details: Dict) -> bool:
 # METAAPI FUNCTIONS
 # ==========================================
 
-async def get_metaapi_account_id(api, account_data: Dict) -> Optional[str]:
-    """Obtém o ID da conta no MetaAPI"""
-    login = str(account_data['login'])
-
-    if login in metaapi_accounts_cache:
-        return metaapi_accounts_cache[login]
-
+async def get_metaapi_account_id(api, account_data: Dict, limiter: MetaApiLimiter) -> Optional[str]:
+    """Obtém o ID da conta no MetaAPI (índice: lista o MetaAPI só se expirou ou o login é novo)"""
     try:
-        accounts = await api.metatrader_account_api.get_accounts_with_infinite_scroll_pagination()
-        for acc in accounts:
-            if str(acc.login) == login:
-                metaapi_accounts_cache[login] = acc.id
-                return acc.id
-        return None
+        return await account_index.lookup(api, account_data['login'], limiter.call)
     except Exception as e:
         print(f"❌ Erro ao buscar conta MetaAPI: {e}")
         return None
 
-async def deploy_account(api, metaapi_id: str) -> bool:
+async def deploy_account(api, metaapi_id: str, limiter: MetaApiLimiter) -> bool:
     """Faz deploy de uma conta (ativa conexão)"""
     try:
-        account = await api.metatrader_account_api.get_account(metaapi_id)
+        account = await limiter.call(api.metatrader_account_api.get_account, metaapi_id)
 
         if account.state == 'DEPLOYED':
             print(f"   ✅ Conta já está deployed")
             return True
 
         print(f"   🚀 Fazendo deploy...")
-        await account.deploy()
+        await limiter.call(account.deploy)
         await account.wait_deployed(timeout_in_seconds=120)
         print(f"   ✅ Deploy concluído!")
         return True
@@ -128,17 +131,17 @@ async def deploy_account(api, metaapi_id: str) -> bool:
         print(f"   ❌ Erro no deploy: {e}")
         return False
 
-async def undeploy_account(api, metaapi_id: str) -> bool:
+async def undeploy_account(api, metaapi_id: str, limiter: MetaApiLimiter) -> bool:
     """Faz undeploy de uma conta (desativa conexão para economizar)"""
     try:
-        account = await api.metatrader_account_api.get_account(metaapi_id)
+        account = await limiter.call(api.metatrader_account_api.get_account, metaapi_id)
 
         if account.state == 'UNDEPLOYED':
             print(f"   ✅ Conta já está undeployed")
             return True
 
         print(f"   🔌 Fazendo undeploy...")
-        await account.undeploy()
+        await limiter.call(account.undeploy)
         await account.wait_undeployed(timeout_in_seconds=60)
         print(f"   ✅ Undeploy concluído!")
         return True
@@ -146,7 +149,8 @@ async def undeploy_account(api, metaapi_id: str) -> bool:
         print(f"   ⚠️ Erro no undeploy: {e}")
         return False
 
-async def collect_account_data(api, metaapi_id: str, backend_account_id: str, reference_date: datetime = None) -> Optional[Dict]:
+async def collect_account_data(api, metaapi_id: str, backend_account_id: str, limiter: MetaApiLimiter,
+                               reference_date: datetime = None) -> Optional[Dict]:
     """
     Coleta dados de uma conta via MetaAPI.
 
@@ -154,19 +158,20 @@ async def collect_account_data(api, metaapi_id: str, backend_account_id: str, re
         api: Instância do MetaApi
         metaapi_id: ID da conta no MetaAPI
         backend_account_id: ID da conta no backend
+        limiter: limite de requisições ao MetaAPI (token bucket + 429)
         reference_date: Data de referência para cálculo de P/L (default: agora)
     """
     try:
-        account = await api.metatrader_account_api.get_account(metaapi_id)
+        account = await limiter.call(api.metatrader_account_api.get_account, metaapi_id)
 
         # Conecta via RPC
         connection = account.get_rpc_connection()
-        await connection.connect()
+        await limiter.call(connection.connect)
         await connection.wait_synchronized()
 
         # Dados básicos da conta
-        account_info = await connection.get_account_information()
-        positions = await connection.get_positions()
+        account_info = await limiter.call(connection.get_account_information)
+        positions = await limiter.call(connection.get_positions)
 
         balance = account_info.get('balance', 0)
         equity = account_info.get('equity', 0)
@@ -180,38 +185,13 @@ async def collect_account_data(api, metaapi_id: str, backend_account_id: str, re
         # Calcula P/L baseado na data de referência
         now = reference_date if reference_date else datetime.now(timezone.utc)
 
-        # Períodos de calendário
-        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        def calc_pl_from_deals(deals_list):
-            total = 0.0
-            for deal in deals_list:
-                deal_type = deal.get('type', '')
-                if 'BALANCE' in str(deal_type):
-                    continue
-                profit = deal.get('profit', 0) or 0
-                swap = deal.get('swap', 0) or 0
-                commission = deal.get('commission', 0) or 0
-                total += profit + swap + commission
-            return total
-
-        # Busca deals separadamente para cada período
-        day_response = await connection.get_deals_by_time_range(start_of_day, now)
-        day_deals = day_response.get('deals', []) if isinstance(day_response, dict) else day_response
-        day_pl = calc_pl_from_deals(day_deals)
-
-        week_response = await connection.get_deals_by_time_range(start_of_week, now)
-        week_deals = week_response.get('deals', []) if isinstance(week_response, dict) else week_response
-        week_pl = calc_pl_from_deals(week_deals)
-
-        month_response = await connection.get_deals_by_time_range(start_of_month, now)
-        month_deals = month_response.get('deals', []) if isinstance(month_response, dict) else month_response
-        month_pl = calc_pl_from_deals(month_deals)
-
-        print(f"   📊 P/L: Dia=${day_pl:.2f}, Semana=${week_pl:.2f}, Mês=${month_pl:.2f}")
+        # Um histórico paginado (mês ou semana, o que começar antes) e
+        # dia/semana/mês calculados dele - sem truncar em 1000 deals
+        deals = await fetch_deals(connection, history_start(now), now, limiter.call)
+        pl = calendar_pl(deals, now)
+        day_pl, week_pl, month_pl = pl['day_pl'], pl['week_pl'], pl['month_pl']
+
+        print(f"   📊 P/L: Dia=${day_pl:.2f}, Semana=${week_pl:.2f}, Mês=${month_pl:.2f} ({len(deals)} deals)")
 
         await connection.close()
 
@@ -235,21 +215,263 @@ async def collect_account_data(api, metaapi_id: str, backend_account_id: str, re
         print(f"   ❌ Erro ao coletar dados: {e}")
         return None
 
+async def collect_daily(api, metaapi_id: str, account: Dict, limiter: MetaApiLimiter,
+                        reference_date: datetime = None) -> bool:
+    """Coleta do dia: um snapshot da conta gravado na outbox"""
+    data = await collect_account_data(api, metaapi_id, account['id'], limiter, reference_date)
+    if not data:
+        return False
+
+    # Grava na outbox (enviada ao backend pelo drainer)
+    print(f"   💾 {account['login']}: gravando na outbox (Balance ${data['balance']:.2f}, Equity ${data['equity']:.2f})")
+    outbox.append(data)
+    drainer.notify()
+    return True
+
+# ==========================================
+# BACKFILL (VÁRIOS DIAS POR DEPLOY)
+# ==========================================
+
+def backfill_references(date_from: date, date_to: date, now: datetime) -> List[datetime]:
+    """Fim de cada dia (23:59:59 UTC) de date_from a date_to; o dia corrente termina em now"""
+    references = []
+    day = date_from
+    while day <= date_to:
+        reference = datetime(day.year, day.month, day.day, 23, 59, 59, tzinfo=timezone.utc)
+        if reference >= now:
+            if day == now.date():
+                references.append(now)
+            break
+        references.append(reference)
+        day += timedelta(days=1)
+    return references
+
+async def collect_backfill(api, metaapi_id: str, account: Dict, limiter: MetaApiLimiter,
+                           date_from: date, date_to: date) -> bool:
+    """
+    Backfill de uma conta: um snapshot por dia de date_from a date_to.
+
+    Uma conexão e UMA varredura paginada de deals (desde o início do
+    mês/semana do primeiro dia até agora); cada dia é calculado localmente
+    (daily_snapshots) e todos vão ao backend em lote. O que o backend não
+    aceitar fica na outbox para reenvio.
+
+    Dias passados: balance reconstruído a partir dos deals; equity = balance
+    e posições abertas = 0 (o MetaAPI não guarda o estado flutuante de dias
+    anteriores). O dia corrente usa o estado real da conta.
+    """
+    try:
+        metaapi_account = await limiter.call(api.metatrader_account_api.get_account, metaapi_id)
+
+        # Conecta via RPC
+        connection = metaapi_account.get_rpc_connection()
+        await limiter.call(connection.connect)
+        await connection.wait_synchronized()
+
+        account_info = await limiter.call(connection.get_account_information)
+        positions = await limiter.call(connection.get_positions) or []
+
+        now = datetime.now(timezone.utc)
+        references = backfill_references(date_from, date_to, now)
+        if not references:
+            print(f"   ⚠️ Nenhum dia a coletar no período")
+            await connection.close()
+            return False
+
+        deals = await fetch_deals(connection, history_start(references[0]), now, limiter.call)
+        snapshots = daily_snapshots(deals, references, float(account_info.get('balance', 0)))
+
+        await connection.close()
+    except Exception as e:
+        print(f"   ❌ Erro ao coletar histórico: {e}")
+        return False
+
+    payloads = []
+    for reference, snapshot in zip(references, snapshots):
+        balance = snapshot['balance']
+        payload = {
+            'accountId': account['id'],
+            'balance': float(balance),
+            'equity': float(balance),
+            'margin': 0.0,
+            'freeMargin': float(balance),
+            'marginLevel': 0.0,
+            'openTrades': 0,
+            'openPL': 0.0,
+            'dayPL': float(snapshot['day_pl']),
+            'weekPL': float(snapshot['week_pl']),
+            'monthPL': float(snapshot['month_pl']),
+            'totalPL': 0.0,
+            'collectionDate': reference.isoformat(),
+            # Snapshot com o horário do dia: no backend só entra no histórico
+            'collectedAt': reference.isoformat(),
+        }
+
+        # Dia corrente: estado real da conta
+        if reference == now:
+            equity = float(account_info.get('equity', 0))
+            payload.update({
+                'equity': equity,
+                'margin': float(account_info.get('margin', 0)),
+                'freeMargin': float(account_info.get('freeMargin', 0)),
+                'marginLevel': float(account_info.get('marginLevel', 0)),
+                'openTrades': len(positions),
+                'openPL': float(sum(pos.get('profit', 0) for pos in positions)),
+                'totalPL': equity - balance,
+            })
+        payloads.append(payload)
+
+    print(f"   📊 {account['login']}: {len(payloads)} dia(s) calculado(s) de {len(deals)} deals")
+
+    # Todos os dias da conta em lote; o que falhar vai para a outbox
+    delivered = await async_backend.sync_items(payloads)
+    failed = [payload for payload, ok in zip(payloads, delivered) if not ok]
+    for payload in failed:
+        outbox.append(payload)
+    if failed:
+        drainer.notify()
+
+    print(f"   📤 {account['login']}: {len(payloads) - len(failed)}/{len(payloads)} dia(s) enviado(s)"
+          + (f", {len(failed)} na outbox" if failed else ""))
+    return True
+
+# ==========================================
+# PIPELINE POR CONTA
+# ==========================================
+
+async def process_daily_account(api, account: Dict, limiter: MetaApiLimiter,
+                                reference_date: datetime = None, skip_undeploy: bool = False,
+                                collect=None) -> Dict:
+    """
+    Deploy -> coleta (assim que DEPLOYED) -> undeploy imediato de uma conta.
+
+    Args:
+        collect: coleta com a conta deployada, (api, metaapi_id, account, limiter) -> bool
+            (default: collect_daily na reference_date; backfill: collect_backfill)
+
+    Returns:
+        Dict com login, success, error e deployed_seconds (do pedido de deploy
+        até o undeploy concluído)
+    """
+    collect = collect or functools.partial(collect_daily, reference_date=reference_date)
+    login = account['login']
+    outcome = {'login': login, 'success': False, 'error': None, 'deployed_seconds': 0.0}
+    timer = PhaseTimer()
+
+    print(f"\n🎯 Processando: {login}@{account['server']}")
+
+    # 1. Obtém ID MetaAPI
+    with timer.phase('metaapi_lookup'):
+        metaapi_id = await get_metaapi_account_id(api, account, limiter)
+    if not metaapi_id:
+        outcome['error'] = f"Conta {login} não encontrada no MetaAPI"
+        print(f"   ❌ {outcome['error']}")
+        ledger.record(account['id'], account['server'], timer.phases, ok=False)
+        return outcome
+
+    deployed_from = time.monotonic()
+    try:
+        # 2. Deploy (ativa conexão)
+        with timer.phase('deploy'):
+            deployed = await deploy_account(api, metaapi_id, limiter)
+        if not deployed:
+            outcome['error'] = f"Falha no deploy da conta {login}"
+            return outcome
+
+        # 3. Coleta dados (outbox ou envio em lote)
+        with timer.phase('collect'):
+            collected = await collect(api, metaapi_id, account, limiter)
+        if not collected:
+            outcome['error'] = f"Falha ao coletar dados da conta {login}"
+            return outcome
+
+        outcome['success'] = True
+        return outcome
+
+    finally:
+        # 4. Undeploy (também após falha: conta em DEPLOYING também é cobrada)
+        if not skip_undeploy:
+            with timer.phase('undeploy'):
+                await undeploy_account(api, metaapi_id, limiter)
+        outcome['deployed_seconds'] = time.monotonic() - deployed_from
+        print(f"   ⏱️ {login}: {outcome['deployed_seconds']:.0f}s deployada")
+        ledger.record(account['id'], account['server'], timer.phases, ok=outcome['success'],
+                      deployed_seconds=round(outcome['deployed_seconds'], 3))
+
+async def process_accounts_pipeline(api, accounts: List[Dict], result: Dict, reference_date: datetime = None,
+                                    skip_undeploy: bool = False, limiter: Optional[MetaApiLimiter] = None,
+                                    collect=None) -> List[Dict]:
+    """
+    Pipeline de todas as contas, no máximo limiter.concurrency deployadas ao
+    mesmo tempo (padrão DAILY_CONCURRENCY): cada conta é coletada assim que
+    fica DEPLOYED e desligada logo em seguida, liberando a vaga para a próxima.
+
+    Preenche accounts_success/accounts_failed/errors/deployed_seconds em result.
+    """
+    limiter = limiter or MetaApiLimiter(concurrency=DAILY_CONCURRENCY)
+    print(f"\n🚀 Processando {len(accounts)} conta(s), {limiter.concurrency} deployada(s) por vez...")
+    account_index.new_cycle()
+
+    results = await limiter.map(
+        accounts,
+        lambda account: process_daily_account(api, account, limiter, reference_date, skip_undeploy, collect)
+    )
+
+    outcomes = []
+    for account, outcome in zip(accounts, results):
+        if isinstance(outcome, Exception):
+            outcome = {'login': account['login'], 'success': False, 'deployed_seconds': 0.0,
+                       'error': f"Erro processando conta {account['login']}: {outcome}"}
+            print(f"   ❌ {outcome['error']}")
+        if outcome['success']:
+            result['accounts_success'] += 1
+        else:
+            result['accounts_failed'] += 1
+            result['errors'].append(outcome['error'])
+        outcomes.append(outcome)
+
+    result['deployed_seconds'] = deployed_summary(outcomes)
+    return outcomes
+
+def deployed_summary(outcomes: List[Dict]) -> Dict:
+    """Segundos deployados por conta (login -> s) + total/média/máximo"""
+    per_account = {str(o['login']): round(o['deployed_seconds'], 1) for o in outcomes}
+    values = list(per_account.values())
+    return {
+        'per_account': per_account,
+        'total': round(sum(values), 1),
+        'avg': round(sum(values) / len(values), 1) if values else 0.0,
+        'max': max(values) if values else 0.0,
+    }
+
 # ==========================================
 # COLETA PRINCIPAL
 # ==========================================
 
-async def run_daily_collection(reference_date: datetime = None, skip_undeploy: bool = False) -> Dict:
+async def run_daily_collection(reference_date: datetime = None, skip_undeploy: bool = False,
+                               date_range: Optional[Tuple[date, date]] = None) -> Dict:
     """
     Executa a coleta diária de todas as contas.
 
+    A sessão HTTP do backend é fechada no fim, ainda no event loop da
+    coleta (cada asyncio.run tem o seu; a seguinte abre outra).
+
     Args:
         reference_date: Data de referência para P/L (default: agora)
         skip_undeploy: Se True, não faz undeploy após coleta (útil para debug)
+        date_range: (de, até) para backfill: um snapshot por dia, um deploy por conta
 
     Returns:
         Dict com resultado da coleta
     """
+    try:
+        return await collect_all_accounts(reference_date, skip_undeploy, date_range)
+    finally:
+        await async_backend.close()
+
+async def collect_all_accounts(reference_date: Optional[datetime], skip_undeploy: bool,
+                               date_range: Optional[Tuple[date, date]]) -> Dict:
+    """Corpo da coleta diária (ver run_daily_collection)"""
     start_time = datetime.now(timezone.utc)
 
     print("\n" + "="*60)
@@ -258,6 +480,8 @@ async def run_daily_collection(reference_date: datetime = None, skip_undeploy: b
     print(f"⏰ Início: {start_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
     if reference_date:
         print(f"📅 Data de referência: {reference_date.strftime('%Y-%m-%d')}")
+    if date_range:
+        print(f"📆 Backfill: {date_range[0]} a {date_range[1]}")
     print("="*60)
 
     result = {
@@ -278,7 +502,7 @@ async def run_daily_collection(reference_date: datetime = None, skip_undeploy: b
         return result
 
     # Busca contas do backend
-    accounts = fetch_accounts_from_backend()
+    accounts = await fetch_accounts_from_backend()
     if not accounts:
         error = "Nenhuma conta MT5 encontrada"
         print(f"⚠️ {error}")
@@ -291,64 +515,17 @@ async def run_daily_collection(reference_date: datetime = None, skip_undeploy: b
     print("\n📡 Conectando ao MetaAPI...")
     api = MetaApi(METAAPI_TOKEN)
 
-    # Processa cada conta
-    for account in accounts:
-        login = account['login']
-        backend_id = account['id']
+    # Deploy -> coleta -> undeploy de cada conta, em paralelo
+    collect = None
+    if date_range:
+        collect = functools.partial(collect_backfill, date_from=date_range[0], date_to=date_range[1])
+    await process_accounts_pipeline(api, accounts, result, reference_date, skip_undeploy, collect=collect)
 
-        print(f"\n{'='*50}")
-        print(f"🎯 Processando: {login}@{account['server']}")
-        print(f"{'='*50}")
-
-        try:
-            # 1. Obtém ID MetaAPI
-            metaapi_id = await get_metaapi_account_id(api, account)
-            if not metaapi_id:
-                error = f"Conta {login} não encontrada no MetaAPI"
-                print(f"   ❌ {error}")
-                result['accounts_failed'] += 1
-                result['errors'].append(error)
-                continue
-
-            # 2. Deploy (ativa conexão)
-            if not await deploy_account(api, metaapi_id):
-                error = f"Falha no deploy da conta {login}"
-                result['accounts_failed'] += 1
-                result['errors'].append(error)
-                continue
-
-            # 3. Coleta dados
-            data = await collect_account_data(api, metaapi_id, backend_id, reference_date)
-            if not data:
-                error = f"Falha ao coletar dados da conta {login}"
-                result['accounts_failed'] += 1
-                result['errors'].append(error)
-                # Faz undeploy mesmo se falhou
-                if not skip_undeploy:
-                    await undeploy_account(api, metaapi_id)
-                continue
-
-            # 4. Envia para backend
-            print(f"   📤 Enviando para backend...")
-            print(f"      Balance: ${data['balance']:.2f}")
-            print(f"      Equity: ${data['equity']:.2f}")
-
-            if send_to_backend(data):
-                result['accounts_success'] += 1
-            else:
-                error = f"Falha ao enviar dados da conta {login}"
-                result['accounts_failed'] += 1
-                result['errors'].append(error)
-
-            # 5. Undeploy (desativa conexão para economizar)
-            if not skip_undeploy:
-                await undeploy_account(api, metaapi_id)
-
-        except Exception as e:
-            error = f"Erro processando conta {login}: {str(e)}"
-            print(f"   ❌ {error}")
-            result['accounts_failed'] += 1
-            result['errors'].append(error)
+    # Envia a outbox; o que não sair no prazo fica para a próxima execução
+    # (no scheduler a thread do drainer segue junto: os dois alternam lotes)
+    print(f"\n📤 Enviando outbox ao backend ({outbox.pending()} payload(s))...")
+    await asyncio.to_thread(drainer.drain, OUTBOX_DRAIN_TIMEOUT)
+    result['outbox_pending'] = outbox.pending()
 
     # Finaliza
     end_time = datetime.now(timezone.utc)
@@ -363,16 +540,22 @@ async def run_daily_collection(reference_date: datetime = None, skip_undeploy: b
     print("="*60)
     print(f"✅ Sucesso: {result['accounts_success']}/{result['accounts_processed']}")
     print(f"❌ Falhas: {result['accounts_failed']}")
+    print(f"📬 Outbox pendente: {result['outbox_pending']}")
     print(f"⏱️ Duração: {duration:.1f}s")
+    deployed = result['deployed_seconds']
+    print(f"💰 Deployado: {deployed['total']:.0f}s no total | média {deployed['avg']:.0f}s/conta | máx {deployed['max']:.0f}s")
+    ledger.log_summary(ledger.end_cycle(), log=print)
     print("="*60)
 
     # Notifica backend sobre o status
-    notify_backend_collection_status(
+    await notify_backend_collection_status(
         'completed' if result['success'] else 'partial',
         {
             'accounts_success': result['accounts_success'],
             'accounts_failed': result['accounts_failed'],
-            'duration_seconds': duration
+            'duration_seconds': duration,
+            'deployed_seconds_total': result['deployed_seconds']['total'],
+            'deployed_seconds_avg': result['deployed_seconds']['avg']
         }
     )
 
@@ -394,6 +577,14 @@ async def run_scheduler():
     print("💡 Pressione Ctrl+C para parar")
     print("="*60)
 
+    # Entre coletas o drainer segue enviando o que ficou na outbox
+    drainer.start()
+
+    # GET /metrics: percentis da última coleta + outbox
+    metrics = MetricsServer(ledger, gauges=lambda: {'outbox_pending': outbox.pending()})
+    if METRICS_PORT:
+        metrics.start()
+
     while True:
         now = datetime.now(timezone.utc)
 
@@ -425,6 +616,9 @@ async def run_scheduler():
             print("\n⏹️ Scheduler interrompido")
             break
 
+    metrics.stop()
+    await async_backend.close()
+
 # ==========================================
 # MAIN
 # ==========================================
@@ -437,6 +631,7 @@ def main():
 Exemplos:
   python metaapi_daily_collector.py --now           # Coleta agora
   python metaapi_daily_collector.py --date 2025-11-26  # Coleta com data específica
+  python metaapi_daily_collector.py --from 2025-11-01 --to 2025-11-30  # Backfill do período
   python metaapi_daily_collector.py --scheduler     # Inicia scheduler automático
   python metaapi_daily_collector.py --no-undeploy   # Coleta sem fazer undeploy
         """
@@ -446,6 +641,10 @@ Exemplos:
                        help='Executa coleta imediatamente')
     parser.add_argument('--date', type=str,
                        help='Data de referência para P/L (formato: YYYY-MM-DD)')
+    parser.add_argument('--from', dest='date_from', type=str,
+                       help='Backfill: primeiro dia (formato: YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', type=str,
+                       help='Backfill: último dia (formato: YYYY-MM-DD, default: hoje)')
     parser.add_argument('--scheduler', action='store_true',
                        help='Inicia scheduler para coleta automática diária')
     parser.add_argument('--no-undeploy', action='store_true',
@@ -468,16 +667,34 @@ Exemplos:
             print("   Use o formato: YYYY-MM-DD (ex: 2025-11-26)")
             sys.exit(1)
 
+    # Parse período de backfill se fornecido
+    date_range = None
+    if args.date_from:
+        try:
+            date_from = datetime.strptime(args.date_from, '%Y-%m-%d').date()
+            date_to = (datetime.strptime(args.date_to, '%Y-%m-%d').date() if args.date_to
+                       else datetime.now(timezone.utc).date())
+        except ValueError:
+            print(f"❌ Formato de data inválido: {args.date_from} / {args.date_to}")
+            print("   Use o formato: YYYY-MM-DD (ex: 2025-11-26)")
+            sys.exit(1)
+        if date_from > date_to:
+            print(f"❌ Período inválido: {date_from} é depois de {date_to}")
+            sys.exit(1)
+        date_range = (date_from, date_to)
+        print(f"📆 Backfill de {date_from} a {date_to}")
+
     if args.scheduler:
         # Modo scheduler (loop automático)
         print("🕐 Modo: Scheduler automático")
         asyncio.run(run_scheduler())
-    elif args.now or args.date:
-        # Modo coleta única
-        print("🎯 Modo: Coleta única")
+    elif args.now or args.date or date_range:
+        # Modo coleta única (ou backfill do período)
+        print("🎯 Modo: Backfill" if date_range else "🎯 Modo: Coleta única")
         result = asyncio.run(run_daily_collection(
             reference_date=reference_date,
-            skip_undeploy=args.no_undeploy
+            skip_undeploy=args.no_undeploy,
+            date_range=date_range
         ))
 
         # Exit code baseado no resultado
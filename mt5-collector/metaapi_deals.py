@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+METAAPI DEALS - HISTÓRICO DO MÊS PAGINADO + P/L POR PERÍODO
+============================================================================
+Os collectors MetaAPI faziam três get_deals_by_time_range (dia, semana,
+mês) por conta. Dia e semana estão contidos no mês, e cada consulta para
+em 1000 deals (limite do MetaAPI): conta com muitos deals tinha o P/L do
+mês truncado sem aviso.
+
+Agora:
+
+1. fetch_deals percorre o intervalo do mês UMA vez (desde o início da
+   semana, se ela começou no mês anterior), com offset/limit, até a
+   página vir incompleta (nada truncado)
+2. to_deal_array converte os dicts do MetaAPI (type/entryType como texto,
+   time como datetime/ISO) para o array DEAL_DTYPE de deal_aggregation
+3. calendar_pl tira dia/semana/mês do mesmo array (searchsorted)
+4. daily_snapshots faz o mesmo para vários fins de dia (backfill): P/L de
+   cada dia e balance reconstruído, tudo de uma varredura
+
+Regra de P/L do MetaAPI mantida: todos os deals exceto BALANCE, com
+profit + swap + commission.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+import deal_aggregation
+from deal_aggregation import DEAL_DTYPE, DealSeries, period_starts
+
+# Deals por página (máximo aceito pelo MetaAPI)
+METAAPI_DEALS_PAGE_SIZE = 1000
+
+# Limite de páginas por conta (proteção contra paginação que não termina)
+METAAPI_DEALS_MAX_PAGES = int(os.getenv('METAAPI_DEALS_MAX_PAGES', '100'))
+
+# Enums do MT5 como o MetaAPI devolve (texto) -> valor numérico do MetaTrader5
+DEAL_TYPES = {
+    'DEAL_TYPE_BUY': 0, 'DEAL_TYPE_SELL': 1, 'DEAL_TYPE_BALANCE': 2, 'DEAL_TYPE_CREDIT': 3,
+    'DEAL_TYPE_CHARGE': 4, 'DEAL_TYPE_CORRECTION': 5, 'DEAL_TYPE_BONUS': 6, 'DEAL_TYPE_COMMISSION': 7,
+    'DEAL_TYPE_COMMISSION_DAILY': 8, 'DEAL_TYPE_COMMISSION_MONTHLY': 9,
+    'DEAL_TYPE_COMMISSION_AGENT_DAILY': 10, 'DEAL_TYPE_COMMISSION_AGENT_MONTHLY': 11,
+    'DEAL_TYPE_INTEREST': 12, 'DEAL_TYPE_BUY_CANCELED': 13, 'DEAL_TYPE_SELL_CANCELED': 14,
+    'DEAL_TYPE_DIVIDEND': 15, 'DEAL_TYPE_DIVIDEND_FRANKED': 16, 'DEAL_TYPE_TAX': 17,
+}
+DEAL_ENTRIES = {'DEAL_ENTRY_IN': 0, 'DEAL_ENTRY_OUT': 1, 'DEAL_ENTRY_INOUT': 2, 'DEAL_ENTRY_OUT_BY': 3}
+UNKNOWN = -1
+
+# P/L do MetaAPI: tudo menos BALANCE (tipos desconhecidos também entram)
+PL_DEAL_TYPES = tuple(code for name, code in DEAL_TYPES.items() if name != 'DEAL_TYPE_BALANCE') + (UNKNOWN,)
+
+def deal_timestamp(value) -> int:
+    """time do deal (datetime, ISO ou epoch) em segundos"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    if isinstance(value, (int, float)):
+        return int(value / 1000 if value > 1e11 else value)  # epoch em ms ou s
+    if value:
+        return deal_timestamp(datetime.fromisoformat(str(value).replace('Z', '+00:00')))
+    return 0
+
+def to_deal_array(deals: Optional[List[Dict]]) -> np.ndarray:
+    """Converte deals do MetaAPI (dicts) em array estruturado DEAL_DTYPE"""
+    if not deals:
+        return np.empty(0, dtype=DEAL_DTYPE)
+
+    array = np.empty(len(deals), dtype=DEAL_DTYPE)
+    array['ticket'] = [int(d['id']) if str(d.get('id', '')).isdigit() else 0 for d in deals]
+    array['time'] = [deal_timestamp(d.get('time')) for d in deals]
+    array['type'] = [DEAL_TYPES.get(str(d.get('type', '')), UNKNOWN) for d in deals]
+    array['entry'] = [DEAL_ENTRIES.get(str(d.get('entryType', '')), UNKNOWN) for d in deals]
+    for name in ('profit', 'commission', 'swap'):
+        array[name] = [d.get(name) or 0.0 for d in deals]
+    return array
+
+async def fetch_deals(connection, start: datetime, end: datetime,
+                      call: Optional[Callable[..., Awaitable[Any]]] = None,
+                      page_size: int = METAAPI_DEALS_PAGE_SIZE,
+                      max_pages: int = METAAPI_DEALS_MAX_PAGES) -> List[Dict]:
+    """
+    Todos os deals de [start, end], página a página (offset/limit).
+
+    Args:
+        connection: RPC connection do MetaAPI
+        call: wrapper das requisições (ex: MetaApiLimiter.call)
+    """
+    call = call or (lambda func, *args: func(*args))
+    deals: List[Dict] = []
+
+    for _ in range(max_pages):
+        response = await call(connection.get_deals_by_time_range, start, end, len(deals), page_size)
+        page = response.get('deals', []) if isinstance(response, dict) else (response or [])
+        deals.extend(page)
+        if len(page) < page_size:
+            return deals
+
+    print(f"   ⚠️ Histórico com mais de {max_pages * page_size} deals: P/L parcial")
+    return deals
+
+def calendar_pl(deals, now: datetime) -> Dict[str, float]:
+    """
+    P/L de dia/semana/mês (calendário UTC) a partir de um único histórico.
+
+    Args:
+        deals: deals do MetaAPI (dicts) desde history_start(now)
+        now: instante de referência (timezone aware)
+
+    Returns:
+        Dict com day_pl, week_pl, month_pl
+    """
+    array = deals if isinstance(deals, np.ndarray) else to_deal_array(deals)
+    return deal_aggregation.calendar_pl(array, now, types=PL_DEAL_TYPES, include_costs=True)
+
+def history_start(now: datetime) -> datetime:
+    """Início do intervalo a buscar: o mais antigo entre início do mês e da semana"""
+    # A semana pode começar no mês anterior (ex: quarta-feira, dia 2)
+    return datetime.fromtimestamp(min(period_starts(now).values()), tz=timezone.utc)
+
+def daily_snapshots(deals, references: List[datetime], balance: float) -> List[Dict[str, float]]:
+    """
+    P/L de dia/semana/mês e balance em cada instante de referência (backfill).
+
+    Cada período vai do seu início até a referência (deals depois dela não
+    entram). O balance é reconstruído de trás para frente: balance atual
+    menos tudo que entrou depois da referência (trades, custos e BALANCE).
+
+    Args:
+        deals: deals do MetaAPI desde history_start(references[0]) até agora
+        references: instantes de referência (timezone aware)
+        balance: balance atual da conta
+
+    Returns:
+        Lista (na ordem de references) de dicts com day_pl, week_pl, month_pl, balance
+    """
+    array = deals if isinstance(deals, np.ndarray) else to_deal_array(deals)
+    pl = DealSeries(array, types=PL_DEAL_TYPES, include_costs=True)
+    net = DealSeries(array, types=None, include_costs=True)
+
+    snapshots = []
+    for reference in references:
+        end = int(reference.timestamp()) + 1
+        snapshot = {f'{period}_pl': pl.total(start, end) for period, start in period_starts(reference).items()}
+        snapshot['balance'] = balance - net.total(end)
+        snapshots.append(snapshot)
+    return snapshots
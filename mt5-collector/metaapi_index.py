@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+METAAPI INDEX - ÍNDICE LOGIN -> ID METAAPI (PERSISTIDO, COM TTL)
+============================================================================
+Sem o índice, cada conta fora do cache em memória listava TODAS as contas
+do MetaAPI (get_accounts_with_infinite_scroll_pagination) e procurava o
+login: partida a frio com N contas = N listagens completas, e o cache
+sumia a cada restart.
+
+MetaApiAccountIndex:
+
+- Uma única listagem paginada monta o índice login -> id
+- Gravado em METAAPI_INDEX_PATH (JSON) e reaproveitado ao reiniciar
+  enquanto tiver menos de METAAPI_INDEX_TTL segundos
+- No máximo uma listagem por ciclo (new_cycle): índice vencido ou login
+  fora dele (conta criada fora do collector); se continuar fora, a conta
+  não existe
+- Invalidação seletiva: put() ao criar conta, forget() quando o MetaAPI
+  responde que o id não existe mais (conta apagada)
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Arquivo do índice (padrão: ao lado deste módulo, independente do cwd)
+METAAPI_INDEX_PATH = os.getenv(
+    'METAAPI_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metaapi_index.json')
+)
+
+# Idade máxima do índice antes de listar tudo de novo (segundos)
+METAAPI_INDEX_TTL = int(os.getenv('METAAPI_INDEX_TTL', '3600'))
+
+# Contas por página na listagem (máximo aceito pelo MetaAPI)
+METAAPI_INDEX_PAGE_SIZE = 1000
+
+class MetaApiAccountIndex:
+    """Índice login -> id MetaAPI montado com uma listagem e persistido em disco"""
+
+    def __init__(self, path: str = METAAPI_INDEX_PATH, ttl: float = METAAPI_INDEX_TTL,
+                 page_size: int = METAAPI_INDEX_PAGE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.page_size = page_size
+        self.accounts: Dict[str, str] = {}
+        self.built_at: Optional[float] = None
+        self.listed_this_cycle = False
+        self.lock = asyncio.Lock()
+
+        self.stats = {'listings': 0, 'hits': 0, 'misses': 0}
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def load(self):
+        """Carrega o índice gravado (arquivo ausente/corrompido = índice vazio)"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.accounts = {str(login): account_id for login, account_id in data['accounts'].items()}
+            self.built_at = float(data['built_at'])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning(f"⚠️ Índice MetaAPI ilegível ({self.path}): {e}")
+            self.accounts, self.built_at = {}, None
+
+    def save(self):
+        """Grava o índice (arquivo temporário + rename: nunca fica pela metade)"""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'built_at': self.built_at, 'accounts': self.accounts}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Não foi possível gravar o índice MetaAPI ({self.path}): {e}")
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return self.built_at is None or now - self.built_at >= self.ttl
+
+    def new_cycle(self):
+        """Início de ciclo: libera uma nova listagem para logins desconhecidos"""
+        self.listed_this_cycle = False
+        self.lock = asyncio.Lock()  # um lock por event loop
+
+    async def rebuild(self, api, call: Optional[Callable[..., Awaitable[Any]]] = None):
+        """Lista todas as contas do MetaAPI (paginado) e substitui o índice"""
+        list_page = api.metatrader_account_api.get_accounts_with_infinite_scroll_pagination
+        accounts: Dict[str, str] = {}
+        offset = 0
+
+        while True:
+            page_filter = {'offset': offset, 'limit': self.page_size}
+            page = await (call(list_page, page_filter) if call else list_page(page_filter))
+            for account in page:
+                accounts[str(account.login)] = account.id
+            if len(page) < self.page_size:
+                break
+            offset += len(page)
+
+        self.accounts = accounts
+        self.built_at = time.time()
+        self.listed_this_cycle = True
+        self.stats['listings'] += 1
+        self.save()
+        print(f"   🗂️ Índice MetaAPI: {len(accounts)} conta(s) em uma listagem")
+
+    async def lookup(self, api, login, call: Optional[Callable[..., Awaitable[Any]]] = None) -> Optional[str]:
+        """
+        ID MetaAPI do login (None se a conta não existe no MetaAPI).
+
+        Args:
+            api: instância MetaApi
+            login: login MT5
+            call: wrapper das requisições (ex: MetaApiLimiter.call)
+        """
+        login = str(login)
+
+        # Lock: contas em paralelo esperam a mesma listagem em vez de listar cada uma
+        async with self.lock:
+            if not self.listed_this_cycle and (self.expired() or login not in self.accounts):
+                await self.rebuild(api, call)
+
+        account_id = self.accounts.get(login)
+        self.stats['hits' if account_id else 'misses'] += 1
+        return account_id
+
+    def put(self, login, account_id: str):
+        """Conta criada no MetaAPI"""
+        self.accounts[str(login)] = account_id
+        self.save()
+
+    def forget(self, account_id: str):
+        """Conta apagada do MetaAPI (pelo id, ex: get_account respondeu NotFound)"""
+        logins = [login for login, known_id in self.accounts.items() if known_id == account_id]
+        for login in logins:
+            del self.accounts[login]
+        if logins:
+            self.save()
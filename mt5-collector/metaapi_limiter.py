@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+METAAPI LIMITER - CONCORRÊNCIA LIMITADA + TOKEN BUCKET + BACKOFF EM 429
+============================================================================
+O metaapi_collector processava as contas uma a uma (paralelo com gather
+sem limite "pode sobrecarregar"). O limiter permite paralelo controlado:
+
+- Semáforo: no máximo METAAPI_CONCURRENCY contas em andamento
+- Token bucket: no máximo METAAPI_RATE requisições/s ao MetaAPI (rajada
+  de METAAPI_BURST), somando todas as contas - o limite é por token
+- 429 (TooManyRequestsException): pausa o bucket inteiro pelo tempo
+  recomendado pelo MetaAPI (recommendedRetryTime) ou backoff exponencial
+  METAAPI_RETRY_BASE * 2^n (máx METAAPI_RETRY_MAX), e tenta de novo até
+  METAAPI_MAX_RETRIES vezes
+
+Com concorrência C o ciclo leva ~N/C do tempo sequencial, enquanto o
+bucket segura a taxa de requisições.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Contas processadas em paralelo
+METAAPI_CONCURRENCY = int(os.getenv('METAAPI_CONCURRENCY', '5'))
+
+# Requisições por segundo ao MetaAPI (0 = sem limite) e rajada máxima
+METAAPI_RATE = float(os.getenv('METAAPI_RATE', '5'))
+METAAPI_BURST = int(os.getenv('METAAPI_BURST', '10'))
+
+# Retry em 429
+METAAPI_MAX_RETRIES = int(os.getenv('METAAPI_MAX_RETRIES', '5'))
+METAAPI_RETRY_BASE = float(os.getenv('METAAPI_RETRY_BASE', '2'))
+METAAPI_RETRY_MAX = float(os.getenv('METAAPI_RETRY_MAX', '60'))
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Segundos recomendados até a próxima tentativa se a exceção for um 429.
+
+    Returns:
+        None se não for rate limit; 0.0 se for 429 sem tempo recomendado
+    """
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'status', None)
+    if type(exc).__name__ != 'TooManyRequestsException' and status != 429:
+        return None
+
+    metadata = getattr(exc, 'metadata', None)
+    recommended = metadata.get('recommendedRetryTime') if isinstance(metadata, dict) else None
+    if not recommended:
+        return 0.0
+
+    try:
+        retry_at = datetime.fromisoformat(str(recommended).replace('Z', '+00:00'))
+    except ValueError:
+        return 0.0
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+class TokenBucket:
+    """Token bucket assíncrono (rate tokens/s, capacidade burst)"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Espera um token (fila por ordem de chegada)"""
+        if self.rate <= 0:
+            return
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Suspende todas as requisições (429: o limite é do token inteiro)"""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.paused_until)
+
+class MetaApiLimiter:
+    """Concorrência limitada entre contas + taxa de requisições ao MetaAPI"""
+
+    def __init__(self, concurrency: int = METAAPI_CONCURRENCY, rate: float = METAAPI_RATE,
+                 burst: int = METAAPI_BURST, max_retries: int = METAAPI_MAX_RETRIES,
+                 retry_base: float = METAAPI_RETRY_BASE, retry_max: float = METAAPI_RETRY_MAX):
+        """
+        Criar dentro do event loop que vai usá-lo (semáforo/lock são do loop).
+
+        Args:
+            concurrency: contas em andamento ao mesmo tempo
+            rate: requisições/s (0 = sem limite)
+            burst: rajada máxima de requisições
+            max_retries: tentativas extras após 429
+            retry_base: backoff inicial (s) quando o 429 não traz tempo recomendado
+            retry_max: backoff máximo (s)
+        """
+        self.concurrency = max(concurrency, 1)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.in_flight = 0
+
+        self.stats = {'requests': 0, 'throttled': 0, 'max_in_flight': 0}
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Chama o MetaAPI respeitando o bucket; 429 = pausa global e nova tentativa"""
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            self.stats['requests'] += 1
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                recommended = retry_after(e)
+                if recommended is None or attempt >= self.max_retries:
+                    raise
+
+                delay = max(recommended, min(self.retry_base * (2 ** attempt), self.retry_max))
+                attempt += 1
+                self.stats['throttled'] += 1
+                logger.warning(f"⏳ MetaAPI 429: aguardando {delay:.1f}s (tentativa {attempt}/{self.max_retries})")
+                self.bucket.pause(delay)
+
+    async def map(self, items: Iterable[Any], worker: Callable[[Any], Awaitable[Any]]) -> List[Any]:
+        """Executa worker(item) para todos os itens, no máximo `concurrency` por vez"""
+        async def bounded(item):
+            async with self.semaphore:
+                self.in_flight += 1
+                self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+                try:
+                    return await worker(item)
+                finally:
+                    self.in_flight -= 1
+
+        return await asyncio.gather(*(bounded(item) for item in items), return_exceptions=True)
+
+    def summary(self) -> Dict[str, Any]:
+        return {'concurrency': self.concurrency, **self.stats}
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+METAAPI STREAMING - CONEXÕES PERSISTENTES ENTRE CICLOS
+============================================================================
+A cada ciclo o metaapi_collector fazia, por conta, get_rpc_connection() +
+connect() + wait_synchronized() (a etapa mais lenta: sincronização do
+terminal) e fechava a conexão no fim.
+
+StreamingConnectionManager mantém UMA conexão de streaming sincronizada por
+conta deployada, reaproveitada entre ciclos:
+
+- account information, posições e deals vêm do estado local sincronizado
+  (terminal_state / history_storage): nenhuma RPC por ciclo
+- Reconecta só quando o MetaAPI avisa desconexão (on_disconnected) ou a
+  leitura falha; a próxima coleta da conta abre uma conexão nova
+- retain(ids) fecha as conexões de contas que saíram do roster
+
+Primeiro ciclo: custo de conexão igual ao de antes. Ciclos seguintes:
+milissegundos por conta.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from metaapi_deals import calendar_pl, history_start
+
+logger = logging.getLogger(__name__)
+
+try:
+    from metaapi_cloud_sdk import SynchronizationListener
+except ImportError:
+    SynchronizationListener = object
+
+class DisconnectListener(SynchronizationListener):
+    """Marca a conexão da conta para reconexão quando o MetaAPI desconecta"""
+
+    def __init__(self, manager: 'StreamingConnectionManager', account_id: str):
+        super().__init__()
+        self.manager = manager
+        self.account_id = account_id
+
+    async def on_disconnected(self, instance_index: str):
+        self.manager.mark_stale(self.account_id)
+
+class StreamingConnectionManager:
+    """Uma conexão de streaming sincronizada por conta, reaproveitada entre ciclos"""
+
+    def __init__(self):
+        # account_id (backend) -> {'metaapi_id', 'connection', 'stale', 'connected_at'}
+        self.connections: Dict[str, Dict] = {}
+        self.stats = {'connects': 0, 'reuses': 0, 'reconnects': 0}
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def mark_stale(self, account_id: str):
+        entry = self.connections.get(account_id)
+        if entry is not None and not entry['stale']:
+            entry['stale'] = True
+            logger.warning(f"🔌 Streaming desconectado: {account_id} (reconecta na próxima coleta)")
+
+    async def connect(self, api, metaapi_id: str,
+                      call: Optional[Callable[..., Awaitable[Any]]] = None):
+        """Deploy (se preciso) + conexão de streaming sincronizada"""
+        call = call or (lambda func, *args: func(*args))
+
+        account = await call(api.metatrader_account_api.get_account, metaapi_id)
+        if account.state != 'DEPLOYED':
+            print("   🚀 Fazendo deploy...")
+            await call(account.deploy)
+            await account.wait_deployed()
+
+        # Histórico local desde o início do mês/semana (deals para o P/L)
+        connection = account.get_streaming_connection(
+            history_start_time=history_start(datetime.now(timezone.utc))
+        )
+        await call(connection.connect)
+        await connection.wait_synchronized()
+        return connection
+
+    async def get(self, api, account_id: str, metaapi_id: str,
+                  call: Optional[Callable[..., Awaitable[Any]]] = None):
+        """Conexão sincronizada da conta (abre ou reabre só se necessário)"""
+        entry = self.connections.get(account_id)
+        if entry is not None and not entry['stale'] and entry['metaapi_id'] == metaapi_id:
+            self.stats['reuses'] += 1
+            return entry['connection']
+
+        if entry is not None:
+            self.stats['reconnects'] += 1
+            await self.close(account_id)
+
+        connection = await self.connect(api, metaapi_id, call)
+        connection.add_synchronization_listener(DisconnectListener(self, account_id))
+        self.connections[account_id] = {
+            'metaapi_id': metaapi_id,
+            'connection': connection,
+            'stale': False,
+            'connected_at': time.time(),
+        }
+        self.stats['connects'] += 1
+        return connection
+
+    def read(self, connection, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Dados da conta a partir do estado local sincronizado (sem RPC).
+
+        Returns:
+            Dict com account_info, positions, deals (quantidade) e day_pl/week_pl/month_pl
+        """
+        now = now or datetime.now(timezone.utc)
+        terminal_state = connection.terminal_state
+
+        account_info = terminal_state.account_information
+        if not account_info:
+            raise RuntimeError('estado do terminal ainda sem account information')
+
+        deals = connection.history_storage.deals or []
+        return {
+            'account_info': account_info,
+            'positions': terminal_state.positions or [],
+            'deals': len(deals),
+            **calendar_pl(deals, now),
+        }
+
+    async def close(self, account_id: str):
+        """Fecha a conexão da conta (erros de fechamento só são registrados)"""
+        entry = self.connections.pop(account_id, None)
+        if entry is None:
+            return
+        try:
+            await entry['connection'].close()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao fechar streaming de {account_id}: {e}")
+
+    async def retain(self, account_ids: Iterable[str]):
+        """Fecha as conexões de contas fora do roster atual"""
+        keep = set(account_ids)
+        for account_id in [account_id for account_id in self.connections if account_id not in keep]:
+            await self.close(account_id)
+
+    async def close_all(self):
+        await self.retain(())
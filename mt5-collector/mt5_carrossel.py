@@ -14,15 +14,25 @@ Como funciona:
 
 Limitação MT5: Apenas UMA sessão por vez
 Solução: Rotação sequencial (carrossel)
+
+Tempo por conta e por fase (timing_ledger.py): JSONL, p50/p95/p99 por
+ciclo e GET /metrics na porta METRICS_PORT
 """
 
 import MetaTrader5 as mt5
-import requests
 import time
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional
 
+from deal_aggregation import calendar_pl, TRADE_DEAL_TYPES, EXIT_DEAL_ENTRIES
+from pacing import PacingController
+from backend_client import BackendClient
+from roster import RosterCache
+from outbox import Outbox, OutboxDrainer, OUTBOX_DRAIN_TIMEOUT
+from cycle_planner import AffinityStats, count_server_switches, plan_by_server
+from timing_ledger import METRICS_PORT, MetricsServer, PhaseTimer, TimingLedger
+
 # ==========================================
 # CONFIGURAÇÕES
 # ==========================================
@@ -30,11 +40,39 @@ from typing import Dict, List, Optional
 BACKEND_URL = "http://localhost:5001"
 MT5_PATH = r"C:\mt5_terminal1\terminal64.exe"
 
+# Envio ao backend: sessão keep-alive + lotes gzip em /api/mt5/sync/batch
+backend = BackendClient(BACKEND_URL)
+
+# Roster de contas em cache (If-None-Match: 304 quando nada mudou)
+roster = RosterCache(backend)
+
+# Tempo por conta/fase (JSONL + percentis) e /metrics
+ledger = TimingLedger('mt5_carrossel')
+
+# Payloads vão primeiro para a outbox local (outbox.db); o drainer envia em
+# segundo plano, com retry, sem travar o ciclo se o backend estiver fora
+outbox = Outbox()
+drainer = OutboxDrainer(outbox, backend, ledger=ledger)
+
 # Intervalo entre coletas completas (todas as contas)
 CYCLE_INTERVAL = 60  # segundos entre ciclos completos
 
-# Intervalo entre cada conta (para não sobrecarregar)
-ACCOUNT_DELAY = 60  # segundos entre contas
+# Intervalo entre cada conta: adaptativo (pacing.py) entre MIN e ACCOUNT_DELAY.
+# Cai para ~0 com o terminal saudável; recua só em erro/lentidão
+ACCOUNT_DELAY = 60  # segundos entre contas (teto)
+MIN_ACCOUNT_DELAY = 0  # segundos entre contas (piso)
+ERROR_BACKOFF = 5  # intervalo mínimo após uma falha (dobra a cada falha seguida)
+
+pacer = PacingController(
+    min_delay=MIN_ACCOUNT_DELAY,
+    max_delay=ACCOUNT_DELAY,
+    error_backoff=ERROR_BACKOFF
+)
+
+# Afinidade de login: contas agrupadas por servidor (menos reconexões do terminal)
+LOGIN_AFFINITY = True
+
+affinity_stats = AffinityStats()
 
 # Retry settings
 MAX_RETRIES = 3
@@ -99,17 +137,20 @@ def login_account(login: int, password: str, server: str) -> bool:
     print(f"✅ Logado com sucesso: {account_info.name}")
     return True
 
-def collect_account_data(account_id: str, login: int) -> Optional[Dict]:
+def collect_account_data(account_id: str, login: int, timer: Optional[PhaseTimer] = None) -> Optional[Dict]:
     """Coleta dados de uma conta já logada"""
+    timer = timer or PhaseTimer()
     try:
         # Informações da conta
-        account_info = mt5.account_info()
+        with timer.phase('account_info'):
+            account_info = mt5.account_info()
         if account_info is None:
             print(f"❌ [{login}] Erro ao obter informações da conta")
             return None
 
         # Posições abertas
-        positions = mt5.positions_get()
+        with timer.phase('positions'):
+            positions = mt5.positions_get()
         open_trades = len(positions) if positions else 0
 
         # Calcula P/L das posições abertas
@@ -125,7 +166,8 @@ def collect_account_data(account_id: str, login: int) -> Optional[Dict]:
         margin_level = account_info.margin_level if account_info.margin > 0 else 0
 
         # Calcula P/L por período (usando nova função com calendário UTC)
-        day_pl, week_pl, month_pl = calculate_pl_by_period(login)
+        with timer.phase('deals'):
+            day_pl, week_pl, month_pl = calculate_pl_by_period(login)
         total_pl = equity - balance
 
         return {
@@ -158,14 +200,7 @@ def calculate_pl_by_period(login: int) -> tuple:
 
         now = datetime.now(timezone.utc)
 
-        # Início do dia (00:00 UTC)
-        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-
-        # Início da semana (segunda-feira 00:00 UTC)
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-
-        # Início do mês (dia 1, 00:00 UTC)
+        # Início do mês (dia 1, 00:00 UTC); dia/semana são buckets dentro do mês
         start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
         # Busca deals do mês inteiro
@@ -174,91 +209,49 @@ def calculate_pl_by_period(login: int) -> tuple:
         if deals is None or len(deals) == 0:
             return 0.0, 0.0, 0.0
 
-        day_pl = 0.0
-        week_pl = 0.0
-        month_pl = 0.0
-
-        for deal in deals:
-            # Apenas BUY/SELL com saída (ignora depósitos/transferências)
-            if deal.type in [0, 1]:  # DEAL_TYPE_BUY ou DEAL_TYPE_SELL
-                if deal.entry in [1, 2]:  # OUT ou INOUT
-                    profit = deal.profit
-                    commission = deal.commission if hasattr(deal, 'commission') else 0
-                    swap = deal.swap if hasattr(deal, 'swap') else 0
-                    total = profit + commission + swap
-
-                    # Converte timestamp do deal para datetime UTC
-                    deal_time = datetime.fromtimestamp(deal.time, tz=timezone.utc)
+        # Apenas BUY/SELL com saída (OUT/INOUT), profit + commission + swap
+        # (agregação vetorizada: ignora depósitos/transferências)
+        pl = calendar_pl(deals, now, types=TRADE_DEAL_TYPES, entries=EXIT_DEAL_ENTRIES)
 
-                    # Acumula por período
-                    month_pl += total
-
-                    if deal_time >= start_of_week:
-                        week_pl += total
-
-                    if deal_time >= start_of_day:
-                        day_pl += total
-
-        return day_pl, week_pl, month_pl
+        return pl['day_pl'], pl['week_pl'], pl['month_pl']
 
     except Exception as e:
         print(f"⚠️ [{login}] Erro ao calcular P/L: {e}")
         return 0.0, 0.0, 0.0
 
-def send_to_backend(data: Dict) -> bool:
-    """Envia dados para o backend"""
-    try:
-        url = f"{BACKEND_URL}/api/mt5/sync"
-
-        print(f"📤 Enviando dados para backend...")
-        print(f"   Balance: ${data['balance']:.2f}")
-        print(f"   Equity: ${data['equity']:.2f}")
-        print(f"   Open Trades: {data['openTrades']}")
-
-        response = requests.post(url, json=data, timeout=10)
-
-        if response.status_code == 200:
-            print(f"✅ Dados enviados com sucesso!")
-            return True
-        else:
-            print(f"❌ Erro ao enviar: {response.status_code}")
-            return False
-
-    except Exception as e:
-        print(f"❌ Exceção ao enviar: {e}")
-        return False
+def send_to_backend(data: Dict, timer: Optional[PhaseTimer] = None) -> bool:
+    """Grava os dados na outbox (o drainer envia ao backend)"""
+    timer = timer or PhaseTimer()
+    print("💾 Dados gravados na outbox...")
+    print(f"   Balance: ${data['balance']:.2f}")
+    print(f"   Equity: ${data['equity']:.2f}")
+    print(f"   Open Trades: {data['openTrades']}")
+
+    with timer.phase('outbox_write'):
+        outbox.append(data)
+    drainer.notify()
+    return True
 
 # ==========================================
 # FUNÇÕES DO BACKEND
 # ==========================================
 
 def fetch_all_accounts() -> List[Dict]:
-    """Busca todas as contas MT5 do backend"""
-    try:
-        url = f"{BACKEND_URL}/api/mt5/accounts/all"
-
-        print("📋 Buscando contas MT5 do backend...")
+    """Busca todas as contas MT5 do backend (condicional: 304 se o roster não mudou)"""
+    print("📋 Buscando contas MT5 do backend...")
 
-        response = requests.get(url, timeout=10)
-
-        if response.status_code == 200:
-            accounts = response.json()
-            print(f"✅ {len(accounts)} conta(s) encontrada(s)")
-            return accounts
-        else:
-            print(f"❌ Erro ao buscar contas: {response.status_code}")
-            return []
-
-    except Exception as e:
-        print(f"❌ Exceção ao buscar contas: {e}")
-        return []
+    diff = roster.refresh()
+    accounts = roster.list()
+    print(f"✅ {len(accounts)} conta(s) | roster {diff.summary()}")
+    return accounts
 
 # ==========================================
 # CARROSSEL PRINCIPAL
 # ==========================================
 
-def process_single_account(account: Dict) -> bool:
-    """Processa uma única conta (login, coleta, envio)"""
+def process_single_account(account: Dict, timer: Optional[PhaseTimer] = None) -> bool:
+    """Processa uma única conta (login, coleta, envio); tempos de cada fase em `timer`"""
+    timer = timer or PhaseTimer()
     account_id = account['id']
     login = int(account['login'])
     password = account['password']
@@ -269,16 +262,18 @@ def process_single_account(account: Dict) -> bool:
     print(f"{'='*50}")
 
     # 1. Faz login
-    if not login_account(login, password, server):
+    with timer.phase('login'):
+        authorized = login_account(login, password, server)
+    if not authorized:
         return False
 
     # 2. Coleta dados
-    data = collect_account_data(account_id, login)
+    data = collect_account_data(account_id, login, timer)
     if data is None:
         return False
 
     # 3. Envia para backend
-    success = send_to_backend(data)
+    success = send_to_backend(data, timer)
 
     return success
 
@@ -295,36 +290,67 @@ def run_carrossel_cycle() -> int:
         print("⚠️ Nenhuma conta MT5 cadastrada!")
         return 0
 
-    # Inicializa MT5
-    if not init_mt5():
+    # Inicializa MT5 (uma vez por ciclo: linha do ledger sem conta)
+    timer = PhaseTimer()
+    with timer.phase('mt5_init'):
+        initialized = init_mt5()
+    ledger.record(None, None, timer.phases, ok=initialized)
+    if not initialized:
         print("❌ Falha ao inicializar MT5!")
+        ledger.log_summary(ledger.end_cycle(), log=print)
         return 0
 
+    # Ordem de login: contas do mesmo servidor em sequência
+    if LOGIN_AFFINITY:
+        accounts = plan_by_server(accounts)
+    switches = count_server_switches(accounts)
+
     success_count = 0
     total_count = len(accounts)
+    cycle_start = time.monotonic()
+    pacer.start_cycle()
 
     # Processa cada conta em sequência
     for i, account in enumerate(accounts, 1):
         print(f"\n📍 Conta {i}/{total_count}")
 
+        started = time.monotonic()
+        timer = PhaseTimer()
+        success = False
         try:
-            if process_single_account(account):
+            success = process_single_account(account, timer)
+            if success:
                 success_count += 1
             else:
                 print(f"⚠️ Falha ao processar conta {account.get('login', 'unknown')}")
         except Exception as e:
             print(f"❌ Erro ao processar conta: {e}")
+        ledger.record(account['id'], account.get('server'), timer.phases, ok=success)
+
+        # Intervalo adaptativo: latência medida + taxa de erro recente
+        delay = pacer.record(success, time.monotonic() - started)
 
         # Delay entre contas (exceto na última)
-        if i < total_count:
-            print(f"⏳ Aguardando {ACCOUNT_DELAY}s antes da próxima conta...")
-            time.sleep(ACCOUNT_DELAY)
+        if i < total_count and delay > 0:
+            print(f"⏳ Aguardando {delay:.1f}s antes da próxima conta (taxa de erro: {pacer.error_rate():.0%})...")
+            time.sleep(delay)
 
     # Desliga MT5
     shutdown_mt5()
 
+    affinity_stats.record(LOGIN_AFFINITY, time.monotonic() - cycle_start, total_count, switches)
+
+    stats = pacer.stats()
     print("\n" + "="*60)
     print(f"🎠 CICLO COMPLETO: {success_count}/{total_count} contas processadas")
+    print(f"   ⚡ {stats['accounts_per_minute']:.1f} contas/min | latência média {stats['latency_avg']:.1f}s | "
+          f"erros {stats['errors']}/{stats['accounts']} | intervalo atual {stats['delay']:.1f}s")
+    print(f"   📬 Outbox: {drainer.stats['sent']} enviada(s), {outbox.pending()} pendente(s), "
+          f"{drainer.stats['dead']} descartada(s)")
+    print(f"   🔀 {switches} troca(s) de servidor ({'agrupado' if LOGIN_AFFINITY else 'sem agrupamento'})")
+    for mode, summary in affinity_stats.summary().items():
+        print(f"   ⏱️ Média {mode}: {summary['seconds_per_account']:.1f}s/conta em {summary['cycles']} ciclo(s)")
+    ledger.log_summary(ledger.end_cycle(), log=print)
     print("="*60)
 
     return success_count
@@ -335,12 +361,18 @@ def run_carrossel_loop():
     print("🎠 iDeepX MT5 CARROSSEL COLLECTOR")
     print("="*60)
     print(f"⚙️ Intervalo entre ciclos: {CYCLE_INTERVAL}s")
-    print(f"⚙️ Delay entre contas: {ACCOUNT_DELAY}s")
+    print(f"⚙️ Delay entre contas: adaptativo {MIN_ACCOUNT_DELAY}-{ACCOUNT_DELAY}s")
+    print(f"⚙️ Afinidade de login por servidor: {'sim' if LOGIN_AFFINITY else 'não'}")
     print(f"⚙️ Backend: {BACKEND_URL}")
     print(f"⚙️ MT5 Path: {MT5_PATH}")
     print("="*60)
 
     cycle_count = 0
+    drainer.start()
+
+    # GET /metrics: percentis do último ciclo + outbox
+    if METRICS_PORT:
+        MetricsServer(ledger, gauges=lambda: {'outbox_pending': outbox.pending()}).start()
 
     while True:
         try:
@@ -357,6 +389,8 @@ def run_carrossel_loop():
         except KeyboardInterrupt:
             print("\n⏹️ Carrossel interrompido pelo usuário")
             shutdown_mt5()
+            drainer.stop()
+            print(f"📬 {outbox.pending()} payload(s) na outbox para o próximo start")
             break
         except Exception as e:
             print(f"❌ Erro no loop: {e}")
@@ -372,6 +406,8 @@ if __name__ == "__main__":
         # Executa apenas um ciclo
         print("🎯 Modo: Ciclo único")
         run_carrossel_cycle()
+        if not drainer.drain(OUTBOX_DRAIN_TIMEOUT):
+            print(f"📬 {outbox.pending()} payload(s) na outbox para a próxima execução")
     else:
         # Loop contínuo
         print("🎯 Modo: Loop contínuo")
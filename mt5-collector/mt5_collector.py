@@ -9,25 +9,78 @@ Funcionalidades:
 - Envia para backend via POST /api/mt5/sync
 - Gerencia múltiplas contas simultaneamente
 - Monitora posições abertas e histórico
+
+Uma conta por processo. Para várias contas em um só processo (event loop,
+pool de terminais compartilhado), use collector_supervisor.py.
 """
 
-import MetaTrader5 as mt5
-import requests
-import json
+import os
 import time
 import sys
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Dict, Optional
+
+# MT5 (MT5_FAKE=1 usa o terminal simulado fake_mt5 para testes em Linux)
+if os.getenv('MT5_FAKE', '').lower() in ('1', 'true', 'yes'):
+    import fake_mt5 as mt5
+else:
+    import MetaTrader5 as mt5
+
+from deal_aggregation import calendar_pl, TRADE_DEAL_TYPES, EXIT_DEAL_ENTRIES
+from backend_client import BackendClient
+from outbox import Outbox, OutboxDrainer
+from timing_ledger import METRICS_PORT, MetricsServer, PhaseTimer, TimingLedger
 
 # ==========================================
 # CONFIGURAÇÕES
 # ==========================================
 
 BACKEND_URL = "http://localhost:5001"
+MT5_PATH = os.getenv('MT5_PATH', r'C:\mt5_terminal1\terminal64.exe')
+
 SYNC_INTERVAL = 30  # segundos
 MAX_RETRIES = 3
 RETRY_DELAY = 5  # segundos
 
+# ==========================================
+# SESSÃO HTTP / LEDGER / OUTBOX (um por processo)
+# ==========================================
+
+# Criados no primeiro uso: os workers do collector_supervisor importam
+# este módulo só pelo MT5Collector e não abrem outbox/ledger/HTTP
+_backend: Optional[BackendClient] = None
+_ledger: Optional[TimingLedger] = None
+_outbox: Optional[Outbox] = None
+_drainer: Optional[OutboxDrainer] = None
+
+def get_backend() -> BackendClient:
+    """Sessão HTTP reutilizada entre coletas (keep-alive)"""
+    global _backend
+    if _backend is None:
+        _backend = BackendClient(BACKEND_URL)
+    return _backend
+
+def get_ledger() -> TimingLedger:
+    """Tempo por conta/fase (JSONL + percentis) e /metrics"""
+    global _ledger
+    if _ledger is None:
+        _ledger = TimingLedger('mt5_collector')
+    return _ledger
+
+def get_outbox() -> Outbox:
+    """Outbox local: payloads vão primeiro para ela"""
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox()
+    return _outbox
+
+def get_drainer() -> OutboxDrainer:
+    """Envia a outbox com retry (backend fora do ar não perde coleta nem trava o loop)"""
+    global _drainer
+    if _drainer is None:
+        _drainer = OutboxDrainer(get_outbox(), get_backend(), ledger=get_ledger())
+    return _drainer
+
 # ==========================================
 # CLASSES
 # ==========================================
@@ -35,30 +88,53 @@ RETRY_DELAY = 5  # segundos
 class MT5Collector:
     """Coletor de dados MT5"""
 
-    def __init__(self, account_id: str, login: int, password: str, server: str):
+    def __init__(self, account_id: str, login: int, password: str, server: str, terminal_path: str = MT5_PATH):
         self.account_id = account_id
         self.login = login
         self.password = password
         self.server = server
+        self.terminal_path = terminal_path
         self.connected = False
         self.last_sync = None
         self.error_count = 0
 
+        # Tempo de cada fase da coleta atual (mt5_init, login, account_info, ...)
+        self.timer = PhaseTimer()
+
     def connect(self) -> bool:
         """Conecta ao MT5 (ou anexa a sessão existente)"""
         try:
             print(f"🔌 [{self.login}] Conectando ao MT5...")
 
             # Caminho do terminal MT5
-            mt5_path = r"C:\mt5_terminal1\terminal64.exe"
+            mt5_path = self.terminal_path
 
             # Inicializa MT5
-            if not mt5.initialize(path=mt5_path):
+            with self.timer.phase('mt5_init'):
+                initialized = mt5.initialize(path=mt5_path)
+            if not initialized:
                 error = mt5.last_error()
                 print(f"❌ [{self.login}] Erro ao inicializar MT5: {error}")
                 print(f"   Verificar se MT5 está em: {mt5_path}")
                 return False
 
+            if not self.attach():
+                # Processo de uma conta só: o terminal é só desta conta
+                mt5.shutdown()
+                return False
+            return True
+
+        except Exception as e:
+            print(f"❌ [{self.login}] Exceção ao conectar: {e}")
+            return False
+
+    def attach(self) -> bool:
+        """
+        Login no terminal já inicializado (ou usa a sessão se já está nesta
+        conta). Não inicializa nem encerra o terminal: o collector_supervisor
+        chama direto, com a sessão MT5 do worker compartilhada entre contas.
+        """
+        try:
             # ========================================================================
             # MODO INTELIGENTE: Tenta login, mas aceita sessão já conectada
             # ========================================================================
@@ -82,11 +158,12 @@ class MT5Collector:
                     print(f"   Tentando fazer login na conta {self.login}...")
 
             # Tenta fazer login (caso não tenha sessão ou seja outra conta)
-            authorized = mt5.login(
-                login=self.login,
-                password=self.password,
-                server=self.server
-            )
+            with self.timer.phase('login'):
+                authorized = mt5.login(
+                    login=self.login,
+                    password=self.password,
+                    server=self.server
+                )
 
             if not authorized:
                 error = mt5.last_error()
@@ -98,7 +175,6 @@ class MT5Collector:
                     return True
 
                 print(f"❌ [{self.login}] Erro ao fazer login: {error}")
-                mt5.shutdown()
                 return False
 
             self.connected = True
@@ -124,13 +200,15 @@ class MT5Collector:
                     return None
 
             # Informações da conta
-            account_info = mt5.account_info()
+            with self.timer.phase('account_info'):
+                account_info = mt5.account_info()
             if account_info is None:
                 print(f"❌ [{self.login}] Erro ao obter informações da conta")
                 return None
 
             # Posições abertas
-            positions = mt5.positions_get()
+            with self.timer.phase('positions'):
+                positions = mt5.positions_get()
             open_trades = len(positions) if positions else 0
 
             # Calcula P/L das posições abertas
@@ -146,7 +224,8 @@ class MT5Collector:
             margin_level = account_info.margin_level if account_info.margin > 0 else 0
 
             # Calcula P/L por período (usando nova função com calendário UTC)
-            day_pl, week_pl, month_pl = self.calculate_pl_by_period()
+            with self.timer.phase('deals'):
+                day_pl, week_pl, month_pl = self.calculate_pl_by_period()
             total_pl = equity - balance  # P/L total baseado na diferença
 
             return {
@@ -179,14 +258,7 @@ class MT5Collector:
 
             now = datetime.now(timezone.utc)
 
-            # Início do dia (00:00 UTC)
-            start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-
-            # Início da semana (segunda-feira 00:00 UTC)
-            start_of_week = now - timedelta(days=now.weekday())
-            start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-
-            # Início do mês (dia 1, 00:00 UTC)
+            # Início do mês (dia 1, 00:00 UTC); dia/semana são buckets dentro do mês
             start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
             # Busca deals do mês inteiro
@@ -195,76 +267,53 @@ class MT5Collector:
             if deals is None or len(deals) == 0:
                 return 0.0, 0.0, 0.0
 
-            day_pl = 0.0
-            week_pl = 0.0
-            month_pl = 0.0
-
-            for deal in deals:
-                # Apenas BUY/SELL com saída (ignora depósitos/transferências)
-                if deal.type in [0, 1]:  # DEAL_TYPE_BUY ou DEAL_TYPE_SELL
-                    if deal.entry in [1, 2]:  # OUT ou INOUT
-                        profit = deal.profit
-                        commission = deal.commission if hasattr(deal, 'commission') else 0
-                        swap = deal.swap if hasattr(deal, 'swap') else 0
-                        total = profit + commission + swap
-
-                        # Converte timestamp do deal para datetime UTC
-                        deal_time = datetime.fromtimestamp(deal.time, tz=timezone.utc)
+            # Apenas BUY/SELL com saída (OUT/INOUT), profit + commission + swap
+            # (agregação vetorizada: ignora depósitos/transferências)
+            pl = calendar_pl(deals, now, types=TRADE_DEAL_TYPES, entries=EXIT_DEAL_ENTRIES)
 
-                        # Acumula por período
-                        month_pl += total
-
-                        if deal_time >= start_of_week:
-                            week_pl += total
-
-                        if deal_time >= start_of_day:
-                            day_pl += total
-
-            return day_pl, week_pl, month_pl
+            return pl['day_pl'], pl['week_pl'], pl['month_pl']
 
         except Exception as e:
             print(f"⚠️ [{self.login}] Erro ao calcular P/L do período: {e}")
             return 0.0, 0.0, 0.0
 
     def send_to_backend(self, data: Dict) -> bool:
-        """Envia dados para o backend"""
+        """Grava os dados na outbox (o drainer envia ao backend)"""
         try:
-            url = f"{BACKEND_URL}/api/mt5/sync"
-
-            print(f"📤 [{self.login}] Enviando dados para backend...")
+            print(f"💾 [{self.login}] Dados gravados na outbox...")
             print(f"   Balance: ${data['balance']:.2f}")
             print(f"   Equity: ${data['equity']:.2f}")
             print(f"   Open Trades: {data['openTrades']}")
 
-            response = requests.post(url, json=data, timeout=10)
-
-            if response.status_code == 200:
-                print(f"✅ [{self.login}] Dados enviados com sucesso!")
-                self.error_count = 0
-                return True
-            else:
-                print(f"❌ [{self.login}] Erro ao enviar dados: {response.status_code}")
-                print(f"   Resposta: {response.text}")
-                self.error_count += 1
-                return False
+            with self.timer.phase('outbox_write'):
+                get_outbox().append(data)
+            get_drainer().notify()
+            self.error_count = 0
+            return True
 
         except Exception as e:
-            print(f"❌ [{self.login}] Exceção ao enviar dados: {e}")
+            print(f"❌ [{self.login}] Exceção ao gravar na outbox: {e}")
             self.error_count += 1
             return False
 
+    def take_timings(self) -> Dict[str, float]:
+        """Tempos da coleta atual (e zera para a próxima)"""
+        phases, self.timer = self.timer.phases, PhaseTimer()
+        return phases
+
     def run_once(self) -> bool:
         """Executa uma coleta e sincronização"""
         data = self.get_account_data()
-
-        if data is None:
-            return False
-
-        success = self.send_to_backend(data)
+        success = data is not None and self.send_to_backend(data)
 
         if success:
             self.last_sync = datetime.now()
 
+        # Uma coleta = um ciclo do ledger (processo de uma conta só)
+        ledger = get_ledger()
+        ledger.record(self.account_id, self.server, self.take_timings(), ok=success)
+        ledger.log_summary(ledger.end_cycle(), log=print)
+
         return success
 
     def run_loop(self):
@@ -292,6 +341,7 @@ class MT5Collector:
             except KeyboardInterrupt:
                 print(f"\n⏹️ [{self.login}] Interrompido pelo usuário")
                 self.disconnect()
+                get_drainer().stop()
                 break
             except Exception as e:
                 print(f"❌ [{self.login}] Erro no loop: {e}")
@@ -304,11 +354,9 @@ class MT5Collector:
 def fetch_account_credentials(account_id: str) -> Optional[Dict]:
     """Busca credenciais da conta no backend"""
     try:
-        url = f"{BACKEND_URL}/api/mt5/credentials/{account_id}"
-
         print(f"🔐 Buscando credenciais para conta {account_id}...")
 
-        response = requests.get(url, timeout=10)
+        response = get_backend().get(f"/api/mt5/credentials/{account_id}")
 
         if response.status_code == 200:
             data = response.json()
@@ -348,6 +396,14 @@ def start_collector(account_id: str):
         print("❌ Falha ao conectar ao MT5. Abortando...")
         sys.exit(1)
 
+    # Drainer da outbox (envia também o que ficou de execuções anteriores)
+    get_drainer().start()
+
+    # /metrics (com várias contas em processos separados só o primeiro sobe;
+    # para várias contas em um processo use collector_supervisor.py)
+    if METRICS_PORT:
+        MetricsServer(get_ledger(), gauges=lambda: {'outbox_pending': get_outbox().pending()}).start()
+
     # Executa primeira coleta imediatamente
     print("\n📊 Executando primeira coleta...")
     collector.run_once()
@@ -364,6 +420,7 @@ if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("❌ Uso: python mt5_collector.py <account_id>")
         print("   Exemplo: python mt5_collector.py 31b4d891-4f84-4743-b464-303a814f4661")
+        print("   Várias contas em um processo: python collector_supervisor.py <account_id> ... | --all")
         sys.exit(1)
 
     account_id = sys.argv[1]
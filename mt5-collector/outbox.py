@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+OUTBOX - FILA LOCAL DURÁVEL ENTRE OS COLLECTORS E O BACKEND
+============================================================================
+Com o backend (localhost:5001) fora do ar ou lento, o collector imprimia
+"❌ Erro ao enviar" e o snapshot coletado era perdido.
+
+Agora o collector só grava o payload na outbox (SQLite local, append-only)
+e segue coletando. Um drainer em thread separada envia as entradas em
+ordem, em lotes (BackendClient.sync_batch):
+
+- Ordem por conta: cada lote leva no máximo uma entrada por conta (a mais
+  antiga) e uma conta com entrada em retry fica bloqueada até ela sair
+- Backend fora do ar (exceção/5xx): entradas liberadas sem contar
+  tentativa; o drainer espera com backoff exponencial (até RETRY_MAX)
+- Conta recusada (ex: 404): retry por entrada com backoff exponencial;
+  após MAX_ATTEMPTS vai para outbox_dead
+- Entrada confirmada é apagada; compact() devolve o espaço ao disco
+  (incremental_vacuum + checkpoint do WAL)
+
+Cada payload recebe `collectedAt` na gravação: o backend usa o horário da
+coleta no snapshot, mesmo quando a entrada é enviada horas depois.
+
+Vários processos podem usar o mesmo arquivo: o drainer reserva as entradas
+com lease (BEGIN IMMEDIATE), então cada entrada é enviada por um só.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+# Padrão na pasta do mt5-collector: a coleta diária é iniciada pelo backend
+# (outro diretório de trabalho) e deve usar o mesmo arquivo
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outbox.db'))
+
+# Entradas por envio (uma por conta)
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+
+# Backoff exponencial (segundos): base * 2^tentativas, limitado ao máximo
+OUTBOX_RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', '2'))
+OUTBOX_RETRY_MAX = float(os.getenv('OUTBOX_RETRY_MAX', '300'))
+
+# Recusas seguidas da mesma entrada até ir para outbox_dead
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+
+# Reserva de uma entrada em envio (processo que morreu no meio libera sozinho)
+OUTBOX_LEASE = 60
+
+# Compacta a cada N entradas confirmadas (e sempre que a fila esvazia)
+OUTBOX_COMPACT_EVERY = 1000
+
+# Execuções únicas (--once, coleta diária): espera máxima (s) para esvaziar
+# a outbox antes de sair; o restante é enviado na próxima execução
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv('OUTBOX_DRAIN_TIMEOUT', '30'))
+
+class Outbox:
+    """Fila append-only de payloads em SQLite"""
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+
+        # auto_vacuum só vale se definido antes da primeira tabela
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                lease_until REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS outbox_account ON outbox(account_id, id);
+
+            CREATE TABLE IF NOT EXISTS outbox_dead (
+                id INTEGER PRIMARY KEY,
+                account_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                failed_at REAL NOT NULL
+            );
+        """)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def append(self, data: Dict) -> int:
+        """
+        Grava um payload no fim da fila.
+
+        Returns:
+            id da entrada
+        """
+        data = dict(data)
+        data.setdefault('collectedAt', datetime.now(timezone.utc).isoformat())
+
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (account_id, payload, created_at) VALUES (?, ?, ?)",
+                (str(data.get('accountId')), json.dumps(data, default=str), time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit: int = OUTBOX_BATCH_SIZE, now: Optional[float] = None,
+              lease: float = OUTBOX_LEASE) -> List[Tuple[int, Dict]]:
+        """
+        Reserva as próximas entradas prontas: a mais antiga de cada conta
+        que não tem entrada em retry/reservada.
+
+        Returns:
+            Lista (id, payload) em ordem de gravação
+        """
+        now = time.time() if now is None else now
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute("""
+                    SELECT id, payload FROM outbox WHERE id IN (
+                        SELECT MIN(id) FROM outbox
+                        WHERE account_id NOT IN (
+                            SELECT account_id FROM outbox
+                            WHERE next_attempt_at > :now OR lease_until > :now
+                        )
+                        GROUP BY account_id
+                        ORDER BY MIN(id)
+                        LIMIT :limit
+                    )
+                    ORDER BY id
+                """, {'now': now, 'limit': limit}).fetchall()
+
+                self.conn.executemany(
+                    "UPDATE outbox SET lease_until = ? WHERE id = ?",
+                    [(now + lease, row[0]) for row in rows]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def ack(self, ids: List[int]):
+        """Remove entradas confirmadas pelo backend"""
+        with self.lock:
+            self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def release(self, ids: List[int]):
+        """Devolve entradas à fila sem contar tentativa (backend fora do ar)"""
+        with self.lock:
+            self.conn.executemany("UPDATE outbox SET lease_until = 0 WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, ids: List[int], now: Optional[float] = None, base: float = OUTBOX_RETRY_BASE,
+              maximum: float = OUTBOX_RETRY_MAX, max_attempts: int = OUTBOX_MAX_ATTEMPTS) -> int:
+        """
+        Agenda nova tentativa das entradas recusadas (backoff exponencial).
+        Entradas que chegaram a max_attempts vão para outbox_dead.
+
+        Returns:
+            Quantas entradas foram para outbox_dead
+        """
+        now = time.time() if now is None else now
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany("""
+                    UPDATE outbox
+                    SET attempts = attempts + 1,
+                        next_attempt_at = ? + MIN(?, ? * (1 << attempts)),
+                        lease_until = 0
+                    WHERE id = ?
+                """, [(now, maximum, base, i) for i in ids])
+
+                dead = self.conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE attempts >= ?", (max_attempts,)
+                ).fetchone()[0]
+                if dead:
+                    self.conn.execute("""
+                        INSERT OR REPLACE INTO outbox_dead (id, account_id, payload, created_at, attempts, failed_at)
+                        SELECT id, account_id, payload, created_at, attempts, ? FROM outbox WHERE attempts >= ?
+                    """, (now, max_attempts))
+                    self.conn.execute("DELETE FROM outbox WHERE attempts >= ?", (max_attempts,))
+
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        return dead
+
+    def pending(self) -> int:
+        """Entradas ainda não confirmadas"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def dead(self) -> int:
+        """Entradas descartadas após MAX_ATTEMPTS"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0]
+
+    def compact(self):
+        """Devolve ao disco as páginas das entradas apagadas e trunca o WAL"""
+        with self.lock:
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+class OutboxDrainer:
+    """Envia a outbox para o backend em ordem, com lotes e retry exponencial"""
+
+    def __init__(self, outbox: Outbox, client, batch_size: int = OUTBOX_BATCH_SIZE,
+                 retry_base: float = OUTBOX_RETRY_BASE, retry_max: float = OUTBOX_RETRY_MAX,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, poll_interval: float = 1.0, ledger=None):
+        """
+        Args:
+            outbox: fila local
+            client: BackendClient (sync_batch + stats['errors'])
+            poll_interval: espera (s) quando não há entradas prontas
+            ledger: TimingLedger opcional (fase http_send de cada lote)
+        """
+        self.outbox = outbox
+        self.client = client
+        self.ledger = ledger
+        self.batch_size = batch_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+        # Backoff do drainer inteiro enquanto o backend está fora do ar
+        self.backoff = 0.0
+        self.acked_since_compact = 0
+
+        self.stats = {'sent': 0, 'retried': 0, 'dead': 0, 'backend_errors': 0}
+
+        # Um lote por vez: a thread (start) e drain() síncrono dividem backoff,
+        # stats e a contagem de erros do client
+        self.lock = threading.Lock()
+
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def drain_once(self, now: Optional[float] = None) -> int:
+        """
+        Envia um lote.
+
+        Returns:
+            Entradas confirmadas (-1 se não havia entrada pronta)
+        """
+        with self.lock:
+            return self._drain_once(now)
+
+    def _drain_once(self, now: Optional[float]) -> int:
+        entries = self.outbox.claim(self.batch_size, now=now)
+        if not entries:
+            return -1
+
+        errors_before = self.client.stats['errors']
+        started = time.perf_counter()
+        delivered = self.client.sync_batch([payload for _, payload in entries])
+        elapsed = time.perf_counter() - started
+
+        acked = [entry_id for entry_id, payload in entries if delivered.get(payload.get('accountId'))]
+        failed = [entry_id for entry_id, payload in entries if not delivered.get(payload.get('accountId'))]
+
+        if self.ledger is not None:
+            self.ledger.record(None, None, {'http_send': elapsed}, ok=not failed, items=len(entries))
+
+        self.outbox.ack(acked)
+        self.stats['sent'] += len(acked)
+        self.acked_since_compact += len(acked)
+
+        if failed and self.client.stats['errors'] > errors_before:
+            # Backend fora do ar/instável: não é culpa das entradas
+            self.outbox.release(failed)
+            self.stats['backend_errors'] += 1
+            self.backoff = min(max(self.backoff * 2, self.retry_base), self.retry_max)
+            logger.warning(f"⚠️ Outbox: backend indisponível, {len(failed)} entrada(s) aguardando {self.backoff:.0f}s")
+        else:
+            self.backoff = 0.0
+            if failed:
+                dead = self.outbox.retry(failed, now=now, base=self.retry_base,
+                                         maximum=self.retry_max, max_attempts=self.max_attempts)
+                self.stats['retried'] += len(failed)
+                self.stats['dead'] += dead
+                if dead:
+                    logger.warning(f"❌ Outbox: {dead} entrada(s) descartada(s) após {self.max_attempts} recusas")
+
+        if self.acked_since_compact >= OUTBOX_COMPACT_EVERY:
+            self._compact()
+
+        return len(acked)
+
+    def _compact(self):
+        self.outbox.compact()
+        self.acked_since_compact = 0
+
+    def compact(self):
+        """Compacta a outbox se houve entradas confirmadas desde a última vez"""
+        with self.lock:
+            if self.acked_since_compact:
+                self._compact()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Envia (na thread atual) até a outbox esvaziar ou o timeout vencer.
+        Entradas em retry agendado para depois do prazo ficam na outbox.
+
+        Returns:
+            True se a outbox ficou vazia
+        """
+        deadline = time.monotonic() + timeout
+
+        while self.outbox.pending() and time.monotonic() < deadline:
+            if self.drain_once() < 0 or self.backoff:
+                wait = self.backoff or self.poll_interval
+                time.sleep(min(wait, max(deadline - time.monotonic(), 0)))
+
+        self.compact()
+
+        return self.outbox.pending() == 0
+
+    def notify(self):
+        """Acorda o drainer (nova entrada gravada)"""
+        self.wakeup.set()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception as e:
+                logger.error(f"❌ Outbox: erro no drainer: {e}")
+                sent = -1
+
+            if self.backoff:
+                self.stopping.wait(self.backoff)
+            elif sent < 0:
+                self.compact()
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+
+    def start(self):
+        """Inicia o drainer em thread daemon"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='outbox-drainer', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Para o drainer; o que não foi enviado continua na outbox"""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
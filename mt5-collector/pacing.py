@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+PACING - INTERVALO ADAPTATIVO ENTRE CONTAS DO CARROSSEL
+============================================================================
+O carrossel esperava ACCOUNT_DELAY fixo (60s) entre cada conta: 100 contas
+= 1h40 por ciclo, mesmo com o terminal saudável.
+
+O controlador mede a latência real de login+coleta de cada conta e a taxa
+de erro recente (janela das últimas N contas):
+
+- Sucesso com latência normal: intervalo cai pela metade (até MIN, ~0s)
+- Sucesso com latência alta (> slow_factor x média): intervalo mantido
+- Falha: intervalo dobra (mínimo error_backoff, máximo MAX)
+- Taxa de erro acima de error_threshold: intervalo vai direto ao MAX
+
+Ou seja, só recua quando há erro/lentidão. Reporta contas/minuto
+efetivamente atingidas em cada ciclo.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import time
+from collections import deque
+from typing import Dict, Optional
+
+class PacingController:
+    """Controla o intervalo entre contas a partir de latência e taxa de erro"""
+
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 60.0,
+                 error_backoff: float = 5.0, decrease: float = 0.5,
+                 window: int = 20, error_threshold: float = 0.5,
+                 slow_factor: float = 2.0, latency_alpha: float = 0.3):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.error_backoff = error_backoff
+        self.decrease = decrease
+        self.error_threshold = error_threshold
+        self.slow_factor = slow_factor
+        self.latency_alpha = latency_alpha
+
+        # Começa no teto: só acelera depois de ver o terminal respondendo
+        self.delay = max_delay
+        self.latency_avg: Optional[float] = None
+        self.outcomes = deque(maxlen=window)
+
+        self.cycle_start = time.monotonic()
+        self.cycle_accounts = 0
+        self.cycle_errors = 0
+
+    def error_rate(self) -> float:
+        """Fração de falhas nas últimas contas processadas"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def record(self, success: bool, latency: float) -> float:
+        """
+        Registra o resultado de uma conta e recalcula o intervalo.
+
+        Args:
+            success: login + coleta + envio concluídos
+            latency: duração (segundos) do processamento da conta
+
+        Returns:
+            Intervalo (segundos) até a próxima conta
+        """
+        self.outcomes.append(success)
+        self.cycle_accounts += 1
+
+        slow = self.latency_avg is not None and latency > self.slow_factor * self.latency_avg
+        if self.latency_avg is None:
+            self.latency_avg = latency
+        else:
+            self.latency_avg += self.latency_alpha * (latency - self.latency_avg)
+
+        if not success:
+            self.cycle_errors += 1
+            if self.error_rate() > self.error_threshold:
+                self.delay = self.max_delay
+            else:
+                self.delay = min(max(self.delay * 2, self.error_backoff), self.max_delay)
+        elif not slow:
+            self.delay *= self.decrease
+            if self.delay < 0.5:
+                self.delay = self.min_delay
+
+        self.delay = max(self.delay, self.min_delay)
+        return self.delay
+
+    def start_cycle(self):
+        """Zera os contadores de throughput do ciclo (intervalo adaptado é mantido)"""
+        self.cycle_start = time.monotonic()
+        self.cycle_accounts = 0
+        self.cycle_errors = 0
+
+    def accounts_per_minute(self) -> float:
+        """Contas processadas por minuto no ciclo atual"""
+        elapsed = time.monotonic() - self.cycle_start
+        return self.cycle_accounts / elapsed * 60 if elapsed > 0 else 0.0
+
+    def stats(self) -> Dict:
+        """Resumo do ciclo atual"""
+        return {
+            'accounts': self.cycle_accounts,
+            'errors': self.cycle_errors,
+            'accounts_per_minute': self.accounts_per_minute(),
+            'latency_avg': self.latency_avg or 0.0,
+            'error_rate': self.error_rate(),
+            'delay': self.delay,
+        }
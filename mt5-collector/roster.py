@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+ROSTER - CACHE DA LISTA DE CONTAS COM BUSCA CONDICIONAL (ETAG)
+============================================================================
+Os collectors baixavam /api/mt5/accounts/all inteiro (com senhas) no início
+de cada ciclo, e o backend descriptografava todas as senhas a cada vez.
+
+RosterCache guarda o último roster e o ETag devolvido pelo backend:
+
+- GET com If-None-Match: roster sem mudança = 304 sem corpo
+- Roster novo: diff por conta (adicionadas, removidas, alteradas) para o
+  agendador aplicar só o que mudou em vez de reconstruir o estado
+- Backend fora do ar: continua com o último roster conhecido
+- refresh() com BackendClient; refresh_async() com AsyncBackendClient
+  (collectors asyncio, sem bloquear o event loop)
+
+diff_roster também serve para rosters que não vêm do backend (ex:
+collector_pool lê direto do SQLite).
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+ROSTER_PATH = '/api/mt5/accounts/all'
+
+# Campos que mudam a cada coleta e não alteram a conta no roster
+VOLATILE_FIELDS = ('last_error', 'lastError', 'lastHeartbeat')
+
+class RosterDiff:
+    """Mudanças entre dois rosters"""
+
+    def __init__(self, added: Optional[List[Dict]] = None, removed: Optional[List[str]] = None,
+                 changed: Optional[List[Dict]] = None, not_modified: bool = False, error: Optional[str] = None):
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or []
+        self.not_modified = not_modified
+        self.error = error
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self) -> str:
+        if self.error:
+            return f"erro ({self.error}), usando roster anterior"
+        if self.not_modified:
+            return "sem mudanças (304)"
+        return f"+{len(self.added)} -{len(self.removed)} ~{len(self.changed)}"
+
+def account_fingerprint(account: Dict, volatile: Iterable[str] = VOLATILE_FIELDS) -> Tuple:
+    """Campos relevantes da conta (ignora os voláteis)"""
+    return tuple(sorted((k, v) for k, v in account.items() if k not in volatile))
+
+def diff_roster(previous: Dict[str, Dict], accounts: List[Dict]) -> Tuple[Dict[str, Dict], RosterDiff]:
+    """
+    Compara o roster anterior com a nova lista de contas.
+
+    Returns:
+        (roster novo como dict id -> conta, diff)
+    """
+    current = {account['id']: account for account in accounts}
+
+    added = [account for account_id, account in current.items() if account_id not in previous]
+    removed = [account_id for account_id in previous if account_id not in current]
+    changed = [
+        account for account_id, account in current.items()
+        if account_id in previous and account_fingerprint(previous[account_id]) != account_fingerprint(account)
+    ]
+    return current, RosterDiff(added, removed, changed)
+
+class RosterCache:
+    """Roster de contas do backend com busca condicional e diff incremental"""
+
+    def __init__(self, client, path: str = ROSTER_PATH):
+        """
+        Args:
+            client: BackendClient (refresh) ou AsyncBackendClient (refresh_async)
+            path: rota do roster
+        """
+        self.client = client
+        self.path = path
+        self.accounts: Dict[str, Dict] = {}
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.loaded = False
+
+        self.stats = {'fetches': 0, 'not_modified': 0, 'full': 0, 'errors': 0}
+
+    def list(self) -> List[Dict]:
+        """Contas do último roster (ordem do backend)"""
+        return list(self.accounts.values())
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since do último roster"""
+        headers = {}
+        if self.loaded and self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.loaded and self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def refresh(self) -> RosterDiff:
+        """Busca o roster (condicional) e retorna o que mudou"""
+        self.stats['fetches'] += 1
+        try:
+            response = self.client.get(self.path, headers=self.conditional_headers())
+        except requests.RequestException as e:
+            return self.failed(e)
+        return self.apply(response)
+
+    async def refresh_async(self) -> RosterDiff:
+        """refresh() com AsyncBackendClient (não bloqueia o event loop)"""
+        self.stats['fetches'] += 1
+        try:
+            response = await self.client.get(self.path, headers=self.conditional_headers())
+        except requests.RequestException as e:
+            return self.failed(e)
+        return self.apply(response)
+
+    def failed(self, error: Exception) -> RosterDiff:
+        self.stats['errors'] += 1
+        logger.warning(f"⚠️ Roster: exceção ao buscar contas: {error}")
+        return RosterDiff(error=str(error))
+
+    def apply(self, response) -> RosterDiff:
+        """Aplica a resposta do backend (304, erro ou roster novo)"""
+        if response.status_code == 304:
+            self.stats['not_modified'] += 1
+            return RosterDiff(not_modified=True)
+
+        if response.status_code != 200:
+            self.stats['errors'] += 1
+            logger.warning(f"⚠️ Roster: erro ao buscar contas: {response.status_code}")
+            return RosterDiff(error=f"HTTP {response.status_code}")
+
+        try:
+            accounts = response.json()
+        except ValueError as e:
+            self.stats['errors'] += 1
+            logger.warning(f"⚠️ Roster: resposta inválida: {e}")
+            return RosterDiff(error='resposta inválida')
+
+        self.stats['full'] += 1
+        self.accounts, diff = diff_roster(self.accounts, accounts)
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.loaded = True
+        return diff
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+SCHEDULER - AGENDAMENTO ADAPTATIVO POR CONTA (DEADLINES)
+============================================================================
+Fila de prioridade (heap) com o próximo horário de coleta de cada conta.
+
+Intervalos:
+- Conta com posições abertas: ACTIVE_INTERVAL (padrão 30s)
+- Conta sem posições (flat): IDLE_INTERVAL (padrão 5min)
+- Falha (DISCONNECTED/erro): backoff exponencial RETRY_BASE * 2^(n-1),
+  limitado a RETRY_MAX
+
+Lag = atraso entre o horário previsto e o despacho real da conta; exportado
+por conta (gauge collector_scheduler_lag_seconds no /metrics) e resumido em
+p50/p95/max a cada despacho.
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import heapq
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil simples (nearest-rank) de uma lista"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+class AccountScheduler:
+    """Agenda cada conta pelo seu próximo horário de coleta"""
+
+    def __init__(self, active_interval: float = 30, idle_interval: float = 300,
+                 retry_base: float = 60, retry_max: float = 3600):
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        # account_id -> {'account', 'due', 'failures', 'lag'}
+        self.entries: Dict[str, Dict] = {}
+        self.heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _push(self, account_id: str, due: float):
+        self.entries[account_id]['due'] = due
+        heapq.heappush(self.heap, (due, next(self._seq), account_id))
+
+    def apply_diff(self, added: List[Dict], removed: List[str], changed: List[Dict], now: float):
+        """Aplica só as mudanças do roster (roster.RosterDiff), sem percorrer as demais contas"""
+        for account_id in removed:
+            self.entries.pop(account_id, None)  # entrada no heap é descartada no pop
+
+        for account in changed:
+            entry = self.entries.get(account['id'])
+            if entry is not None:
+                entry['account'] = account
+
+        for account in added:
+            if account['id'] not in self.entries:
+                self.entries[account['id']] = {'account': account, 'due': now, 'failures': 0, 'lag': 0.0}
+                self._push(account['id'], now)
+
+    def pop_due(self, now: float) -> List[Dict]:
+        """Remove e retorna as contas vencidas (registrando o lag de cada uma)"""
+        due_accounts = []
+
+        while self.heap and self.heap[0][0] <= now:
+            due, _, account_id = heapq.heappop(self.heap)
+            entry = self.entries.get(account_id)
+            if entry is None or entry['due'] != due:
+                continue  # conta removida ou reagendada
+
+            entry['due'] = None
+            entry['lag'] = now - due
+            due_accounts.append(entry['account'])
+
+        return due_accounts
+
+    def next_due(self) -> Optional[float]:
+        """Horário do próximo vencimento (None se não há contas agendadas)"""
+        while self.heap:
+            due, _, account_id = self.heap[0]
+            entry = self.entries.get(account_id)
+            if entry is not None and entry['due'] == due:
+                return due
+            heapq.heappop(self.heap)
+        return None
+
+    def interval_for(self, result: Dict, failures: int) -> float:
+        """Intervalo até a próxima coleta conforme o resultado"""
+        if result['status'] != 'CONNECTED' or not result['data']:
+            return min(self.retry_base * (2 ** (failures - 1)), self.retry_max)
+
+        if int(result['data'].get('open_trades') or 0) > 0:
+            return self.active_interval
+        return self.idle_interval
+
+    def defer(self, account_id: str, due: float):
+        """Reagenda uma conta despachada sem coletá-la (ex: circuito aberto)"""
+        if account_id in self.entries:
+            self._push(account_id, due)
+
+    def reschedule(self, result: Dict, now: float, not_before: Optional[float] = None) -> Optional[float]:
+        """Agenda a próxima coleta da conta a partir do resultado"""
+        entry = self.entries.get(result['account_id'])
+        if entry is None:
+            return None  # conta saiu do roster durante a coleta
+
+        if result['status'] == 'CONNECTED' and result['data']:
+            entry['failures'] = 0
+        else:
+            entry['failures'] += 1
+
+        due = now + self.interval_for(result, entry['failures'])
+        if not_before is not None:
+            due = max(due, not_before)
+        self._push(result['account_id'], due)
+        return due
+
+    def lag_by_account(self) -> Dict[str, float]:
+        """Último lag de despacho (segundos) de cada conta (gauge por conta no /metrics)"""
+        # list(): o /metrics lê de outra thread enquanto o loop altera as contas
+        return {account_id: entry['lag'] for account_id, entry in list(self.entries.items())}
+
+    def lag_summary(self) -> Dict[str, float]:
+        """Resumo do lag de despacho (p50/p95/max) entre todas as contas"""
+        lags = list(self.lag_by_account().values())
+        return {
+            'p50': percentile(lags, 50),
+            'p95': percentile(lags, 95),
+            'max': max(lags) if lags else 0.0,
+        }
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+SNAPSHOT ROLLUP - AGREGAÇÃO E RETENÇÃO DO HISTÓRICO DE AccountSnapshot
+============================================================================
+O collector grava um AccountSnapshot por conta a cada coleta; a tabela
+cresce sem limite. Este job agrega os snapshots brutos em barras OHLC de
+balance/equity (AccountSnapshotRollup) em três resoluções:
+
+- 1m: barras de 1 minuto
+- 1h: barras de 1 hora
+- 1d: barras de 1 dia (UTC)
+
+Execução incremental: o cursor é o maior AccountSnapshot.id já agregado
+(lastSnapshotId das barras). Cada lote de snapshots novos é agregado nas
+três resoluções e mesclado com as barras existentes (open mantido, close
+substituído, high/low estendidos, samples somados) na MESMA transação que
+avança o cursor - rodar duas vezes não conta o mesmo snapshot duas vezes.
+
+Retenção (dias, 0 = manter para sempre):
+- RAW_RETENTION_DAYS: snapshots brutos, por capturedAt (só apaga o que já foi agregado)
+- ROLLUP_1M_RETENTION_DAYS / ROLLUP_1H_RETENTION_DAYS / ROLLUP_1D_RETENTION_DAYS
+
+Pré-requisito: tabela AccountSnapshotRollup criada pelo Prisma
+(cd backend && npm run db:push).
+
+Uso:
+    python snapshot_rollup.py          # uma execução
+    python snapshot_rollup.py --loop   # repete a cada ROLLUP_INTERVAL
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DATABASE_PATH = os.getenv('DATABASE_URL', 'file:../backend/prisma/dev.db').replace('file:', '')
+
+# Retenção em dias (0 = manter para sempre)
+RAW_RETENTION_DAYS = int(os.getenv('RAW_RETENTION_DAYS', '7'))
+ROLLUP_RETENTION_DAYS = {
+    '1m': int(os.getenv('ROLLUP_1M_RETENTION_DAYS', '30')),
+    '1h': int(os.getenv('ROLLUP_1H_RETENTION_DAYS', '365')),
+    '1d': int(os.getenv('ROLLUP_1D_RETENTION_DAYS', '0')),
+}
+
+# Snapshots brutos lidos (e linhas apagadas) por transação
+ROLLUP_BATCH_SIZE = int(os.getenv('ROLLUP_BATCH_SIZE', '5000'))
+
+# Intervalo entre execuções no modo --loop (segundos)
+ROLLUP_INTERVAL = int(os.getenv('ROLLUP_INTERVAL', '300'))
+
+# Resolução -> tamanho do bucket em milissegundos
+RESOLUTIONS = (
+    ('1m', 60 * 1000),
+    ('1h', 60 * 60 * 1000),
+    ('1d', 24 * 60 * 60 * 1000),
+)
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# ============================================================================
+# STATEMENTS
+# ============================================================================
+
+SELECT_RAW_SQL = """
+    SELECT id, tradingAccountId, capturedAt, balance, equity
+    FROM AccountSnapshot
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+"""
+
+# Brutos já agregados (id <= cursor), para a retenção por capturedAt
+SELECT_RETENTION_SQL = """
+    SELECT id, capturedAt
+    FROM AccountSnapshot
+    WHERE id > ? AND id <= ?
+    ORDER BY id
+    LIMIT ?
+"""
+
+# Mescla a barra do lote com a existente: open fica, close é o mais novo,
+# high/low comparados numericamente (valores monetários são String no schema)
+UPSERT_ROLLUP_SQL = """
+    INSERT INTO AccountSnapshotRollup (
+        tradingAccountId, resolution, bucketStart,
+        balanceOpen, balanceHigh, balanceLow, balanceClose,
+        equityOpen, equityHigh, equityLow, equityClose,
+        samples, lastSnapshotId
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (tradingAccountId, resolution, bucketStart) DO UPDATE SET
+        balanceHigh = CASE WHEN CAST(excluded.balanceHigh AS REAL) > CAST(balanceHigh AS REAL)
+                           THEN excluded.balanceHigh ELSE balanceHigh END,
+        balanceLow = CASE WHEN CAST(excluded.balanceLow AS REAL) < CAST(balanceLow AS REAL)
+                          THEN excluded.balanceLow ELSE balanceLow END,
+        balanceClose = excluded.balanceClose,
+        equityHigh = CASE WHEN CAST(excluded.equityHigh AS REAL) > CAST(equityHigh AS REAL)
+                          THEN excluded.equityHigh ELSE equityHigh END,
+        equityLow = CASE WHEN CAST(excluded.equityLow AS REAL) < CAST(equityLow AS REAL)
+                         THEN excluded.equityLow ELSE equityLow END,
+        equityClose = excluded.equityClose,
+        samples = samples + excluded.samples,
+        lastSnapshotId = MAX(lastSnapshotId, excluded.lastSnapshotId)
+"""
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def parse_captured_at(value) -> Optional[int]:
+    """
+    capturedAt em milissegundos UTC.
+
+    O Prisma grava DateTime como inteiro (ms); o collector Python grava
+    string ISO-8601 (com offset). Sem offset, assume UTC.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+
+    try:
+        parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+def aggregate(rows: List[Tuple]) -> Dict[Tuple[str, str, int], Dict]:
+    """
+    Agrega snapshots brutos em barras OHLC nas três resoluções.
+
+    Args:
+        rows: (id, tradingAccountId, capturedAt, balance, equity)
+
+    Returns:
+        Dict (conta, resolução, bucketStart) -> barra
+    """
+    bars: Dict[Tuple[str, str, int], Dict] = {}
+
+    for snapshot_id, account_id, captured_at, balance, equity in rows:
+        ts = parse_captured_at(captured_at)
+        try:
+            balance_value = float(balance)
+            equity_value = float(equity)
+        except (TypeError, ValueError):
+            ts = None
+        if ts is None:
+            logger.warning(f"⚠️ Snapshot {snapshot_id} ignorado (dados inválidos)")
+            continue
+
+        for resolution, size in RESOLUTIONS:
+            key = (account_id, resolution, ts - ts % size)
+            bar = bars.get(key)
+            if bar is None:
+                bars[key] = {
+                    'first_ts': ts, 'last_ts': ts,
+                    'balance': [balance, balance, balance, balance],
+                    'equity': [equity, equity, equity, equity],
+                    'balance_hl': [balance_value, balance_value],
+                    'equity_hl': [equity_value, equity_value],
+                    'samples': 1, 'last_id': snapshot_id,
+                }
+                continue
+
+            for field, value, numeric in (('balance', balance, balance_value), ('equity', equity, equity_value)):
+                ohlc, hl = bar[field], bar[f'{field}_hl']
+                if ts < bar['first_ts']:
+                    ohlc[0] = value
+                if ts >= bar['last_ts']:
+                    ohlc[3] = value
+                if numeric > hl[0]:
+                    ohlc[1], hl[0] = value, numeric
+                if numeric < hl[1]:
+                    ohlc[2], hl[1] = value, numeric
+
+            bar['first_ts'] = min(bar['first_ts'], ts)
+            bar['last_ts'] = max(bar['last_ts'], ts)
+            bar['samples'] += 1
+            bar['last_id'] = max(bar['last_id'], snapshot_id)
+
+    return bars
+
+# ============================================================================
+# ROLLUP
+# ============================================================================
+
+class SnapshotRollup:
+    """Agrega AccountSnapshot em barras 1m/1h/1d e aplica a retenção"""
+
+    def __init__(self, database_path: str, raw_retention_days: int = 7,
+                 rollup_retention_days: Optional[Dict[str, int]] = None,
+                 batch_size: int = 5000):
+        self.database_path = database_path
+        self.raw_retention_days = raw_retention_days
+        self.rollup_retention_days = dict(rollup_retention_days or {'1m': 30, '1h': 365, '1d': 0})
+        self.batch_size = batch_size
+
+        self.conn = sqlite3.connect(database_path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def close(self):
+        self.conn.close()
+
+    def check_schema(self):
+        """Falha com mensagem clara se a tabela de rollup não existe"""
+        row = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'AccountSnapshotRollup'"
+        ).fetchone()
+        if row is None:
+            raise RuntimeError(
+                "Tabela AccountSnapshotRollup não encontrada - rode 'npm run db:push' no backend"
+            )
+
+    def cursor(self) -> int:
+        """Maior AccountSnapshot.id já agregado"""
+        row = self.conn.execute(
+            "SELECT COALESCE(MAX(lastSnapshotId), 0) FROM AccountSnapshotRollup"
+        ).fetchone()
+        return int(row[0])
+
+    def rollup_batch(self, cursor: int) -> Tuple[int, int, Dict[str, int]]:
+        """
+        Agrega o próximo lote de snapshots brutos (uma transação).
+
+        Returns:
+            (novo cursor, snapshots lidos, barras gravadas por resolução)
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(SELECT_RAW_SQL, (cursor, self.batch_size)).fetchall()
+            if not rows:
+                self.conn.execute("COMMIT")
+                return cursor, 0, {}
+
+            bars = aggregate(rows)
+            new_cursor = rows[-1][0]
+
+            # Snapshots inválidos não geram barra; o cursor precisa avançar mesmo assim
+            if bars:
+                newest = max(bars, key=lambda key: bars[key]['last_id'])
+                bars[newest]['last_id'] = new_cursor
+            else:
+                logger.warning(f"⚠️ Lote sem snapshots válidos (ids {rows[0][0]}-{new_cursor})")
+                self.conn.execute("COMMIT")
+                return new_cursor, len(rows), {}
+
+            self.conn.executemany(UPSERT_ROLLUP_SQL, [
+                (
+                    account_id, resolution, bucket_start,
+                    *bar['balance'], *bar['equity'],
+                    bar['samples'], bar['last_id']
+                )
+                for (account_id, resolution, bucket_start), bar in bars.items()
+            ])
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        written = {}
+        for _, resolution, _ in bars:
+            written[resolution] = written.get(resolution, 0) + 1
+        return new_cursor, len(rows), written
+
+    def apply_retention(self, now_ms: int) -> Dict[str, int]:
+        """
+        Apaga snapshots brutos já agregados e barras fora da janela de retenção.
+
+        Brutos: apaga os de capturedAt antes do corte com id <= cursor (nada
+        que ainda não foi agregado sai). O corte é por tempo, não por id:
+        replays da outbox e backfills gravam ids novos com capturedAt antigo.
+        Snapshots com capturedAt inválido (ignorados pelo rollup) também saem.
+        """
+        deleted = {'raw': 0}
+
+        if self.raw_retention_days > 0:
+            cutoff = now_ms - self.raw_retention_days * DAY_MS
+            limit_id = self.cursor()
+            last_id = 0
+
+            # Em lotes: não segura o lock de escrita do backend por muito tempo
+            while last_id < limit_id:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    rows = self.conn.execute(SELECT_RETENTION_SQL, (last_id, limit_id, self.batch_size)).fetchall()
+                    expired = []
+                    for snapshot_id, captured_at in rows:
+                        ts = parse_captured_at(captured_at)
+                        if ts is None or ts < cutoff:
+                            expired.append((snapshot_id,))
+                    self.conn.executemany("DELETE FROM AccountSnapshot WHERE id = ?", expired)
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+                deleted['raw'] += len(expired)
+                if len(rows) < self.batch_size:
+                    break
+                last_id = rows[-1][0]
+
+        for resolution, _ in RESOLUTIONS:
+            days = self.rollup_retention_days.get(resolution, 0)
+            deleted[resolution] = 0
+            if days <= 0:
+                continue
+            self.conn.execute("BEGIN IMMEDIATE")
+            deleted[resolution] = self.conn.execute(
+                "DELETE FROM AccountSnapshotRollup WHERE resolution = ? AND bucketStart < ?",
+                (resolution, now_ms - days * DAY_MS)
+            ).rowcount
+            self.conn.execute("COMMIT")
+
+        return deleted
+
+    def run(self, now_ms: Optional[int] = None) -> Dict:
+        """
+        Uma execução completa: agrega tudo que é novo e aplica a retenção.
+
+        Returns:
+            Dict com raw_rows, bars (por resolução), deleted e elapsed
+        """
+        self.check_schema()
+        start = time.perf_counter()
+
+        cursor = self.cursor()
+        raw_rows = 0
+        bars = {resolution: 0 for resolution, _ in RESOLUTIONS}
+
+        while True:
+            cursor, count, written = self.rollup_batch(cursor)
+            if count == 0:
+                break
+            raw_rows += count
+            for resolution, n in written.items():
+                bars[resolution] += n
+
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        deleted = self.apply_retention(now_ms)
+
+        return {
+            'cursor': cursor,
+            'raw_rows': raw_rows,
+            'bars': bars,
+            'deleted': deleted,
+            'elapsed': time.perf_counter() - start,
+        }
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Rollup e retenção de AccountSnapshot')
+    parser.add_argument('--loop', action='store_true', help=f'Repete a cada ROLLUP_INTERVAL ({ROLLUP_INTERVAL}s)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    logger.info("=" * 80)
+    logger.info("SNAPSHOT ROLLUP - 1m / 1h / 1d")
+    logger.info("=" * 80)
+    logger.info(f"Database: {DATABASE_PATH}")
+    logger.info(f"Retenção: brutos={RAW_RETENTION_DAYS}d " + " ".join(
+        f"{resolution}={days}d" for resolution, days in ROLLUP_RETENTION_DAYS.items()
+    ) + " (0 = sempre)")
+    logger.info("=" * 80)
+
+    rollup = SnapshotRollup(
+        DATABASE_PATH,
+        raw_retention_days=RAW_RETENTION_DAYS,
+        rollup_retention_days=ROLLUP_RETENTION_DAYS,
+        batch_size=ROLLUP_BATCH_SIZE,
+    )
+
+    try:
+        while True:
+            try:
+                stats = rollup.run()
+            except RuntimeError as e:
+                logger.error(f"❌ {e}")
+                sys.exit(1)
+
+            logger.info(
+                f"✅ Rollup: {stats['raw_rows']} snapshot(s) agregado(s) em {stats['elapsed']:.2f}s | "
+                f"barras 1m={stats['bars']['1m']} 1h={stats['bars']['1h']} 1d={stats['bars']['1d']} | "
+                f"apagados: brutos={stats['deleted']['raw']} 1m={stats['deleted']['1m']} "
+                f"1h={stats['deleted']['1h']} 1d={stats['deleted']['1d']} | cursor={stats['cursor']}"
+            )
+
+            if not args.loop:
+                break
+            time.sleep(ROLLUP_INTERVAL)
+    except KeyboardInterrupt:
+        logger.info("🛑 Rollup interrompido pelo usuário")
+    finally:
+        rollup.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Teste do AsyncBackendClient (async_backend_client.py) contra um backend HTTP local.
+
+O backend simulado demora para responder. Verifica que os envios não param
+o event loop (um "RPC" MetaAPI simulado continua andando durante o envio),
+que envios simultâneos se sobrepõem em vez de somar as latências, que a
+sessão reaproveita conexões keep-alive e que timeout / backend fora do ar
+viram falha do item, sem exceção.
+
+    python test_async_backend_client.py
+    (ou: python -m pytest test_async_backend_client.py)
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from async_backend_client import AsyncBackendClient
+from test_backend_client import StubBackend, make_payload, start_backend
+
+LATENCY = 0.3  # resposta do backend simulado
+
+class SlowBackend(StubBackend):
+    """Backend simulado com LATENCY segundos por requisição"""
+
+    def do_POST(self):
+        time.sleep(LATENCY)
+        try:
+            super().do_POST()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # cliente desistiu (timeout)
+
+def start_slow_backend(batch_enabled: bool = True):
+    server, handler = start_backend(batch_enabled)
+    server.RequestHandlerClass = type('Handler', (SlowBackend,), dict(vars(handler)))
+    return server, server.RequestHandlerClass
+
+async def rpc_ticks(duration: float, interval: float = 0.01) -> int:
+    """RPC MetaAPI simulado: conta quantas vezes o loop o deixou rodar"""
+    ticks, deadline = 0, time.monotonic() + duration
+    while time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        ticks += 1
+    return ticks
+
+def test_sends_overlap_without_blocking_loop():
+    server, handler = start_slow_backend()
+    client = AsyncBackendClient(f"http://127.0.0.1:{server.server_port}", pool_size=5)
+
+    async def scenario():
+        try:
+            started = time.monotonic()
+            sends = asyncio.gather(*(client.sync(make_payload(f"acc-{i}")) for i in range(5)))
+            ticks, delivered = await asyncio.gather(rpc_ticks(LATENCY), sends)
+            elapsed = time.monotonic() - started
+
+            # Segunda rodada: mesmas conexões (keep-alive)
+            again = await asyncio.gather(*(client.sync(make_payload(f"acc-{i}")) for i in range(5)))
+            return ticks, delivered + again, elapsed
+        finally:
+            await client.close()
+
+    ticks, delivered, elapsed = asyncio.run(scenario())
+    server.shutdown()
+
+    print(f"   5 envios em {elapsed:.2f}s | sequencial seria ~{5 * LATENCY:.2f}s | {ticks} ticks do RPC")
+    assert all(delivered)
+    assert elapsed < 2 * LATENCY      # sobrepostos, não 5 x LATENCY
+    assert ticks >= LATENCY / 0.01 / 2  # loop livre durante o envio
+    assert len(handler.connections) <= 5
+    assert client.stats['requests'] == 10
+
+def test_batch_and_fallback():
+    server, handler = start_backend(batch_enabled=False)
+    client = AsyncBackendClient(f"http://127.0.0.1:{server.server_port}", batch_size=10)
+
+    async def scenario():
+        try:
+            items = [make_payload('acc-1'), make_payload('missing'), make_payload('acc-2')]
+            return await client.sync_items(items), await client.sync_batch([make_payload('acc-3')])
+        finally:
+            await client.close()
+
+    first, second = asyncio.run(scenario())
+    server.shutdown()
+
+    assert first == [True, False, True] and second == {'acc-3': True}
+    assert not client.batch_supported
+    assert [path for path, _ in handler.requests_seen] == ['/api/mt5/sync/batch'] + ['/api/mt5/sync'] * 4
+
+def test_timeout_and_offline():
+    server, _ = start_slow_backend()
+    slow = AsyncBackendClient(f"http://127.0.0.1:{server.server_port}", timeout=LATENCY / 3)
+    offline = AsyncBackendClient("http://127.0.0.1:9", timeout=1)
+
+    async def scenario():
+        try:
+            items = [make_payload('acc-1'), make_payload('acc-2')]
+            return await slow.sync_items(items), await offline.sync_items(items)
+        finally:
+            await slow.close()
+            await offline.close()
+
+    timed_out, unreachable = asyncio.run(scenario())
+    server.shutdown()
+
+    assert timed_out == [False, False] and unreachable == [False, False]
+    assert slow.stats['errors'] == 1 and offline.stats['errors'] == 1
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO ASYNC BACKEND CLIENT")
+    print("=" * 80)
+
+    for test in (test_sends_overlap_without_blocking_loop, test_batch_and_fallback, test_timeout_and_offline):
+        test()
+        print(f"✅ {test.__name__}")
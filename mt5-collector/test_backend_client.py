@@ -0,0 +1,150 @@
+"""
+Teste do BackendClient contra um backend HTTP local (http.server).
+
+Verifica envio em lote com gzip, fallback item a item quando o backend não
+tem /api/mt5/sync/batch e reutilização da conexão (keep-alive).
+
+    python test_backend_client.py
+    (ou: python -m pytest test_backend_client.py)
+"""
+import os
+import sys
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend_client import BackendClient
+
+class StubBackend(BaseHTTPRequestHandler):
+    """Imita as rotas /api/mt5/sync e /api/mt5/sync/batch do backend"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    batch_enabled = True
+    requests_seen = []
+    connections = set()
+    received = []  # payloads aceitos, na ordem
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    def do_POST(self):
+        cls = type(self)
+        cls.connections.add(self.client_address)
+        payload = self.read_json()
+        cls.requests_seen.append((self.path, self.headers.get('Content-Encoding')))
+
+        if self.path == '/api/mt5/sync':
+            status = 404 if payload.get('accountId') == 'missing' else 200
+            if status == 200:
+                cls.received.append(payload)
+            self.reply(status, {'success': status == 200})
+        elif self.path == '/api/mt5/sync/batch' and cls.batch_enabled:
+            results = [
+                {'accountId': item['accountId'], 'success': item['accountId'] != 'missing'}
+                for item in payload['items']
+            ]
+            cls.received.extend(item for item in payload['items'] if item['accountId'] != 'missing')
+            self.reply(200, {'success': True, 'results': results})
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+def start_backend(batch_enabled: bool, port: int = 0):
+    handler = type('Handler', (StubBackend,), {
+        'batch_enabled': batch_enabled, 'requests_seen': [], 'connections': set(), 'received': []
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler
+
+def make_payload(account_id: str):
+    return {
+        'accountId': account_id,
+        'balance': 1000.0,
+        'equity': 1000.0,
+        'openPositions': [{'ticket': i, 'symbol': 'EURUSD', 'profit': 1.5} for i in range(20)],
+    }
+
+def test_batch_with_gzip_and_keep_alive():
+    server, handler = start_backend(batch_enabled=True)
+    client = BackendClient(f"http://127.0.0.1:{server.server_port}", batch_size=10, batch_delay=60)
+    try:
+        ids = [f"acc-{i}" for i in range(25)] + ['missing']
+        delivered = {}
+        for account_id in ids:
+            delivered.update(client.enqueue(make_payload(account_id)) or {})
+        delivered.update(client.flush())
+    finally:
+        client.close()
+        server.shutdown()
+
+    assert delivered == {account_id: account_id != 'missing' for account_id in ids}
+    assert handler.requests_seen == [('/api/mt5/sync/batch', 'gzip')] * 3
+    assert len(handler.connections) == 1
+    assert client.stats['batches'] == 3 and client.stats['items'] == 26
+
+def test_fallback_to_single_sync():
+    server, handler = start_backend(batch_enabled=False)
+    client = BackendClient(f"http://127.0.0.1:{server.server_port}", batch_size=10)
+    try:
+        first = client.sync_batch([make_payload('acc-1'), make_payload('missing')])
+        second = client.sync_batch([make_payload('acc-2'), make_payload('acc-3')])
+    finally:
+        client.close()
+        server.shutdown()
+
+    assert first == {'acc-1': True, 'missing': False}
+    assert second == {'acc-2': True, 'acc-3': True}
+    assert not client.batch_supported
+
+    # Só o primeiro lote tenta /sync/batch; depois vai direto item a item
+    paths = [path for path, _ in handler.requests_seen]
+    assert paths == ['/api/mt5/sync/batch'] + ['/api/mt5/sync'] * 4
+
+def test_items_of_same_account():
+    server, handler = start_backend(batch_enabled=True)
+    client = BackendClient(f"http://127.0.0.1:{server.server_port}", batch_size=10)
+    try:
+        # Backfill: vários dias da mesma conta no mesmo lote
+        items = [dict(make_payload('acc-1'), day=i) for i in range(3)] + [make_payload('missing')]
+        delivered = client.sync_items(items)
+    finally:
+        client.close()
+        server.shutdown()
+
+    assert delivered == [True, True, True, False]
+    assert [item['day'] for item in handler.received] == [0, 1, 2]
+
+def test_backend_offline():
+    client = BackendClient("http://127.0.0.1:9", timeout=1)
+    try:
+        delivered = client.sync_batch([make_payload('acc-1'), make_payload('acc-2')])
+    finally:
+        client.close()
+
+    assert delivered == {'acc-1': False, 'acc-2': False}
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO BACKEND CLIENT")
+    print("=" * 80)
+
+    for test in (test_batch_with_gzip_and_keep_alive, test_fallback_to_single_sync, test_items_of_same_account, test_backend_offline):
+        test()
+        print(f"✅ {test.__name__}")
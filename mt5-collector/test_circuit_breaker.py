@@ -0,0 +1,111 @@
+"""
+Teste do circuit breaker de login por conta (circuit_breaker.py).
+
+Verifica a abertura após FAILURE_THRESHOLD falhas, o backoff exponencial
+dentro do jitter de ±20%, a tentativa única em HALF_OPEN e o estado
+gravado em lastError e restaurado dele após um restart.
+
+    python test_circuit_breaker.py
+    (ou: python -m pytest test_circuit_breaker.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, LoginCircuitBreaker
+
+def login_failed(account_id='acc-1'):
+    return {'account_id': account_id, 'status': 'DISCONNECTED',
+            'error': "Login failed: (-6, 'Terminal: Authorization failed')"}
+
+def connected(account_id='acc-1'):
+    return {'account_id': account_id, 'status': 'CONNECTED', 'error': None}
+
+def open_circuit(breaker, now=1000.0):
+    for _ in range(breaker.failure_threshold):
+        breaker.record(login_failed(), now)
+    return breaker.retry_at('acc-1')
+
+def test_opens_after_threshold():
+    breaker = LoginCircuitBreaker(failure_threshold=3, base_backoff=300)
+    now = 1000.0
+
+    # Erro de terminal não conta; duas falhas de login ainda deixam tentar
+    breaker.record({'account_id': 'acc-1', 'status': 'ERROR', 'error': 'Failed to initialize MT5'}, now)
+    for _ in range(2):
+        assert breaker.record(login_failed(), now) == CLOSED
+    assert breaker.allow('acc-1', now) and breaker.retry_at('acc-1') is None
+
+    assert breaker.record(login_failed(), now) == OPEN
+    assert not breaker.allow('acc-1', now + 1)
+    assert now + 240 <= breaker.retry_at('acc-1') <= now + 360
+
+def test_backoff_grows_within_jitter():
+    breaker = LoginCircuitBreaker(failure_threshold=3, base_backoff=300, max_backoff=21600, jitter=0.2)
+
+    for failures in range(3, 12):
+        expected = min(300 * 2 ** (failures - 3), 21600)
+        samples = [breaker.backoff(failures) for _ in range(200)]
+        assert all(expected * 0.8 <= delay <= expected * 1.2 for delay in samples)
+        assert max(samples) > expected * 1.1 and min(samples) < expected * 0.9  # jitter aplicado
+
+def test_single_half_open_probe():
+    breaker = LoginCircuitBreaker(failure_threshold=3, base_backoff=300)
+    retry_at = open_circuit(breaker)
+
+    # Vencido: uma tentativa de teste; a seguinte espera o resultado dela
+    assert breaker.allow('acc-1', retry_at)
+    assert breaker.state('acc-1') == HALF_OPEN
+    assert not breaker.allow('acc-1', retry_at + 1)
+
+    # Teste falhou: reabre com o backoff da 4ª falha (600s ±20%)
+    assert breaker.record(login_failed(), retry_at + 5) == OPEN
+    reopened = breaker.retry_at('acc-1')
+    assert retry_at + 5 + 480 <= reopened <= retry_at + 5 + 720
+
+    # Teste sem resultado (erro de terminal): outro só depois do prazo
+    assert breaker.allow('acc-1', reopened)
+    breaker.record({'account_id': 'acc-1', 'status': 'ERROR', 'error': 'IPC'}, reopened + 1)
+    assert not breaker.allow('acc-1', reopened + 299)
+    assert breaker.allow('acc-1', reopened + 300)
+
+    # Teste com sucesso fecha o circuito
+    assert breaker.record(connected(), reopened + 301) == CLOSED
+    assert breaker.retry_at('acc-1') is None and breaker.circuits['acc-1']['failures'] == 0
+
+def test_annotate_restore_round_trip():
+    breaker = LoginCircuitBreaker(failure_threshold=3, base_backoff=300)
+    retry_at = open_circuit(breaker)
+
+    result = login_failed()
+    breaker.annotate(result)
+    assert result['error'].startswith("Login failed: (-6, 'Terminal: Authorization failed') | circuit=OPEN failures=3 ")
+
+    # Conta fechada não ganha anotação
+    closed = connected('acc-2')
+    closed['error'] = 'aviso'
+    breaker.annotate(closed)
+    assert closed['error'] == 'aviso'
+
+    # Restart: estado volta do lastError gravado no banco
+    restored = LoginCircuitBreaker(failure_threshold=3, base_backoff=300)
+    restored.restore('acc-1', result['error'])
+    assert restored.state('acc-1') == OPEN and restored.circuits['acc-1']['failures'] == 3
+    assert abs(restored.retry_at('acc-1') - retry_at) < 1e-3
+    assert not restored.allow('acc-1', retry_at - 1) and restored.allow('acc-1', retry_at + 1e-3)
+
+    # HALF_OPEN interrompido volta como OPEN; texto sem estado é ignorado
+    restored.restore('acc-3', result['error'].replace('circuit=OPEN', 'circuit=HALF_OPEN'))
+    restored.restore('acc-4', 'Failed to initialize MT5')
+    assert restored.state('acc-3') == OPEN and restored.state('acc-4') == CLOSED
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO CIRCUIT BREAKER")
+    print("=" * 80)
+
+    for test in (test_opens_after_threshold, test_backoff_grows_within_jitter, test_single_half_open_probe,
+                 test_annotate_restore_round_trip):
+        test()
+        print(f"✅ {test.__name__}")
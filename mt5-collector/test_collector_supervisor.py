@@ -0,0 +1,229 @@
+"""
+Teste do supervisor (várias contas do mt5_collector em um processo).
+
+Roda contas em 2 terminais com o MetaTrader5 simulado e um backend HTTP
+local: credenciais via fetch_account_credentials, coletas pela outbox,
+rate limit global de logins e memória por conta. Também verifica que o
+modo roster sobrevive a um roster vazio, que um worker morto é recriado
+e que o worker mantém a sessão MT5 entre contas.
+
+    python test_collector_supervisor.py
+    (ou: python -m pytest test_collector_supervisor.py)
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+# Configura o ambiente ANTES de importar o collector
+os.environ['MT5_FAKE'] = '1'
+os.environ.setdefault('FAKE_MT5_DEALS_PER_DAY', '2')
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mt5_collector
+import collector_supervisor
+from collector_supervisor import CollectorSupervisor
+from roster import RosterDiff
+from test_backend_client import StubBackend
+
+SERVERS = ('GMI3-Real', 'DooTechnology-Live')
+
+class CredentialsBackend(StubBackend):
+    """Stub do backend + GET /api/mt5/credentials/<id>"""
+
+    def do_GET(self):
+        account_id = self.path.rsplit('/', 1)[-1]
+        if not self.path.startswith('/api/mt5/credentials/') or account_id == 'unknown':
+            return self.reply(404, {'error': 'Account not found'})
+
+        index = int(account_id.split('-')[1])
+        self.reply(200, {
+            'id': account_id,
+            'login': str(7100000 + index),
+            'password': 'secret',
+            'server': SERVERS[index % len(SERVERS)],
+        })
+
+def test_supervisor_runs_accounts_over_shared_terminals():
+    handler = type('Handler', (CredentialsBackend,), {'requests_seen': [], 'connections': set(), 'received': []})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mt5_collector.get_backend().base_url = f"http://127.0.0.1:{server.server_port}"
+
+    # Workers herdam o módulo simulado (fork): terminal rápido só neste teste
+    fake = mt5_collector.mt5
+    saved = fake.INIT_LATENCY, fake.LOGIN_LATENCY
+    fake.INIT_LATENCY, fake.LOGIN_LATENCY = 0.01, 0.01
+
+    account_ids = [f"acc-{i}" for i in range(6)] + ['unknown']
+    supervisor = CollectorSupervisor(
+        terminals=['/fake/terminal1/terminal64.exe', '/fake/terminal2/terminal64.exe'],
+        sync_interval=0.1, login_rate=20, report_interval=60
+    )
+    try:
+        started = time.monotonic()
+        report = asyncio.run(supervisor.run(account_ids, cycles=2))
+        elapsed = time.monotonic() - started
+
+        assert mt5_collector.get_drainer().drain(timeout=10)
+    finally:
+        fake.INIT_LATENCY, fake.LOGIN_LATENCY = saved
+        mt5_collector.get_drainer().stop()
+        server.shutdown()
+
+    # Conta sem credenciais fica de fora; as outras coletam 2x cada
+    assert sorted(supervisor.accounts) == sorted(account_ids[:-1])
+    assert all(state['collections'] == 2 for state in supervisor.accounts.values())
+    assert sorted(p['accountId'] for p in handler.received) == sorted(account_ids[:-1] * 2)
+
+    # Os dois terminais foram usados, um worker por terminal
+    assert {state['terminal'] for state in supervisor.accounts.values()} == {0, 1}
+    assert len(supervisor.worker_pids) == 2
+
+    # 12 logins a 20/s: no mínimo 11 intervalos de 50ms
+    assert elapsed >= 11 / 20
+
+    # Timing ledger: fases do worker + outbox + envio HTTP do drainer
+    totals = mt5_collector.get_ledger().totals
+    assert totals['login']['count'] == 12 and totals['outbox_write']['count'] == 12
+    assert totals['http_send']['count'] >= 1
+    with open(mt5_collector.get_ledger().path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert sum(1 for line in lines if line['collector'] == 'mt5_collector' and 'login' in line['phases']) == 12
+
+    print(f"   memória: {report['rss_total'] / 2**20:.1f} MB em {report['processes']} processo(s), "
+          f"{report['rss_per_account'] / 2**20:.2f} MB/conta")
+    assert report['accounts'] == 6 and report['processes'] == 3
+    assert report['rss_per_account'] > 0
+
+def fake_account(index: int):
+    return {'id': f"acc-{index}", 'login': str(7100000 + index), 'password': 'secret',
+            'server': SERVERS[index % len(SERVERS)]}
+
+class FakeRoster:
+    """Roster que devolve uma sequência de diffs (depois, 304)"""
+
+    def __init__(self, accounts, diffs):
+        self.accounts = list(accounts)
+        self.diffs = list(diffs)
+
+    def refresh(self):
+        return self.diffs.pop(0) if self.diffs else RosterDiff(not_modified=True)
+
+    def list(self):
+        return self.accounts
+
+class fast_terminal:
+    """Terminal simulado rápido (workers herdam o módulo no fork)"""
+
+    def __enter__(self):
+        fake = mt5_collector.mt5
+        self.saved = fake.INIT_LATENCY, fake.LOGIN_LATENCY
+        fake.INIT_LATENCY, fake.LOGIN_LATENCY = 0.01, 0.01
+
+    def __exit__(self, *exc):
+        mt5_collector.mt5.INIT_LATENCY, mt5_collector.mt5.LOGIN_LATENCY = self.saved
+
+def test_roster_mode_survives_empty_roster():
+    account = fake_account(0)
+    roster = FakeRoster([account], [
+        RosterDiff(not_modified=True),  # carga inicial
+        RosterDiff(removed=[account['id']]),
+        RosterDiff(added=[account]),
+    ])
+    supervisor = CollectorSupervisor(terminals=['/fake/terminal1/terminal64.exe'], sync_interval=0.1,
+                                     login_rate=50, report_interval=60, roster_interval=0.4)
+
+    async def scenario():
+        task = asyncio.create_task(supervisor.run(roster=roster))
+        await asyncio.sleep(0.6)
+        emptied = dict(supervisor.accounts)
+        await asyncio.sleep(0.7)
+        alive = not task.done()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return emptied, alive
+
+    with fast_terminal():
+        emptied, alive = asyncio.run(scenario())
+
+    # Roster vazio esvaziou as tasks, mas o supervisor seguiu e recebeu a conta de volta
+    assert emptied == {} and alive
+    assert supervisor.accounts[account['id']]['collections'] >= 1
+
+def test_dead_worker_is_restarted():
+    supervisor = CollectorSupervisor(terminals=['/fake/terminal1/terminal64.exe'], login_rate=50)
+    state = {'account': fake_account(1), 'terminal': 0, 'collections': 0, 'errors': 0,
+             'consecutive_errors': 0, 'last_sync': None, 'last_elapsed': 0.0}
+
+    async def scenario():
+        supervisor.limiter = collector_supervisor.LoginRateLimiter(50)
+        broken = supervisor.executors[0]
+        try:
+            broken.submit(os._exit, 1).result(timeout=10)
+        except Exception:
+            pass  # worker morreu: pool quebrado
+        first = await supervisor.collect_once(state)
+        second = await supervisor.collect_once(state)
+        return broken, first, second
+
+    try:
+        with fast_terminal():
+            broken, first, second = asyncio.run(scenario())
+    finally:
+        supervisor.close()
+
+    assert first is False and second is True
+    assert supervisor.executors[0] is not broken
+    assert state['collections'] == 1
+
+def test_worker_keeps_mt5_session():
+    """Worker inicializa o terminal uma vez; login recusado não derruba a sessão"""
+    fake = mt5_collector.mt5
+    calls = []
+    saved = fake.initialize, fake.shutdown
+
+    def initialize(*args, **kwargs):
+        calls.append('initialize')
+        return saved[0](*args, **kwargs)
+
+    def shutdown():
+        calls.append('shutdown')
+        saved[1]()
+
+    bad = dict(fake_account(1), password='bad')
+    collector_supervisor.worker_init('/fake/terminal1/terminal64.exe')
+    fake.initialize, fake.shutdown = initialize, shutdown
+    try:
+        with fast_terminal():
+            results = [collector_supervisor.collect_account(account)
+                       for account in (fake_account(0), bad, fake_account(2), fake_account(2))]
+    finally:
+        fake.initialize, fake.shutdown = saved
+        collector_supervisor.release_mt5_session()
+
+    assert [result['data'] is not None for result in results] == [True, False, True, True]
+    assert calls == ['initialize']
+    # Mesma conta de novo: sessão já nela, sem novo login
+    assert 'mt5_init' in results[0]['timings'] and 'login' in results[2]['timings']
+    assert 'login' not in results[3]['timings']
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO COLLECTOR SUPERVISOR")
+    print("=" * 80)
+
+    for test in (test_supervisor_runs_accounts_over_shared_terminals, test_roster_mode_survives_empty_roster,
+                 test_dead_worker_is_restarted, test_worker_keeps_mt5_session):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,105 @@
+"""
+Teste do planner de afinidade de login (agrupamento por servidor).
+
+Verifica a ordenação e mede, com o MetaTrader5 simulado (custo extra a cada
+troca de servidor), o tempo de ciclo com e sem agrupamento.
+
+    python test_cycle_planner.py
+    (ou: python -m pytest test_cycle_planner.py)
+"""
+import os
+import sys
+import time
+import tempfile
+
+# Configura o ambiente ANTES de importar o collector
+os.environ['MT5_FAKE'] = '1'
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+os.environ.setdefault('FAKE_MT5_INIT_LATENCY', '0.05')
+os.environ.setdefault('FAKE_MT5_DEALS_PER_DAY', '2')
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+os.chdir(tempfile.gettempdir())  # collector.log fora do repositório
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import collector_pool
+from cycle_planner import count_server_switches, plan_by_server
+
+SERVERS = ('GMI3-Real', 'DooTechnology-Live', 'ICMarkets-Live01')
+
+def make_accounts(count: int):
+    cipher = Fernet(os.environ['ENCRYPTION_KEY'].encode())
+    return [
+        {
+            'id': f"acc-{i}",
+            'login': str(7000000 + i),
+            'server': SERVERS[i % len(SERVERS)],
+            'encrypted_password': cipher.encrypt(b'secret').decode(),
+        }
+        for i in range(count)
+    ]
+
+def test_groups_by_server_keeping_priority():
+    accounts = make_accounts(12)
+    planned = plan_by_server(accounts)
+
+    assert sorted(a['id'] for a in planned) == sorted(a['id'] for a in accounts)
+    assert count_server_switches(accounts) == 11
+    assert count_server_switches(planned) == len(SERVERS) - 1
+
+    # Grupos na ordem da primeira conta; dentro do grupo, ordem original
+    assert [a['server'] for a in planned[::4]] == list(SERVERS)
+    assert [a['id'] for a in planned[:4]] == ['acc-0', 'acc-3', 'acc-6', 'acc-9']
+
+def test_current_server_goes_first():
+    accounts = make_accounts(6)
+    planned = plan_by_server(accounts, current_server='ICMarkets-Live01')
+
+    assert planned[0]['server'] == 'ICMarkets-Live01'
+    assert count_server_switches(planned, 'ICMarkets-Live01') == len(SERVERS) - 1
+
+def run_cycle(login_affinity: bool, accounts):
+    pool = collector_pool.TerminalPool(
+        [r"C:\mt5_terminal1\terminal64.exe", r"C:\mt5_terminal2\terminal64.exe"],
+        login_affinity=login_affinity
+    )
+    try:
+        start = time.time()
+        results = pool.map(accounts)
+        return results, time.time() - start, pool.last_switches
+    finally:
+        pool.close()
+
+def test_grouping_reduces_cycle_time():
+    # Workers herdam o módulo simulado (fork): custo por troca de servidor
+    fake = collector_pool.mt5
+    saved = fake.LOGIN_LATENCY, fake.SERVER_SWITCH_LATENCY
+    fake.LOGIN_LATENCY, fake.SERVER_SWITCH_LATENCY = 0.02, 0.1
+    accounts = make_accounts(24)
+
+    try:
+        mixed_results, mixed_time, mixed_switches = run_cycle(False, accounts)
+        grouped_results, grouped_time, grouped_switches = run_cycle(True, accounts)
+    finally:
+        fake.LOGIN_LATENCY, fake.SERVER_SWITCH_LATENCY = saved
+
+    print(f"   sem agrupamento: {mixed_time:.2f}s ({mixed_switches} trocas de servidor)")
+    print(f"   agrupado.......: {grouped_time:.2f}s ({grouped_switches} trocas de servidor)")
+
+    assert all(r['status'] == 'CONNECTED' for r in mixed_results + grouped_results)
+    assert grouped_switches < mixed_switches
+    assert grouped_time < mixed_time
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO PLANNER DE AFINIDADE DE LOGIN")
+    print("=" * 80)
+
+    for test in (test_groups_by_server_keeping_priority, test_current_server_goes_first,
+                 test_grouping_reduces_cycle_time):
+        test()
+        print(f"✅ {test.__name__}")
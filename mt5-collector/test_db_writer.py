@@ -0,0 +1,166 @@
+"""
+Teste do writer em lote (db_writer.py) contra um SQLite local.
+
+Verifica a detecção de mudança do BatchWriter (snapshot igual vira só
+heartbeat, keep-alive a cada snapshot_max_gap) e que o StreamingWriter
+regrava um micro-lote cuja transação falhou e, se a falha persistir,
+devolve exatamente as contas não gravadas.
+
+    python test_db_writer.py
+    (ou: python -m pytest test_db_writer.py)
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db_writer import BatchWriter, StreamingWriter
+
+# Subconjunto do schema Prisma usado pelo writer
+SCHEMA = """
+CREATE TABLE TradingAccount (
+    id TEXT PRIMARY KEY,
+    status TEXT, connected INTEGER DEFAULT 0,
+    balance TEXT, equity TEXT, margin TEXT, freeMargin TEXT, marginLevel TEXT,
+    openTrades INTEGER, openPL TEXT, dayPL TEXT, weekPL TEXT, monthPL TEXT, totalPL TEXT,
+    lastHeartbeat DATETIME, lastError TEXT, updatedAt DATETIME, lastSnapshotAt DATETIME
+);
+CREATE TABLE AccountSnapshot (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tradingAccountId TEXT NOT NULL,
+    capturedAt DATETIME NOT NULL,
+    balance TEXT, equity TEXT, margin TEXT, freeMargin TEXT, marginLevel TEXT,
+    openTrades INTEGER, openPL TEXT, dayPL TEXT, weekPL TEXT, monthPL TEXT, totalPL TEXT
+);
+"""
+
+def open_db(count):
+    path = os.path.join(tempfile.mkdtemp(), 'dev.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO TradingAccount (id) VALUES (?)", [(f"acc-{i}",) for i in range(count)])
+    conn.commit()
+    return path, conn
+
+def make_result(index, balance=1000.0):
+    return {
+        'account_id': f"acc-{index}",
+        'status': 'CONNECTED',
+        'error': None,
+        'data': {
+            'balance': balance, 'equity': balance + 5, 'margin': 0.0, 'free_margin': balance,
+            'margin_level': 0.0, 'open_trades': 1, 'open_pl': 5.0,
+            'day_pl': 1.0, 'week_pl': 2.0, 'month_pl': 3.0, 'total_pl': 4.0,
+            'last_heartbeat': datetime.now(timezone.utc).isoformat(),
+        },
+    }
+
+class FlakyWriter(BatchWriter):
+    """BatchWriter que falha `failures` vezes nos lotes com a conta `account_id`"""
+
+    def __init__(self, path, account_id, failures):
+        super().__init__(path)
+        self.account_id = account_id
+        self.failures = failures
+        self.attempts = 0
+
+    def write(self, results):
+        if any(result['account_id'] == self.account_id for result in results):
+            self.attempts += 1
+            if self.attempts <= self.failures:
+                raise sqlite3.OperationalError('database is locked')
+        return super().write(results)
+
+def run_stream(writer, count):
+    # 3 lotes de 2: [acc-0, acc-1], [acc-2, acc-3], [acc-4, acc-5]
+    stream = StreamingWriter(writer, batch_size=2, max_delay=60, retries=2, retry_delay=0)
+    for i in range(count):
+        stream.submit(make_result(i))
+    return stream.close()
+
+def snapshot_accounts(conn):
+    return sorted(row[0] for row in conn.execute("SELECT tradingAccountId FROM AccountSnapshot"))
+
+def test_unchanged_snapshot_is_skipped():
+    path, conn = open_db(2)
+    writer = BatchWriter(path, snapshot_max_gap=900)
+
+    writer.write([make_result(0), make_result(1)])
+    stats = writer.write([make_result(0), make_result(1, balance=1001.0)])
+    writer.close()
+
+    # acc-0 igual: só heartbeat; acc-1 mudou: novo snapshot
+    assert stats['snapshots_skipped'] == 1
+    assert snapshot_accounts(conn) == ['acc-0', 'acc-1', 'acc-1']
+    conn.close()
+
+def test_heartbeat_only_update_touches_account():
+    path, conn = open_db(1)
+    writer = BatchWriter(path, snapshot_max_gap=900)
+    writer.write([make_result(0)])
+    conn.execute("UPDATE TradingAccount SET lastHeartbeat = 'old', lastSnapshotAt = 'old'")
+    conn.commit()
+
+    second = make_result(0)
+    stats = writer.write([second])
+    writer.close()
+
+    row = conn.execute("SELECT lastHeartbeat, lastSnapshotAt FROM TradingAccount").fetchone()
+    assert stats['snapshots_skipped'] == 1 and len(snapshot_accounts(conn)) == 1
+    assert row[0] == second['data']['last_heartbeat'] and row[1] not in (None, 'old')
+    conn.close()
+
+def test_max_gap_forces_keep_alive_snapshot():
+    path, conn = open_db(1)
+    writer = BatchWriter(path, snapshot_max_gap=60)
+    writer.write([make_result(0)])
+    writer.write([make_result(0)])
+    assert len(snapshot_accounts(conn)) == 1
+
+    # Último snapshot gravado há mais de snapshot_max_gap: keep-alive mesmo sem mudança
+    fingerprint, _ = writer.last_written['acc-0']
+    writer.last_written['acc-0'] = (fingerprint, time.monotonic() - 61)
+    stats = writer.write([make_result(0)])
+    writer.close()
+
+    assert stats['snapshots_skipped'] == 0 and len(snapshot_accounts(conn)) == 2
+    conn.close()
+
+def test_failed_batch_is_retried():
+    path, conn = open_db(6)
+    writer = FlakyWriter(path, 'acc-3', failures=2)
+    stats = run_stream(writer, 6)
+    writer.close()
+
+    assert writer.attempts == 3 and stats['retries'] == 2
+    assert stats['failed'] == [] and stats['batches'] == 3
+    assert snapshot_accounts(conn) == [f"acc-{i}" for i in range(6)]
+    conn.close()
+
+def test_batch_failing_after_retries_is_reported():
+    path, conn = open_db(6)
+    writer = FlakyWriter(path, 'acc-3', failures=10)
+    stats = run_stream(writer, 6)
+    writer.close()
+
+    # Só o lote da acc-3 ficou de fora; os outros foram gravados
+    assert writer.attempts == 3
+    assert sorted(stats['failed']) == ['acc-2', 'acc-3'] and stats['batches'] == 2
+    assert snapshot_accounts(conn) == ['acc-0', 'acc-1', 'acc-4', 'acc-5']
+    assert writer.last_written.keys() == {'acc-0', 'acc-1', 'acc-4', 'acc-5'}
+    conn.close()
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO DB WRITER")
+    print("=" * 80)
+
+    for test in (test_unchanged_snapshot_is_skipped, test_heartbeat_only_update_touches_account,
+                 test_max_gap_forces_keep_alive_snapshot, test_failed_batch_is_retried,
+                 test_batch_failing_after_retries_is_reported):
+        test()
+        print(f"✅ {test.__name__}")
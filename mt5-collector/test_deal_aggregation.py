@@ -0,0 +1,139 @@
+"""
+Teste + benchmark da agregação vetorizada de deals (deal_aggregation).
+
+Compara DealSeries/calendar_pl com o loop original dos collectors
+(datetime.fromtimestamp por deal) em tuplas de TradeDeal e em arrays
+estruturados. Rodando como script, mede os dois em contas de 100k deals.
+
+    python test_deal_aggregation.py
+    (ou: python -m pytest test_deal_aggregation.py)
+"""
+import os
+import sys
+import time
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from deal_aggregation import (
+    DealSeries, calendar_pl, period_starts, to_deal_array,
+    TRADE_DEAL_TYPES, EXIT_DEAL_ENTRIES,
+)
+
+# Mesmos campos do TradeDeal do MetaTrader5
+TradeDeal = namedtuple('TradeDeal', [
+    'ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'magic',
+    'position_id', 'reason', 'volume', 'price', 'commission', 'swap',
+    'profit', 'fee', 'symbol', 'comment', 'external_id'
+])
+
+NOW = datetime(2025, 11, 19, 15, 30, tzinfo=timezone.utc)
+
+def make_deals(count, days=30, seed=7):
+    """`count` deals espalhados nos últimos `days` dias (fora de ordem, com depósitos)"""
+    rng = random.Random(seed)
+    start = int((NOW - timedelta(days=days)).timestamp())
+    end = int(NOW.timestamp())
+    deals = []
+    for ticket in range(1, count + 1):
+        deal_type = 2 if rng.random() < 0.02 else rng.choice((0, 1))
+        deals.append(TradeDeal(
+            ticket, ticket, rng.randint(start, end), 0, deal_type, rng.choice((0, 1, 2)), 0,
+            ticket, 0, 0.1, 1.1, -0.7, round(rng.uniform(-0.5, 0.1), 2),
+            round(rng.uniform(-50, 60), 2), 0.0, 'EURUSD', '', ''
+        ))
+    return tuple(deals)
+
+def loop_pl(deals, now):
+    """Cálculo original de MT5Collector.calculate_pl_by_period (loop Python)"""
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_week = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    day_pl = week_pl = month_pl = 0.0
+    for deal in deals:
+        if deal.type in [0, 1]:
+            if deal.entry in [1, 2]:
+                total = deal.profit + deal.commission + deal.swap
+                deal_time = datetime.fromtimestamp(deal.time, tz=timezone.utc)
+                if deal_time >= start_of_month:
+                    month_pl += total
+                if deal_time >= start_of_week:
+                    week_pl += total
+                if deal_time >= start_of_day:
+                    day_pl += total
+    return {'day_pl': day_pl, 'week_pl': week_pl, 'month_pl': month_pl}
+
+def assert_close(got, expected):
+    for key in expected:
+        assert abs(got[key] - expected[key]) < 1e-6, (key, got, expected)
+
+def test_matches_loop_on_namedtuples():
+    deals = make_deals(5000)
+    got = calendar_pl(deals, NOW, types=TRADE_DEAL_TYPES, entries=EXIT_DEAL_ENTRIES)
+    assert_close(got, loop_pl(deals, NOW))
+
+def test_structured_array_input():
+    deals = make_deals(2000)
+    # Array com campos extras e em outra ordem (como um array vindo do MT5)
+    raw = np.array(
+        [(d.volume, d.swap, d.commission, d.profit, d.entry, d.type, d.time, d.ticket) for d in deals],
+        dtype=[('volume', 'f8'), ('swap', 'f8'), ('commission', 'f8'), ('profit', 'f8'),
+               ('entry', 'i4'), ('type', 'i4'), ('time', 'i8'), ('ticket', 'i8')]
+    )
+    got = calendar_pl(raw, NOW, types=TRADE_DEAL_TYPES, entries=EXIT_DEAL_ENTRIES)
+    assert_close(got, loop_pl(deals, NOW))
+
+def test_custom_periods_and_rules():
+    deals = make_deals(3000, days=90)
+    series = DealSeries(deals, types=TRADE_DEAL_TYPES, entries=None, include_costs=False)
+    starts = period_starts(NOW)
+
+    # [início, fim) por semana, somando os deals da semana
+    week = 7 * 86400
+    periods = {f'w{i}': (starts['week'] - (i + 1) * week, starts['week'] - i * week) for i in range(8)}
+    got = series.totals(periods)
+    for name, (start, end) in periods.items():
+        expected = sum(d.profit for d in deals if d.type in (0, 1) and start <= d.time < end)
+        assert abs(got[name] - expected) < 1e-6, name
+
+    assert series.total() == series.total(None, None)
+    assert series.total(starts['day'], starts['week']) == 0.0  # intervalo vazio/invertido
+    assert len(DealSeries(None)) == 0 and DealSeries(()).total() == 0.0
+    assert len(to_deal_array(deals)) == len(deals)
+
+def benchmark(count=100_000, repeat=5):
+    deals = make_deals(count)
+
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    loop_time = best(lambda: loop_pl(deals, NOW))
+    vector_time = best(lambda: calendar_pl(deals, NOW, types=TRADE_DEAL_TYPES, entries=EXIT_DEAL_ENTRIES))
+    array = to_deal_array(deals)
+    array_time = best(lambda: calendar_pl(array, NOW, types=TRADE_DEAL_TYPES, entries=EXIT_DEAL_ENTRIES))
+
+    print(f"📊 Benchmark ({count:,} deals, melhor de {repeat})")
+    print(f"   Loop Python........................: {loop_time * 1000:8.1f} ms")
+    print(f"   Vetorizado (tupla de TradeDeal)....: {vector_time * 1000:8.1f} ms  ({loop_time / vector_time:.1f}x)")
+    print(f"   Vetorizado (array estruturado).....: {array_time * 1000:8.1f} ms  ({loop_time / array_time:.1f}x)")
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DA AGREGAÇÃO VETORIZADA DE DEALS")
+    print("=" * 80)
+
+    for test in (test_matches_loop_on_namedtuples, test_structured_array_input, test_custom_periods_and_rules):
+        test()
+        print(f"✅ {test.__name__}")
+
+    benchmark()
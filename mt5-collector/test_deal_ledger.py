@@ -0,0 +1,106 @@
+"""
+Teste do ledger incremental de deals (high-water mark + buckets de P/L).
+
+Compara os agregados incrementais com o cálculo completo (varrendo todo o
+histórico, como o collector fazia antes) ao longo de vários ciclos,
+incluindo viradas de dia/semana/mês.
+
+    python test_deal_ledger.py
+    (ou: python -m pytest test_deal_ledger.py)
+"""
+import os
+import sys
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from deal_ledger import DealLedger, period_starts
+
+Deal = namedtuple('Deal', ['ticket', 'time', 'type', 'entry', 'profit', 'commission', 'swap'])
+
+START = datetime(2025, 10, 20, tzinfo=timezone.utc)
+
+def make_history():
+    """Um deal a cada ~7h por 60 dias, com depósitos intercalados"""
+    deals = []
+    for i in range(200):
+        t = int((START + timedelta(hours=7 * i, minutes=i % 50)).timestamp())
+        deal_type = 2 if i % 25 == 0 else i % 2
+        deals.append(Deal(1000 + i, t, deal_type, 1, round((i % 17) - 8.25, 2), -0.5, 0.0))
+    return deals
+
+def full_scan(deals, now):
+    """Cálculo de referência: varre tudo até `now`"""
+    starts = period_starts(now)
+    since_total = int((now - timedelta(days=365)).timestamp())
+    trades = [d for d in deals if d.type in (0, 1) and d.time <= now.timestamp()]
+    return {
+        'day_pl': sum(d.profit for d in trades if d.time >= starts['day']),
+        'week_pl': sum(d.profit for d in trades if d.time >= starts['week']),
+        'month_pl': sum(d.profit for d in trades if d.time >= starts['month']),
+        'total_pl': sum(d.profit for d in trades if d.time >= since_total),
+    }
+
+def test_incremental_matches_full_scan():
+    history = make_history()
+    fetched = []
+
+    def fetch(date_from, date_to):
+        window = [d for d in history if date_from.timestamp() <= d.time <= date_to.timestamp()]
+        fetched.append(len(window))
+        return tuple(window)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = DealLedger(os.path.join(tmp, 'ledger.db'))
+
+        # Ciclos a cada 5h ao longo de ~58 dias (várias viradas de período)
+        now = START + timedelta(hours=1)
+        for _ in range(280):
+            got = ledger.sync('acc-1', fetch, now)
+            expected = full_scan(history, now)
+            for key in expected:
+                assert abs(got[key] - expected[key]) < 1e-6, (now, key, got, expected)
+            now += timedelta(hours=5)
+
+        ledger.close()
+
+    # Após o backfill, cada ciclo só baixa a janela nova (poucos deals)
+    assert max(fetched[1:]) <= 3
+
+def test_fetch_failure_keeps_aggregates():
+    history = make_history()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = DealLedger(os.path.join(tmp, 'ledger.db'))
+        now = START + timedelta(days=10)
+
+        first = ledger.sync('acc-1', lambda a, b: tuple(d for d in history if d.time <= b.timestamp()), now)
+        second = ledger.sync('acc-1', lambda a, b: None, now + timedelta(minutes=1))
+        ledger.close()
+
+    assert first == second
+
+def test_total_is_rolling_window():
+    """Deals com mais de TOTAL_HISTORY_DAYS dias saem do total"""
+    old = int((START - timedelta(days=300)).timestamp())
+    deals = [Deal(1, old, 0, 1, 100.0, 0.0, 0.0), Deal(2, int(START.timestamp()), 1, 1, 5.0, 0.0, 0.0)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = DealLedger(os.path.join(tmp, 'ledger.db'))
+        fetch = lambda a, b: tuple(d for d in deals if a.timestamp() <= d.time <= b.timestamp())
+
+        assert ledger.sync('acc-1', fetch, START + timedelta(days=1))['total_pl'] == 105.0
+        assert ledger.sync('acc-1', fetch, START + timedelta(days=70))['total_pl'] == 5.0
+        ledger.close()
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO LEDGER DE DEALS")
+    print("=" * 80)
+
+    for test in (test_incremental_matches_full_scan, test_fetch_failure_keeps_aggregates,
+                 test_total_is_rolling_window):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,209 @@
+"""
+Teste do backfill --from/--to do daily collector.
+
+Com um MetaAPI simulado, verifica que cada conta é deployada uma vez para o
+período inteiro, que os deals vêm de uma única varredura paginada, que o
+P/L e o balance de cada dia batem com o cálculo deal a deal e que os dias
+vão ao backend em um lote por conta (os recusados ficam na outbox).
+
+    python test_metaapi_backfill.py
+    (ou: python -m pytest test_metaapi_backfill.py)
+"""
+import os
+import sys
+import asyncio
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+os.environ['METAAPI_INDEX_PATH'] = os.path.join(TMP_DIR, 'metaapi_index.json')
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metaapi_daily_collector as daily
+from metaapi_limiter import MetaApiLimiter
+from outbox import Outbox
+
+# OUTBOX_PATH vale só no primeiro import da sessão do pytest: outbox própria deste arquivo
+daily.outbox = daily.drainer.outbox = Outbox(os.environ['OUTBOX_PATH'])
+
+DATE_FROM, DATE_TO = date(2025, 11, 1), date(2025, 11, 10)
+
+def make_deals():
+    """Depósito antes do período, um trade por dia e um saque depois do período"""
+    deals = [{'id': '1', 'type': 'DEAL_TYPE_BALANCE', 'profit': 1000.0,
+              'time': datetime(2025, 10, 28, 9, 0, tzinfo=timezone.utc)}]
+    day = datetime(2025, 10, 27, 14, 0, tzinfo=timezone.utc)
+    for i in range(30):
+        deals.append({'id': str(100 + i), 'type': 'DEAL_TYPE_SELL' if i % 2 else 'DEAL_TYPE_BUY',
+                      'entryType': 'DEAL_ENTRY_OUT', 'time': day + timedelta(days=i),
+                      'profit': float(i % 5) - 1.5, 'swap': -0.25, 'commission': -0.5})
+    deals.append({'id': '999', 'type': 'DEAL_TYPE_BALANCE', 'profit': -200.0,
+                  'time': datetime(2025, 11, 20, 9, 0, tzinfo=timezone.utc)})
+    return deals
+
+DEALS = make_deals()
+
+def net(deal):
+    return deal['profit'] + deal.get('swap', 0) + deal.get('commission', 0)
+
+class FakeConnection:
+    def __init__(self, api):
+        self.api = api
+
+    async def connect(self):
+        pass
+
+    async def wait_synchronized(self):
+        pass
+
+    async def get_account_information(self):
+        balance = sum(net(d) for d in DEALS)
+        return {'balance': balance, 'equity': balance, 'margin': 0, 'freeMargin': balance, 'marginLevel': 0}
+
+    async def get_positions(self):
+        return []
+
+    async def get_deals_by_time_range(self, start, end, offset=0, limit=1000):
+        self.api.deal_calls += 1
+        in_range = [d for d in DEALS if start <= d['time'] <= end]
+        return {'deals': in_range[offset:offset + limit]}
+
+    async def close(self):
+        pass
+
+class FakeAccount:
+    def __init__(self, api, login):
+        self.api = api
+        self.id = f"metaapi-{login}"
+        self.login = login
+        self.state = 'UNDEPLOYED'
+
+    async def deploy(self):
+        self.api.deploys += 1
+        self.state = 'DEPLOYED'
+
+    async def wait_deployed(self, timeout_in_seconds=None):
+        pass
+
+    async def undeploy(self):
+        self.state = 'UNDEPLOYED'
+
+    async def wait_undeployed(self, timeout_in_seconds=None):
+        pass
+
+    def get_rpc_connection(self):
+        return FakeConnection(self.api)
+
+class FakeMetaApi:
+    def __init__(self, logins):
+        self.accounts = {f"metaapi-{login}": FakeAccount(self, login) for login in logins}
+        self.deploys = 0
+        self.deal_calls = 0
+        self.metatrader_account_api = self
+
+    async def get_accounts_with_infinite_scroll_pagination(self, accounts_filter=None):
+        offset, limit = accounts_filter['offset'], accounts_filter['limit']
+        return list(self.accounts.values())[offset:offset + limit]
+
+    async def get_account(self, metaapi_id):
+        return self.accounts[metaapi_id]
+
+class FakeBackend:
+    """sync_items em memória; recusa os dias em `reject`"""
+
+    def __init__(self, reject=()):
+        self.batches = []
+        self.reject = set(reject)
+
+    async def sync_items(self, items):
+        self.batches.append(list(items))
+        return [item['collectionDate'][:10] not in self.reject for item in items]
+
+def take_outbox():
+    """Retira da outbox os payloads gravados pelo collector"""
+    payloads = []
+    while True:
+        entries = daily.outbox.claim()
+        if not entries:
+            return payloads
+        daily.outbox.ack([entry_id for entry_id, _ in entries])
+        payloads.extend(payload for _, payload in entries)
+
+def run_backfill(api, accounts, fake_backend):
+    result = {'accounts_success': 0, 'accounts_failed': 0, 'errors': []}
+    original = daily.async_backend
+    daily.async_backend = fake_backend
+    try:
+        async def pipeline():
+            limiter = MetaApiLimiter(concurrency=4, rate=0, burst=1)
+            collect = daily.functools.partial(daily.collect_backfill, date_from=DATE_FROM, date_to=DATE_TO)
+            return await daily.process_accounts_pipeline(api, accounts, result, limiter=limiter, collect=collect)
+        asyncio.run(pipeline())
+    finally:
+        daily.async_backend = original
+    return result
+
+def make_accounts(base):
+    logins = [str(base + i) for i in range(2)]
+    accounts = [{'id': f"acc-{login}", 'login': login, 'server': 'GMI3-Real'} for login in logins]
+    return logins, accounts
+
+def test_backfill_one_deploy_and_one_sweep_per_account():
+    logins, accounts = make_accounts(7600000)
+    api, fake_backend = FakeMetaApi(logins), FakeBackend()
+
+    result = run_backfill(api, accounts, fake_backend)
+
+    assert result['accounts_success'] == 2
+    days = (DATE_TO - DATE_FROM).days + 1
+    assert api.deploys == 2 and api.deal_calls == 2  # vs. 10 deploys por conta antes
+    assert all(acc.state == 'UNDEPLOYED' for acc in api.accounts.values())
+
+    # Um lote por conta, um payload por dia, em ordem
+    assert len(fake_backend.batches) == 2
+    for batch in fake_backend.batches:
+        assert len(batch) == days
+        assert [p['collectionDate'][:10] for p in batch] == [
+            str(DATE_FROM + timedelta(days=i)) for i in range(days)]
+
+        # P/L e balance de cada dia batem com o cálculo deal a deal
+        for payload in batch:
+            reference = datetime.fromisoformat(payload['collectionDate'])
+            day_start = reference.replace(hour=0, minute=0, second=0)
+            trades = [d for d in DEALS if 'BALANCE' not in d['type'] and d['time'] <= reference]
+            assert abs(payload['dayPL'] - sum(net(d) for d in trades if d['time'] >= day_start)) < 1e-6
+            month_start = day_start.replace(day=1)
+            assert abs(payload['monthPL'] - sum(net(d) for d in trades if d['time'] >= month_start)) < 1e-6
+            balance = sum(net(d) for d in DEALS if d['time'] <= reference)
+            assert abs(payload['balance'] - balance) < 1e-6
+            assert payload['collectedAt'] == payload['collectionDate']
+
+    assert take_outbox() == []
+
+def test_rejected_days_go_to_outbox():
+    logins, accounts = make_accounts(7600100)
+    api, fake_backend = FakeMetaApi(logins[:1]), FakeBackend(reject={'2025-11-03'})
+
+    result = run_backfill(api, accounts[:1], fake_backend)
+
+    assert result['accounts_success'] == 1
+    queued = take_outbox()
+    assert [(p['accountId'], p['collectionDate'][:10]) for p in queued] == [(accounts[0]['id'], '2025-11-03')]
+
+def test_references_stop_at_now():
+    now = datetime(2025, 11, 5, 15, 30, tzinfo=timezone.utc)
+    references = daily.backfill_references(date(2025, 11, 3), date(2025, 11, 8), now)
+    assert references[:2] == [datetime(2025, 11, d, 23, 59, 59, tzinfo=timezone.utc) for d in (3, 4)]
+    assert references[2:] == [now]
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO BACKFILL DO DAILY COLLECTOR")
+    print("=" * 80)
+
+    for test in (test_backfill_one_deploy_and_one_sweep_per_account, test_rejected_days_go_to_outbox,
+                 test_references_stop_at_now):
+        test()
+        print(f"✅ {test.__name__}")
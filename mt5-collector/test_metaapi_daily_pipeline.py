@@ -0,0 +1,179 @@
+"""
+Teste do pipeline deploy -> coleta -> undeploy do daily collector.
+
+Com um MetaAPI simulado (deploy lento), verifica que as contas são
+processadas em paralelo com no máximo METAAPI_DAILY_CONCURRENCY deployadas
+ao mesmo tempo, que o tempo deployado de cada conta não inclui a espera
+na fila, que toda conta termina undeployed (inclusive após falha) e que o
+relatório de segundos deployados por conta é preenchido. E que a coleta
+fecha a sessão HTTP do backend antes do fim do seu event loop.
+
+    python test_metaapi_daily_pipeline.py
+    (ou: python -m pytest test_metaapi_daily_pipeline.py)
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+os.environ['METAAPI_INDEX_PATH'] = os.path.join(TMP_DIR, 'metaapi_index.json')
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metaapi_daily_collector as daily
+from metaapi_limiter import MetaApiLimiter
+from outbox import Outbox
+
+# OUTBOX_PATH vale só no primeiro import da sessão do pytest: outbox própria deste arquivo
+daily.outbox = daily.drainer.outbox = Outbox(os.environ['OUTBOX_PATH'])
+
+DEPLOY_LATENCY = 0.3
+UNDEPLOY_LATENCY = 0.05
+SYNC_LATENCY = 0.05
+
+class FakeConnection:
+    async def connect(self):
+        pass
+
+    async def wait_synchronized(self):
+        await asyncio.sleep(SYNC_LATENCY)
+
+    async def get_account_information(self):
+        return {'balance': 500.0, 'equity': 505.0, 'margin': 0, 'freeMargin': 505.0, 'marginLevel': 0}
+
+    async def get_positions(self):
+        return []
+
+    async def get_deals_by_time_range(self, start, end, offset=0, limit=1000):
+        return {'deals': []}
+
+    async def close(self):
+        pass
+
+class FakeAccount:
+    def __init__(self, api, login, broken=False):
+        self.api = api
+        self.id = f"metaapi-{login}"
+        self.login = login
+        self.state = 'UNDEPLOYED'
+        self.broken = broken
+
+    async def deploy(self):
+        self.state = 'DEPLOYING'
+        self.api.deployed.add(self.id)
+        self.api.max_deployed = max(self.api.max_deployed, len(self.api.deployed))
+
+    async def wait_deployed(self, timeout_in_seconds=None):
+        await asyncio.sleep(DEPLOY_LATENCY)
+        if self.broken:
+            raise TimeoutError('Timed out waiting for account to be deployed')
+        self.state = 'DEPLOYED'
+
+    async def undeploy(self):
+        self.state = 'UNDEPLOYING'
+
+    async def wait_undeployed(self, timeout_in_seconds=None):
+        await asyncio.sleep(UNDEPLOY_LATENCY)
+        self.state = 'UNDEPLOYED'
+        self.api.deployed.discard(self.id)
+
+    def get_rpc_connection(self):
+        return FakeConnection()
+
+class FakeMetaApi:
+    def __init__(self, logins, broken=()):
+        self.accounts = {f"metaapi-{login}": FakeAccount(self, login, login in broken) for login in logins}
+        self.deployed = set()
+        self.max_deployed = 0
+        self.metatrader_account_api = self
+
+    async def get_accounts_with_infinite_scroll_pagination(self, accounts_filter=None):
+        offset, limit = accounts_filter['offset'], accounts_filter['limit']
+        return list(self.accounts.values())[offset:offset + limit]
+
+    async def get_account(self, metaapi_id):
+        return self.accounts[metaapi_id]
+
+def take_outbox():
+    """Retira da outbox os payloads gravados pelo collector"""
+    payloads = []
+    while True:
+        entries = daily.outbox.claim()
+        if not entries:
+            return payloads
+        daily.outbox.ack([entry_id for entry_id, _ in entries])
+        payloads.extend(payload for _, payload in entries)
+
+def run_pipeline(api, accounts, result, concurrency, **kwargs):
+    async def pipeline():
+        # Sem token bucket: o teste mede só a concorrência
+        limiter = MetaApiLimiter(concurrency=concurrency, rate=0, burst=1)
+        return await daily.process_accounts_pipeline(api, accounts, result, limiter=limiter, **kwargs)
+    return asyncio.run(pipeline())
+
+def new_result():
+    return {'accounts_success': 0, 'accounts_failed': 0, 'errors': []}
+
+def test_pipeline_caps_deployed_accounts():
+    logins = [str(7500000 + i) for i in range(8)]
+    accounts = [{'id': f"acc-{i}", 'login': login, 'server': 'GMI3-Real'} for i, login in enumerate(logins)]
+    api = FakeMetaApi(logins, broken={logins[3]})
+    result = new_result()
+
+    started = time.monotonic()
+    run_pipeline(api, accounts, result, concurrency=4)
+    elapsed = time.monotonic() - started
+
+    # Conta com deploy quebrado falha, mas também é desligada
+    assert result['accounts_success'] == 7 and result['accounts_failed'] == 1
+    assert 'Falha no deploy' in result['errors'][0]
+    assert not api.deployed and all(acc.state == 'UNDEPLOYED' for acc in api.accounts.values())
+    assert sorted(p['accountId'] for p in take_outbox()) == sorted(a['id'] for i, a in enumerate(accounts) if i != 3)
+
+    # Nunca mais que 4 deployadas; 8 contas em ~2 ondas em vez de 8 em sequência
+    per_account = DEPLOY_LATENCY + SYNC_LATENCY + UNDEPLOY_LATENCY
+    assert api.max_deployed == 4
+    print(f"   pipeline {elapsed:.2f}s | sequencial seria ~{len(accounts) * per_account:.2f}s")
+    assert elapsed < len(accounts) * per_account / 2.5
+
+    # Segundos deployados: só o tempo da própria conta, sem a fila
+    deployed = result['deployed_seconds']
+    assert sorted(deployed['per_account']) == sorted(logins)
+    assert all(DEPLOY_LATENCY <= secs <= per_account + 0.3 for secs in deployed['per_account'].values())
+    assert abs(deployed['total'] - sum(deployed['per_account'].values())) < 0.5
+    assert deployed['max'] >= deployed['avg'] > 0
+
+def test_skip_undeploy_keeps_accounts_deployed():
+    logins = [str(7500100 + i) for i in range(2)]
+    accounts = [{'id': f"acc-x{i}", 'login': login, 'server': 'GMI3-Real'} for i, login in enumerate(logins)]
+    api = FakeMetaApi(logins)
+    result = new_result()
+
+    run_pipeline(api, accounts, result, concurrency=2, skip_undeploy=True)
+    take_outbox()
+
+    assert result['accounts_success'] == 2
+    assert all(acc.state == 'DEPLOYED' for acc in api.accounts.values())
+
+def test_collection_closes_backend_session():
+    async def collection():
+        session = daily.async_backend._session()  # sessão aberta neste loop
+        await daily.run_daily_collection()
+        return session
+
+    # Sai cedo (sem SDK ou sem contas), mas a sessão fecha no mesmo loop
+    session = asyncio.run(collection())
+    assert session.closed and daily.async_backend.session is None
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO PIPELINE DO DAILY COLLECTOR")
+    print("=" * 80)
+
+    for test in (test_pipeline_caps_deployed_accounts, test_skip_undeploy_keeps_accounts_deployed,
+                 test_collection_closes_backend_session):
+        test()
+        print(f"✅ {test.__name__}")
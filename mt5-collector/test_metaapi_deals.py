@@ -0,0 +1,136 @@
+"""
+Teste do histórico de deals do MetaAPI (metaapi_deals.py).
+
+Compara com o cálculo antigo (três consultas dia/semana/mês, cada uma
+cortada em 1000 deals): uma única varredura paginada faz 1 RPC para conta
+com poucos deals, e para conta com muitos deals não trunca o P/L.
+
+    python test_metaapi_deals.py
+    (ou: python -m pytest test_metaapi_deals.py)
+"""
+import os
+import sys
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metaapi_deals import calendar_pl, fetch_deals, history_start
+
+MAX_DEALS = 1000  # limite do MetaAPI por consulta
+
+class FakeConnection:
+    """get_deals_by_time_range com offset/limit e o limite de 1000 do MetaAPI"""
+
+    def __init__(self, deals):
+        self.deals = sorted(deals, key=lambda d: d['time'])
+        self.calls = 0
+
+    async def get_deals_by_time_range(self, start, end, offset=0, limit=MAX_DEALS):
+        self.calls += 1
+        in_range = [d for d in self.deals if start <= d['time'] <= end]
+        return {'deals': in_range[offset:offset + min(limit, MAX_DEALS)], 'synchronizing': False}
+
+def make_deals(now: datetime, count: int):
+    """Deals espalhados desde 40 dias atrás, com depósitos (BALANCE) no meio"""
+    deals = []
+    for i in range(count):
+        deal_time = now - timedelta(days=40) + timedelta(seconds=(i + 1) * 40 * 86400 // (count + 1))
+        deals.append({
+            'id': str(1000 + i),
+            'type': 'DEAL_TYPE_BALANCE' if i % 50 == 0 else ('DEAL_TYPE_BUY' if i % 2 else 'DEAL_TYPE_SELL'),
+            'entryType': 'DEAL_ENTRY_OUT',
+            'time': deal_time,
+            'profit': 1000.0 if i % 50 == 0 else float(i % 7) - 2.5,
+            'swap': -0.1,
+            'commission': -0.2,
+        })
+    return deals
+
+def expected_pl(deals, start: datetime) -> float:
+    """Regra antiga do MetaAPI, deal a deal: tudo menos BALANCE"""
+    return sum(d['profit'] + d['swap'] + d['commission'] for d in deals
+               if d['time'] >= start and 'BALANCE' not in d['type'])
+
+def old_three_queries(connection, now):
+    """Cálculo antigo: três consultas sobrepostas, cada uma sem paginação"""
+    async def run():
+        totals = {}
+        for period, start in period_datetimes(now).items():
+            response = await connection.get_deals_by_time_range(start, now)
+            totals[f'{period}_pl'] = expected_pl(response['deals'], start)
+        return totals
+    return asyncio.run(run())
+
+def period_datetimes(now: datetime):
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'day': start_of_day,
+        'week': start_of_day - timedelta(days=now.weekday()),
+        'month': start_of_day.replace(day=1),
+    }
+
+def single_fetch(connection, now):
+    async def run():
+        deals = await fetch_deals(connection, history_start(now), now)
+        return deals, calendar_pl(deals, now)
+    return asyncio.run(run())
+
+def test_light_account_single_rpc():
+    now = datetime(2025, 11, 20, 15, 30, tzinfo=timezone.utc)
+    deals = make_deals(now, 300)
+
+    old = FakeConnection(deals)
+    old_pl = old_three_queries(old, now)
+
+    new = FakeConnection(deals)
+    fetched, pl = single_fetch(new, now)
+
+    assert (old.calls, new.calls) == (3, 1)
+    for period, start in period_datetimes(now).items():
+        assert abs(pl[f'{period}_pl'] - expected_pl(deals, start)) < 1e-6
+        assert abs(pl[f'{period}_pl'] - old_pl[f'{period}_pl']) < 1e-6
+
+def test_heavy_account_not_truncated():
+    now = datetime(2025, 11, 20, 15, 30, tzinfo=timezone.utc)
+    deals = make_deals(now, 6000)
+
+    old = FakeConnection(deals)
+    old_pl = old_three_queries(old, now)
+
+    new = FakeConnection(deals)
+    fetched, pl = single_fetch(new, now)
+
+    # Mês inteiro em páginas de 1000, sem corte
+    month_start = period_datetimes(now)['month']
+    month_deals = [d for d in deals if d['time'] >= month_start]
+    assert len(fetched) == len(month_deals) > MAX_DEALS
+    assert new.calls == len(month_deals) // MAX_DEALS + 1
+
+    for period, start in period_datetimes(now).items():
+        assert abs(pl[f'{period}_pl'] - expected_pl(deals, start)) < 1e-6
+
+    # O cálculo antigo perdia os deals depois do milésimo
+    assert abs(old_pl['month_pl'] - expected_pl(deals, month_start)) > 1
+
+def test_week_starting_in_previous_month():
+    # Quarta-feira, dia 2: a semana começa na segunda, dia 30 do mês anterior
+    now = datetime(2025, 7, 2, 12, 0, tzinfo=timezone.utc)
+    deals = make_deals(now, 500)
+
+    fetched, pl = single_fetch(FakeConnection(deals), now)
+
+    week_start = period_datetimes(now)['week']
+    assert week_start.month == 6 and history_start(now) == week_start
+    assert abs(pl['week_pl'] - expected_pl(deals, week_start)) < 1e-6
+    assert abs(pl['month_pl'] - expected_pl(deals, period_datetimes(now)['month'])) < 1e-6
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO HISTÓRICO DE DEALS METAAPI")
+    print("=" * 80)
+
+    for test in (test_light_account_single_rpc, test_heavy_account_not_truncated,
+                 test_week_starting_in_previous_month):
+        test()
+        print(f"✅ {test.__name__}")
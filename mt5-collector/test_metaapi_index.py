@@ -0,0 +1,107 @@
+"""
+Teste do índice login -> id MetaAPI (metaapi_index.py).
+
+Verifica que a partida a frio com N contas faz UMA listagem paginada (em
+vez de N), que o índice gravado é reaproveitado após restart dentro do TTL,
+e a invalidação seletiva (conta criada/apagada, login desconhecido).
+
+    python test_metaapi_index.py
+    (ou: python -m pytest test_metaapi_index.py)
+"""
+import os
+import sys
+import asyncio
+import tempfile
+
+# Índice padrão em pasta temporária (os testes usam index_path(); o padrão do
+# módulo é fixado no primeiro import da sessão do pytest)
+os.environ['METAAPI_INDEX_PATH'] = os.path.join(tempfile.mkdtemp(), 'metaapi_index.json')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metaapi_index import MetaApiAccountIndex
+
+class FakeAccount:
+    def __init__(self, login):
+        self.id = f"metaapi-{login}"
+        self.login = login
+
+class FakeAccountApi:
+    """Listagem paginada do MetaAPI (offset/limit) contando as páginas pedidas"""
+
+    def __init__(self, logins):
+        self.accounts = [FakeAccount(login) for login in logins]
+        self.pages = 0
+
+    async def get_accounts_with_infinite_scroll_pagination(self, accounts_filter=None):
+        self.pages += 1
+        offset = accounts_filter['offset']
+        return self.accounts[offset:offset + accounts_filter['limit']]
+
+class FakeMetaApi:
+    def __init__(self, logins):
+        self.metatrader_account_api = FakeAccountApi(logins)
+
+def index_path():
+    return os.path.join(tempfile.mkdtemp(), 'metaapi_index.json')
+
+def lookup_all(index, api, logins):
+    async def cycle():
+        index.new_cycle()
+        return await asyncio.gather(*(index.lookup(api, login) for login in logins))
+    return asyncio.run(cycle())
+
+def test_cold_start_lists_once_and_survives_restart():
+    logins = [str(7400000 + i) for i in range(25)]
+    api = FakeMetaApi(logins)
+    path = index_path()
+
+    index = MetaApiAccountIndex(path, ttl=3600, page_size=10)
+    ids = lookup_all(index, api, logins)
+
+    # 25 contas em paralelo: uma listagem (3 páginas de 10)
+    assert ids == [f"metaapi-{login}" for login in logins]
+    assert index.stats['listings'] == 1
+    assert api.metatrader_account_api.pages == 3
+
+    # Restart: índice do disco, nenhuma listagem
+    restarted = MetaApiAccountIndex(path, ttl=3600, page_size=10)
+    assert lookup_all(restarted, api, logins) == ids
+    assert restarted.stats['listings'] == 0
+    assert api.metatrader_account_api.pages == 3
+
+    # TTL vencido: lista de novo uma vez
+    expired = MetaApiAccountIndex(path, ttl=0, page_size=10)
+    lookup_all(expired, api, logins[:5])
+    assert expired.stats['listings'] == 1
+
+def test_selective_invalidation():
+    logins = [str(7400000 + i) for i in range(3)]
+    api = FakeMetaApi(logins)
+    path = index_path()
+    index = MetaApiAccountIndex(path, ttl=3600)
+    lookup_all(index, api, logins)
+
+    # Login desconhecido: uma nova listagem no ciclo, não uma por consulta
+    assert lookup_all(index, api, ['7499999', '7499999']) == [None, None]
+    assert index.stats['listings'] == 2
+    assert lookup_all(index, api, ['7499999']) == [None]
+    assert index.stats['listings'] == 3
+
+    # Conta criada pelo collector entra sem listar
+    index.put('7499999', 'metaapi-new')
+    assert lookup_all(index, api, ['7499999']) == ['metaapi-new']
+    assert index.stats['listings'] == 3
+
+    # Contas apagadas saem, e o disco acompanha
+    index.forget(f"metaapi-{logins[0]}")
+    index.forget(f"metaapi-{logins[1]}")
+    assert sorted(MetaApiAccountIndex(path, ttl=3600).accounts) == [logins[2], '7499999']
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO ÍNDICE METAAPI")
+    print("=" * 80)
+
+    for test in (test_cold_start_lists_once_and_survives_restart, test_selective_invalidation):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,208 @@
+"""
+Teste do limiter do MetaAPI (metaapi_limiter.py) com um MetaAPI simulado.
+
+Verifica que o ciclo paralelo respeita METAAPI_CONCURRENCY e leva ~N/C do
+tempo sequencial, que o token bucket segura a taxa de requisições e que um
+429 pausa todas as requisições pelo tempo recomendado antes de tentar de novo.
+
+    python test_metaapi_limiter.py
+    (ou: python -m pytest test_metaapi_limiter.py)
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+os.environ['METAAPI_INDEX_PATH'] = os.path.join(TMP_DIR, 'metaapi_index.json')
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metaapi_collector
+from metaapi_limiter import MetaApiLimiter, TokenBucket
+from metaapi_streaming import StreamingConnectionManager
+from outbox import Outbox
+
+# OUTBOX_PATH vale só no primeiro import da sessão do pytest: outbox própria deste arquivo
+metaapi_collector.outbox = metaapi_collector.drainer.outbox = Outbox(os.environ['OUTBOX_PATH'])
+
+LATENCY = 0.02  # cada requisição simulada ao MetaAPI
+
+class TooManyRequestsException(Exception):
+    """Mesmo nome/metadata da exceção do metaapi_cloud_sdk"""
+
+    def __init__(self, retry_in: float):
+        super().__init__('Too many requests')
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=retry_in)
+        self.status_code = 429
+        self.metadata = {'recommendedRetryTime': retry_at.isoformat()}
+
+class FakeStreamingConnection:
+    """Conexão de streaming: connect/sync custam requisições, o estado é local"""
+
+    def __init__(self, login):
+        self.login = login
+        self.terminal_state = SimpleNamespace(
+            account_information={'balance': 1000.0, 'equity': 1010.0, 'margin': 0,
+                                 'freeMargin': 1010.0, 'marginLevel': 0},
+            positions=[{'profit': 10.0}],
+        )
+        self.history_storage = SimpleNamespace(deals=[
+            {'type': 'DEAL_TYPE_SELL', 'profit': 5.0, 'time': datetime.now(timezone.utc)}
+        ])
+
+    def add_synchronization_listener(self, listener):
+        pass
+
+    async def connect(self):
+        await asyncio.sleep(LATENCY)
+
+    async def wait_synchronized(self):
+        await asyncio.sleep(LATENCY * 4)
+
+    async def close(self):
+        pass
+
+class FakeAccount:
+    state = 'DEPLOYED'
+
+    def __init__(self, login):
+        self.id = f"metaapi-{login}"
+        self.login = login
+
+    def get_streaming_connection(self, history_start_time=None):
+        return FakeStreamingConnection(self.login)
+
+class FakeAccountApi:
+    def __init__(self, logins):
+        self.accounts = [FakeAccount(login) for login in logins]
+
+    async def get_accounts_with_infinite_scroll_pagination(self, accounts_filter=None):
+        await asyncio.sleep(LATENCY)
+        accounts_filter = accounts_filter or {}
+        offset = accounts_filter.get('offset', 0)
+        return self.accounts[offset:offset + accounts_filter.get('limit', 1000)]
+
+    async def get_account(self, account_id):
+        await asyncio.sleep(LATENCY)
+        return next(acc for acc in self.accounts if acc.id == account_id)
+
+class FakeMetaApi:
+    def __init__(self, logins):
+        self.metatrader_account_api = FakeAccountApi(logins)
+
+def make_accounts(count: int):
+    return [{'id': f"acc-{i}", 'login': str(7300000 + i), 'password': 'x', 'server': 'GMI3-Real'}
+            for i in range(count)]
+
+def take_outbox():
+    """Retira da outbox os payloads gravados pelo collector"""
+    payloads = []
+    while True:
+        entries = metaapi_collector.outbox.claim()
+        if not entries:
+            return payloads
+        metaapi_collector.outbox.ack([entry_id for entry_id, _ in entries])
+        payloads.extend(payload for _, payload in entries)
+
+def run_cycle(accounts, concurrency):
+    async def cycle():
+        metaapi_collector.account_index.accounts.clear()
+        metaapi_collector.account_index.built_at = None
+        metaapi_collector.account_index.new_cycle()
+        metaapi_collector.streams = StreamingConnectionManager()
+        limiter = MetaApiLimiter(concurrency=concurrency, rate=0, burst=1)
+        api = FakeMetaApi([acc['login'] for acc in accounts])
+
+        started = time.monotonic()
+        success = await metaapi_collector.process_all_accounts_parallel(api, accounts, limiter)
+        return success, time.monotonic() - started, limiter
+
+    return asyncio.run(cycle())
+
+def test_bounded_concurrency_cuts_cycle_time():
+    accounts = make_accounts(10)
+
+    success_seq, elapsed_seq, limiter_seq = run_cycle(accounts, concurrency=1)
+    success_par, elapsed_par, limiter_par = run_cycle(accounts, concurrency=5)
+
+    assert success_seq == success_par == 10
+    assert sorted(p['accountId'] for p in take_outbox()) == sorted([acc['id'] for acc in accounts] * 2)
+    assert limiter_seq.stats['max_in_flight'] == 1
+    assert limiter_par.stats['max_in_flight'] == 5
+
+    # 10 contas, 5 por vez: ~2 "rodadas" em vez de 10
+    print(f"   sequencial {elapsed_seq:.2f}s | concorrência 5 {elapsed_par:.2f}s")
+    assert elapsed_par < elapsed_seq / 3
+
+def test_token_bucket_limits_request_rate():
+    async def burst():
+        bucket = TokenBucket(rate=50, burst=5)
+        started = time.monotonic()
+        for _ in range(30):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 5 de rajada + 25 a 50/s = no mínimo 0.5s
+    assert asyncio.run(burst()) >= 25 / 50 * 0.95
+
+def test_429_pauses_all_requests_and_retries():
+    calls = []
+
+    async def scenario():
+        limiter = MetaApiLimiter(concurrency=2, rate=100, burst=10, retry_base=0.01)
+        throttled = {'pending': True}
+
+        async def request(name):
+            calls.append((name, time.monotonic()))
+            if name == 'a' and throttled['pending']:
+                throttled['pending'] = False
+                raise TooManyRequestsException(retry_in=0.3)
+            return name
+
+        async def other_account():
+            # Outra conta chega durante a pausa do 429 e também espera
+            await asyncio.sleep(0.05)
+            return await limiter.call(request, 'b')
+
+        started = time.monotonic()
+        first, second = await asyncio.gather(limiter.call(request, 'a'), other_account())
+        return started, first, second, limiter
+
+    started, first, second, limiter = asyncio.run(scenario())
+
+    assert (first, second) == ('a', 'b')
+    assert sorted(name for name, _ in calls) == ['a', 'a', 'b']
+    # Nada sai antes do tempo recomendado pelo MetaAPI
+    assert all(at - started >= 0.25 for _, at in calls[1:])
+    assert limiter.stats['throttled'] == 1 and limiter.stats['requests'] == 3
+
+def test_429_gives_up_after_max_retries():
+    async def scenario():
+        limiter = MetaApiLimiter(concurrency=1, rate=0, burst=1, max_retries=2, retry_base=0.01)
+
+        async def always_throttled():
+            raise TooManyRequestsException(retry_in=0)
+
+        try:
+            await limiter.call(always_throttled)
+        except TooManyRequestsException:
+            return limiter
+        raise AssertionError('429 deveria ser repassado após as tentativas')
+
+    limiter = asyncio.run(scenario())
+    assert limiter.stats == {'requests': 3, 'throttled': 2, 'max_in_flight': 0}
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO LIMITER DO METAAPI")
+    print("=" * 80)
+
+    for test in (test_bounded_concurrency_cuts_cycle_time, test_token_bucket_limits_request_rate,
+                 test_429_pauses_all_requests_and_retries, test_429_gives_up_after_max_retries):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,135 @@
+"""
+Teste das conexões de streaming persistentes (metaapi_streaming.py).
+
+Com um MetaAPI simulado em que a sincronização do terminal demora, verifica
+que só o primeiro ciclo conecta, que os seguintes leem o estado local em
+milissegundos, que um aviso de desconexão reconecta apenas aquela conta e
+que contas fora do roster têm a conexão fechada.
+
+    python test_metaapi_streaming.py
+    (ou: python -m pytest test_metaapi_streaming.py)
+"""
+import os
+import sys
+import time
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metaapi_streaming import StreamingConnectionManager
+
+SYNC_LATENCY = 0.2  # wait_synchronized simulado
+
+class FakeStreamingConnection:
+    def __init__(self, login):
+        self.login = login
+        self.listeners = []
+        self.closed = False
+        self.terminal_state = SimpleNamespace(
+            account_information={'balance': 1000.0, 'equity': 1012.5},
+            positions=[{'profit': 12.5}],
+        )
+        self.history_storage = SimpleNamespace(deals=[
+            {'type': 'DEAL_TYPE_BALANCE', 'profit': 1000.0, 'time': datetime.now(timezone.utc)},
+            {'type': 'DEAL_TYPE_SELL', 'profit': 7.0, 'swap': -0.5, 'time': datetime.now(timezone.utc)},
+        ])
+
+    def add_synchronization_listener(self, listener):
+        self.listeners.append(listener)
+
+    async def connect(self):
+        pass
+
+    async def wait_synchronized(self):
+        await asyncio.sleep(SYNC_LATENCY)
+
+    async def close(self):
+        self.closed = True
+
+class FakeAccount:
+    state = 'DEPLOYED'
+
+    def __init__(self, api, login):
+        self.api = api
+        self.id = f"metaapi-{login}"
+        self.login = login
+
+    def get_streaming_connection(self, history_start_time=None):
+        connection = FakeStreamingConnection(self.login)
+        self.api.opened.append(connection)
+        return connection
+
+class FakeMetaApi:
+    def __init__(self):
+        self.opened = []
+        self.metatrader_account_api = self
+
+    async def get_account(self, metaapi_id):
+        return FakeAccount(self, metaapi_id.split('-', 1)[1])
+
+async def collect_cycle(manager, api, account_ids):
+    """Um ciclo: conexão (reaproveitada) + leitura do estado local por conta"""
+    await manager.retain(account_ids)
+
+    async def collect(account_id):
+        connection = await manager.get(api, account_id, f"metaapi-{account_id}")
+        return manager.read(connection)
+
+    started = time.monotonic()
+    states = await asyncio.gather(*(collect(account_id) for account_id in account_ids))
+    return states, time.monotonic() - started
+
+def test_connections_survive_cycles():
+    manager, api = StreamingConnectionManager(), FakeMetaApi()
+    account_ids = [f"acc{i}" for i in range(5)]
+
+    async def scenario():
+        _, first = await collect_cycle(manager, api, account_ids)
+        states, second = await collect_cycle(manager, api, account_ids)
+        return states, first, second
+
+    states, first, second = asyncio.run(scenario())
+
+    assert manager.stats == {'connects': 5, 'reuses': 5, 'reconnects': 0}
+    assert len(api.opened) == 5
+    assert first >= SYNC_LATENCY
+    assert second < 0.05  # estado local: milissegundos
+
+    # Dados do estado sincronizado, P/L sem o depósito
+    assert states[0]['account_info']['equity'] == 1012.5
+    assert states[0]['positions'] == [{'profit': 12.5}]
+    assert states[0]['day_pl'] == states[0]['month_pl'] == 6.5
+
+def test_disconnect_reconnects_only_that_account():
+    manager, api = StreamingConnectionManager(), FakeMetaApi()
+
+    async def scenario():
+        await collect_cycle(manager, api, ['acc0', 'acc1', 'acc2'])
+
+        # MetaAPI avisa desconexão da acc1
+        old = manager.connections['acc1']['connection']
+        await old.listeners[0].on_disconnected('0')
+        await collect_cycle(manager, api, ['acc0', 'acc1', 'acc2'])
+        reconnect_stats = dict(manager.stats)
+
+        # Conta fora do roster: conexão fechada
+        gone = manager.connections['acc2']['connection']
+        await collect_cycle(manager, api, ['acc0', 'acc1'])
+        return old, gone, reconnect_stats
+
+    old, gone, reconnect_stats = asyncio.run(scenario())
+
+    assert reconnect_stats == {'connects': 4, 'reuses': 2, 'reconnects': 1}
+    assert old.closed and manager.connections['acc1']['connection'] is not old
+    assert gone.closed and sorted(manager.connections) == ['acc0', 'acc1']
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DAS CONEXÕES DE STREAMING METAAPI")
+    print("=" * 80)
+
+    for test in (test_connections_survive_cycles, test_disconnect_reconnects_only_that_account):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,173 @@
+"""
+Teste da outbox local (outbox.py) contra um backend HTTP local.
+
+Simula backend fora do ar + restart do collector (nada se perde), ordem por
+conta, entradas recusadas indo para outbox_dead, o drainer em thread e
+drain() síncrono ao mesmo tempo que a thread (um lote por vez).
+
+    python test_outbox.py
+    (ou: python -m pytest test_outbox.py)
+"""
+import os
+import sys
+import socket
+import tempfile
+import threading
+import time
+
+# Outbox padrão fora do repositório (o pytest importa outbox uma vez só)
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend_client import BackendClient
+from outbox import Outbox, OutboxDrainer
+from test_backend_client import make_payload, start_backend
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_backend_offline_then_restart():
+    path = os.path.join(tempfile.mkdtemp(), 'outbox.db')
+    port = free_port()
+
+    # Backend fora do ar: coleta continua, nada é descartado
+    outbox = Outbox(path)
+    for i in range(3):
+        for account in ('acc-1', 'acc-2'):
+            payload = make_payload(account)
+            payload['seq'] = i
+            outbox.append(payload)
+
+    client = BackendClient(f"http://127.0.0.1:{port}", timeout=1)
+    drainer = OutboxDrainer(outbox, client, retry_base=0.01, retry_max=0.05)
+    assert drainer.drain_once() == 0
+    assert drainer.backoff > 0 and drainer.stats['backend_errors'] == 1
+    assert outbox.pending() == 6
+    client.close()
+    outbox.close()
+
+    # Restart do collector com o backend de volta
+    server, handler = start_backend(batch_enabled=True, port=port)
+    outbox = Outbox(path)
+    client = BackendClient(f"http://127.0.0.1:{port}")
+    try:
+        drainer = OutboxDrainer(outbox, client, retry_base=0.01, retry_max=0.05)
+        assert drainer.drain(timeout=10)
+    finally:
+        client.close()
+        server.shutdown()
+
+    assert outbox.pending() == 0
+    for account in ('acc-1', 'acc-2'):
+        received = [p for p in handler.received if p['accountId'] == account]
+        assert [p['seq'] for p in received] == [0, 1, 2]
+        assert all('collectedAt' in p for p in received)
+
+    # Uma entrada por conta em cada lote
+    assert [path for path, _ in handler.requests_seen] == ['/api/mt5/sync/batch'] * 3
+    outbox.close()
+
+def test_rejected_entries_go_to_dead_letter():
+    path = os.path.join(tempfile.mkdtemp(), 'outbox.db')
+    server, handler = start_backend(batch_enabled=True)
+    outbox = Outbox(path)
+    client = BackendClient(f"http://127.0.0.1:{server.server_port}")
+    try:
+        outbox.append(make_payload('missing'))
+        outbox.append(make_payload('missing'))
+        outbox.append(make_payload('acc-1'))
+
+        drainer = OutboxDrainer(outbox, client, retry_base=0.01, retry_max=0.02, max_attempts=3)
+        now = time.time()
+        for attempt in range(3):
+            drainer.drain_once(now=now + attempt)
+    finally:
+        client.close()
+        server.shutdown()
+
+    # Recusa não é erro de transporte: sem backoff global
+    assert drainer.backoff == 0
+    assert [p['accountId'] for p in handler.received] == ['acc-1']
+
+    # A primeira entrada de 'missing' esgotou as tentativas; a segunda segue na fila
+    assert outbox.dead() == 1
+    assert outbox.pending() == 1
+    outbox.close()
+
+def test_background_drainer():
+    path = os.path.join(tempfile.mkdtemp(), 'outbox.db')
+    server, handler = start_backend(batch_enabled=True)
+    outbox = Outbox(path)
+    client = BackendClient(f"http://127.0.0.1:{server.server_port}")
+    drainer = OutboxDrainer(outbox, client, poll_interval=0.05)
+    drainer.start()
+    try:
+        for i in range(20):
+            outbox.append(make_payload(f"acc-{i}"))
+            drainer.notify()
+
+        deadline = time.monotonic() + 10
+        while outbox.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        drainer.stop()
+        client.close()
+        server.shutdown()
+
+    assert outbox.pending() == 0
+    assert sorted(p['accountId'] for p in handler.received) == sorted(f"acc-{i}" for i in range(20))
+    outbox.close()
+
+class SlowClient:
+    """Client simulado: conta quantos lotes estão em envio ao mesmo tempo"""
+
+    def __init__(self):
+        self.stats = {'errors': 0}
+        self.sending = 0
+        self.max_sending = 0
+        self.received = []
+
+    def sync_batch(self, payloads):
+        self.sending += 1
+        self.max_sending = max(self.max_sending, self.sending)
+        time.sleep(0.02)
+        self.received.extend(payload['accountId'] for payload in payloads)
+        self.sending -= 1
+        return {payload['accountId']: True for payload in payloads}
+
+def test_sync_drain_with_background_thread():
+    outbox = Outbox(os.path.join(tempfile.mkdtemp(), 'outbox.db'))
+    for i in range(20):
+        outbox.append(make_payload(f"acc-{i}"))
+
+    client = SlowClient()
+    drainer = OutboxDrainer(outbox, client, batch_size=2, poll_interval=0.01)
+    drainer.start()
+    try:
+        # Mesmo cenário do daily collector: drain() numa thread com o drainer rodando
+        others = [threading.Thread(target=drainer.drain, args=(10,)) for _ in range(2)]
+        for thread in others:
+            thread.start()
+        assert drainer.drain(timeout=10)
+        for thread in others:
+            thread.join()
+    finally:
+        drainer.stop()
+
+    assert client.max_sending == 1
+    assert sorted(client.received) == sorted(f"acc-{i}" for i in range(20))
+    assert drainer.stats['sent'] == 20 and drainer.acked_since_compact == 0
+    outbox.close()
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DA OUTBOX")
+    print("=" * 80)
+
+    for test in (test_backend_offline_then_restart, test_rejected_entries_go_to_dead_letter,
+                 test_background_drainer, test_sync_drain_with_background_thread):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,67 @@
+"""
+Teste do intervalo adaptativo do carrossel (pacing.py).
+
+Verifica que o intervalo cai pela metade a cada sucesso, dobra a cada
+falha, fica entre MIN e MAX e vai direto ao MAX com a taxa de erro acima
+de error_threshold.
+
+    python test_pacing.py
+    (ou: python -m pytest test_pacing.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pacing import PacingController
+
+def warm_up(pacer, count):
+    """Sucessos com latência estável: intervalo vai ao piso"""
+    return [pacer.record(True, 1.0) for _ in range(count)]
+
+def test_success_halves_down_to_min():
+    pacer = PacingController(min_delay=2, max_delay=60)
+    assert pacer.delay == 60  # começa no teto
+
+    assert warm_up(pacer, 6) == [30, 15, 7.5, 3.75, 2, 2]
+
+    # Sem piso: abaixo de 0.5s vai direto para 0
+    pacer = PacingController(min_delay=0, max_delay=1)
+    assert warm_up(pacer, 2) == [0.5, 0]
+
+def test_slow_success_keeps_delay():
+    pacer = PacingController(min_delay=0, max_delay=60)
+    warm_up(pacer, 2)
+    assert pacer.record(True, 5.0) == 15  # > 2x a média: não acelera
+    assert pacer.record(True, 1.0) == 7.5
+
+def test_failure_doubles_up_to_max():
+    pacer = PacingController(min_delay=0, max_delay=60, error_backoff=5, window=10)
+    warm_up(pacer, 9)
+    assert pacer.delay == 0
+
+    # Primeira falha: mínimo error_backoff; depois dobra até o teto
+    delays = [pacer.record(False, 1.0) for _ in range(5)]
+    assert delays == [5, 10, 20, 40, 60]
+    assert pacer.error_rate() == 0.5
+    assert pacer.stats()['errors'] == 5 and pacer.stats()['accounts'] == 14
+
+def test_high_error_rate_jumps_to_max():
+    pacer = PacingController(min_delay=0, max_delay=60, error_backoff=5, window=4, error_threshold=0.5)
+    warm_up(pacer, 8)
+
+    # 1/4 e 2/4 de erro: backoff normal; 3/4: direto ao teto
+    assert pacer.record(False, 1.0) == 5
+    assert pacer.record(False, 1.0) == 10
+    assert pacer.record(False, 1.0) == 60
+    assert pacer.error_rate() == 0.75
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO PACING")
+    print("=" * 80)
+
+    for test in (test_success_halves_down_to_min, test_slow_success_keeps_delay, test_failure_doubles_up_to_max,
+                 test_high_error_rate_jumps_to_max):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,152 @@
+"""
+Teste do roster em cache (roster.py) contra um backend HTTP local.
+
+Verifica a busca condicional (If-None-Match -> 304), o diff incremental
+(adicionadas/removidas/alteradas), o roster anterior mantido com o backend
+fora do ar e a aplicação do diff no AccountScheduler.
+
+    python test_roster.py
+    (ou: python -m pytest test_roster.py)
+"""
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend_client import BackendClient
+from async_backend_client import AsyncBackendClient
+from roster import RosterCache, diff_roster
+from scheduler import AccountScheduler
+
+def make_account(index: int, password: str = 'secret'):
+    return {'id': f"acc-{index}", 'login': str(7200000 + index), 'password': password, 'server': 'GMI3-Real'}
+
+class RosterBackend(BaseHTTPRequestHandler):
+    """Imita GET /api/mt5/accounts/all com ETag"""
+
+    protocol_version = 'HTTP/1.1'
+    accounts = []
+    statuses = []  # status de cada GET
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        body = json.dumps(cls.accounts).encode('utf-8')
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+        if self.headers.get('If-None-Match') == etag:
+            cls.statuses.append(304)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        cls.statuses.append(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_backend(accounts):
+    handler = type('Handler', (RosterBackend,), {'accounts': accounts, 'statuses': []})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler
+
+def test_conditional_fetch_and_diff():
+    server, handler = start_backend([make_account(i) for i in range(3)])
+    client = BackendClient(f"http://127.0.0.1:{server.server_port}")
+    roster = RosterCache(client)
+    try:
+        first = roster.refresh()
+        unchanged = roster.refresh()
+
+        # Conta 0 removida, conta 1 com senha nova, conta 3 adicionada
+        handler.accounts = [make_account(1, 'new-secret'), make_account(2), make_account(3)]
+        changed = roster.refresh()
+    finally:
+        client.close()
+        server.shutdown()
+
+    assert [a['id'] for a in first.added] == ['acc-0', 'acc-1', 'acc-2']
+    assert unchanged.not_modified and not unchanged
+    assert handler.statuses == [200, 304, 200]
+
+    assert [a['id'] for a in changed.added] == ['acc-3']
+    assert changed.removed == ['acc-0']
+    assert [a['id'] for a in changed.changed] == ['acc-1']
+    assert [a['id'] for a in roster.list()] == ['acc-1', 'acc-2', 'acc-3']
+    assert roster.stats == {'fetches': 3, 'not_modified': 1, 'full': 2, 'errors': 0}
+
+def test_backend_offline_keeps_roster():
+    server, handler = start_backend([make_account(i) for i in range(2)])
+    client = BackendClient(f"http://127.0.0.1:{server.server_port}", timeout=1)
+    roster = RosterCache(client)
+    try:
+        roster.refresh()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Conexão keep-alive ainda aberta: aponta para uma porta sem backend
+    client.base_url = 'http://127.0.0.1:9'
+    diff = roster.refresh()
+    client.close()
+
+    assert diff.error and not diff
+    assert [a['id'] for a in roster.list()] == ['acc-0', 'acc-1']
+
+def test_async_refresh():
+    server, handler = start_backend([make_account(i) for i in range(2)])
+    client = AsyncBackendClient(f"http://127.0.0.1:{server.server_port}")
+    roster = RosterCache(client)
+
+    async def scenario():
+        try:
+            return await roster.refresh_async(), await roster.refresh_async()
+        finally:
+            await client.close()
+
+    first, unchanged = asyncio.run(scenario())
+    server.shutdown()
+
+    # Mesmo ETag/304 do cliente síncrono, sem bloquear o event loop
+    assert [a['id'] for a in first.added] == ['acc-0', 'acc-1']
+    assert unchanged.not_modified and handler.statuses == [200, 304]
+
+def test_scheduler_applies_only_the_diff():
+    scheduler = AccountScheduler()
+    roster, diff = diff_roster({}, [make_account(i) for i in range(3)])
+    scheduler.apply_diff(diff.added, diff.removed, diff.changed, now=0)
+    assert sorted(a['id'] for a in scheduler.pop_due(0)) == ['acc-0', 'acc-1', 'acc-2']
+
+    # Contas já agendadas mantêm o próximo horário; só a nova entra vencida
+    for account_id in ('acc-0', 'acc-1', 'acc-2'):
+        scheduler.reschedule({'account_id': account_id, 'status': 'CONNECTED', 'data': {'open_trades': 1}}, now=0)
+
+    roster, diff = diff_roster(roster, [make_account(1, 'new-secret'), make_account(2), make_account(3)])
+    scheduler.apply_diff(diff.added, diff.removed, diff.changed, now=10)
+
+    assert [a['id'] for a in scheduler.pop_due(10)] == ['acc-3']
+    assert sorted(scheduler.entries) == ['acc-1', 'acc-2', 'acc-3']
+    assert scheduler.entries['acc-1']['account']['password'] == 'new-secret'
+    assert scheduler.entries['acc-1']['due'] == scheduler.active_interval
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO ROSTER EM CACHE")
+    print("=" * 80)
+
+    for test in (test_conditional_fetch_and_diff, test_backend_offline_keeps_roster, test_async_refresh,
+                 test_scheduler_applies_only_the_diff):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,82 @@
+"""
+Teste do scheduler_tick do collector_pool quando o ciclo falha.
+
+As contas vencidas saem do heap em pop_due; se o collector_cycle levantar
+exceção (ex: "database is locked" no writer, worker morto), elas precisam
+voltar para a fila em retry_base em vez de sumirem até o restart.
+
+    python test_scheduler_tick.py
+    (ou: python -m pytest test_scheduler_tick.py)
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+
+# Configura o ambiente ANTES de importar o collector
+os.environ['MT5_FAKE'] = '1'
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+os.chdir(tempfile.gettempdir())  # collector.log fora do repositório
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import collector_pool
+from circuit_breaker import LoginCircuitBreaker
+from scheduler import AccountScheduler
+
+def make_scheduler(count: int):
+    scheduler = AccountScheduler(retry_base=60)
+    scheduler.apply_diff([{'id': f"acc-{i}"} for i in range(count)], [], [], now=0.0)
+    return scheduler
+
+def run_tick(scheduler, cycle):
+    original = collector_pool.collector_cycle
+    collector_pool.collector_cycle = cycle
+    try:
+        return collector_pool.scheduler_tick(None, None, scheduler, LoginCircuitBreaker())
+    finally:
+        collector_pool.collector_cycle = original
+
+def test_failed_cycle_requeues_accounts():
+    scheduler = make_scheduler(3)
+
+    def locked(pool, writer, accounts, breaker, ledger):
+        raise sqlite3.OperationalError('database is locked')
+
+    try:
+        run_tick(scheduler, locked)
+        assert False, 'esperado OperationalError'
+    except sqlite3.OperationalError:
+        pass
+
+    # Todas voltaram para o heap, em retry_base
+    due = scheduler.next_due()
+    assert due is not None and due > collector_pool.time.time() + 50
+    assert sorted(a['id'] for a in scheduler.pop_due(due)) == ['acc-0', 'acc-1', 'acc-2']
+
+def test_accounts_without_result_are_requeued():
+    scheduler = make_scheduler(3)
+
+    def partial(pool, writer, accounts, breaker, ledger):
+        return [{'account_id': 'acc-0', 'status': 'CONNECTED', 'data': {'open_trades': 1}}]
+
+    assert run_tick(scheduler, partial) == 1
+
+    # acc-0 pelo resultado (active_interval); as outras em retry_base
+    dues = {account_id: entry['due'] for account_id, entry in scheduler.entries.items()}
+    assert dues['acc-0'] < dues['acc-1'] == dues['acc-2']
+    assert len(scheduler.pop_due(1e12)) == 3
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO SCHEDULER TICK")
+    print("=" * 80)
+
+    for test in (test_failed_cycle_requeues_accounts, test_accounts_without_result_are_requeued):
+        test()
+        print(f"✅ {test.__name__}")
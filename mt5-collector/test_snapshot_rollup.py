@@ -0,0 +1,177 @@
+"""
+Teste do rollup de AccountSnapshot (barras 1m/1h/1d + retenção).
+
+Agrega o histórico em várias execuções incrementais (com snapshots novos
+chegando entre elas) e compara as barras com a agregação feita de uma vez.
+
+    python test_snapshot_rollup.py
+    (ou: python -m pytest test_snapshot_rollup.py)
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from snapshot_rollup import SnapshotRollup, aggregate, DAY_MS
+
+# Subconjunto do schema Prisma usado pelo rollup
+SCHEMA = """
+CREATE TABLE AccountSnapshot (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tradingAccountId TEXT NOT NULL,
+    capturedAt DATETIME NOT NULL,
+    balance TEXT NOT NULL,
+    equity TEXT NOT NULL
+);
+CREATE TABLE AccountSnapshotRollup (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tradingAccountId TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucketStart DATETIME NOT NULL,
+    balanceOpen TEXT NOT NULL,
+    balanceHigh TEXT NOT NULL,
+    balanceLow TEXT NOT NULL,
+    balanceClose TEXT NOT NULL,
+    equityOpen TEXT NOT NULL,
+    equityHigh TEXT NOT NULL,
+    equityLow TEXT NOT NULL,
+    equityClose TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    lastSnapshotId INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX AccountSnapshotRollup_key
+    ON AccountSnapshotRollup (tradingAccountId, resolution, bucketStart);
+"""
+
+START = datetime(2025, 11, 1, 22, 0, tzinfo=timezone.utc)
+
+def make_snapshots(count, offset=0):
+    """Snapshots a cada 20s de 2 contas; metade com capturedAt ISO (collector Python)"""
+    rows = []
+    for i in range(offset, offset + count):
+        captured = START + timedelta(seconds=20 * (i // 2))
+        account = f'acc-{i % 2}'
+        balance = f'{1000 + (i * 37) % 101 - 50:.2f}'
+        equity = f'{1000 + (i * 53) % 89 - 44:.2f}'
+        if i % 4 < 2:
+            captured_at = int(captured.timestamp() * 1000)  # Prisma (ms)
+        else:
+            captured_at = captured.isoformat()              # collector (ISO)
+        rows.append((account, captured_at, balance, equity))
+    return rows
+
+def open_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def insert(conn, rows):
+    conn.executemany(
+        "INSERT INTO AccountSnapshot (tradingAccountId, capturedAt, balance, equity) VALUES (?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+
+def read_bars(conn):
+    return {
+        (row[0], row[1], row[2]): row[3:]
+        for row in conn.execute("""
+            SELECT tradingAccountId, resolution, bucketStart,
+                   balanceOpen, balanceHigh, balanceLow, balanceClose,
+                   equityOpen, equityHigh, equityLow, equityClose, samples
+            FROM AccountSnapshotRollup
+        """)
+    }
+
+def test_incremental_matches_full_aggregation():
+    snapshots = make_snapshots(1200)  # ~3h20, atravessa a virada do dia
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = open_db(os.path.join(tmp, 'dev.db'))
+        rollup = SnapshotRollup(os.path.join(tmp, 'dev.db'), raw_retention_days=0, batch_size=97)
+        now_ms = int((START + timedelta(days=1)).timestamp() * 1000)
+
+        # Snapshots chegando entre execuções (cortes no meio de buckets)
+        for chunk in range(0, len(snapshots), 250):
+            insert(conn, snapshots[chunk:chunk + 250])
+            rollup.run(now_ms=now_ms)
+        stats = rollup.run(now_ms=now_ms)
+        assert stats['raw_rows'] == 0  # nada novo: não reagrega
+
+        raw = conn.execute(
+            "SELECT id, tradingAccountId, capturedAt, balance, equity FROM AccountSnapshot ORDER BY id"
+        ).fetchall()
+        expected = {
+            key: (*bar['balance'], *bar['equity'], bar['samples'])
+            for key, bar in aggregate(raw).items()
+        }
+        got = read_bars(conn)
+        rollup.close()
+        conn.close()
+
+    assert got == expected
+    assert sum(1 for key in got if key[1] == '1d') == 4  # 2 contas x 2 dias
+    assert sum(v[-1] for k, v in got.items() if k[1] == '1h') == len(snapshots)
+
+def test_retention_keeps_unrolled_and_recent():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = open_db(os.path.join(tmp, 'dev.db'))
+        insert(conn, make_snapshots(600))
+
+        now_ms = int((START + timedelta(days=10)).timestamp() * 1000)
+        rollup = SnapshotRollup(
+            os.path.join(tmp, 'dev.db'), raw_retention_days=7,
+            rollup_retention_days={'1m': 9, '1h': 30, '1d': 0}, batch_size=100
+        )
+        rollup.run(now_ms=now_ms)
+
+        # Snapshots recentes (não agregados até a próxima execução) ficam
+        recent = int((START + timedelta(days=9)).timestamp() * 1000)
+        insert(conn, [('acc-0', recent, '1.00', '1.00')])
+
+        stats = rollup.run(now_ms=now_ms)
+        raw_left = conn.execute("SELECT COUNT(*) FROM AccountSnapshot").fetchone()[0]
+        bars = read_bars(conn)
+        rollup.close()
+        conn.close()
+
+    assert raw_left == 1
+    assert stats['deleted']['raw'] == 0  # já apagados na primeira execução
+    # 1m: antigas apagadas, só a barra do snapshot recente
+    assert [key for key in bars if key[1] == '1m'] == [('acc-0', '1m', recent - recent % 60000)]
+    assert sum(v[-1] for k, v in bars.items() if k[1] == '1d') == 601
+    assert all(key[2] >= now_ms - 30 * DAY_MS for key in bars if key[1] == '1h')
+
+def test_retention_by_captured_at_not_id():
+    """Backfill/replay da outbox: id novo com capturedAt antigo não apaga os recentes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = open_db(os.path.join(tmp, 'dev.db'))
+        now = START + timedelta(days=10)
+        recent = [('acc-0', int((now - timedelta(days=1, minutes=i)).timestamp() * 1000), '1.00', '1.00')
+                  for i in range(3)]
+        insert(conn, recent)
+        # Dia antigo chegando depois (ids maiores que os recentes)
+        insert(conn, [('acc-0', START.isoformat(), '2.00', '2.00'),
+                      ('acc-1', int(START.timestamp() * 1000), '3.00', '3.00')])
+
+        rollup = SnapshotRollup(os.path.join(tmp, 'dev.db'), raw_retention_days=7, batch_size=2)
+        stats = rollup.run(now_ms=int(now.timestamp() * 1000))
+        raw_left = conn.execute("SELECT id, capturedAt FROM AccountSnapshot ORDER BY id").fetchall()
+        rollup.close()
+        conn.close()
+
+    assert stats['raw_rows'] == 5 and stats['deleted']['raw'] == 2
+    assert raw_left == [(i + 1, row[1]) for i, row in enumerate(recent)]
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO ROLLUP DE SNAPSHOTS")
+    print("=" * 80)
+
+    for test in (test_incremental_matches_full_aggregation, test_retention_keeps_unrolled_and_recent,
+                 test_retention_by_captured_at_not_id):
+        test()
+        print(f"✅ {test.__name__}")
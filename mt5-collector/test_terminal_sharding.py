@@ -0,0 +1,96 @@
+"""
+Teste do pool de terminais (sharding) com o MetaTrader5 simulado.
+
+Roda em Linux sem MT5 instalado:
+    python test_terminal_sharding.py
+    (ou: python -m pytest test_terminal_sharding.py)
+"""
+import os
+import sys
+import time
+import tempfile
+
+# Configura o ambiente ANTES de importar o collector
+os.environ['MT5_FAKE'] = '1'
+TMP_DIR = tempfile.mkdtemp()
+os.environ['OUTBOX_PATH'] = os.path.join(TMP_DIR, 'outbox.db')
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+os.environ.setdefault('FAKE_MT5_INIT_LATENCY', '0.05')
+os.environ.setdefault('FAKE_MT5_LOGIN_LATENCY', '0.2')
+os.environ.setdefault('FAKE_MT5_DEALS_PER_DAY', '2')
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+os.chdir(tempfile.gettempdir())  # collector.log fora do repositório
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import collector_pool
+
+NUM_ACCOUNTS = 16
+
+def make_accounts(count: int):
+    cipher = Fernet(os.environ['ENCRYPTION_KEY'].encode())
+    return [
+        {
+            'id': f"acc-{i}",
+            'login': str(5000000 + i),
+            'server': 'GMI3-Real' if i % 2 else 'DooTechnology-Live',
+            'encrypted_password': cipher.encrypt(b'secret').decode(),
+        }
+        for i in range(count)
+    ]
+
+def terminals(count: int):
+    return [rf"C:\mt5_terminal{i}\terminal64.exe" for i in range(1, count + 1)]
+
+def run_pool(num_terminals: int, accounts):
+    pool = collector_pool.TerminalPool(terminals(num_terminals))
+    try:
+        pool.map(accounts[:num_terminals])  # aquece as sessões dos workers
+        start = time.time()
+        results = pool.map(accounts)
+        return results, time.time() - start
+    finally:
+        pool.close()
+
+def test_shard_is_stable_and_complete():
+    accounts = make_accounts(NUM_ACCOUNTS)
+    pool_terminals = terminals(4)
+
+    first = [collector_pool.terminal_for_account(a, len(pool_terminals)) for a in accounts]
+    second = [collector_pool.terminal_for_account(a, len(pool_terminals)) for a in accounts]
+    assert first == second
+    assert all(0 <= index < len(pool_terminals) for index in first)
+
+def test_accounts_run_on_their_terminal():
+    accounts = make_accounts(NUM_ACCOUNTS)
+    results, _ = run_pool(4, accounts)
+
+    assert len(results) == NUM_ACCOUNTS
+    assert all(r['status'] == 'CONNECTED' for r in results)
+
+    by_id = {a['id']: a for a in accounts}
+    for result in results:
+        expected = terminals(4)[collector_pool.terminal_for_account(by_id[result['account_id']], 4)]
+        assert result['terminal'] == expected
+
+def test_throughput_scales_with_terminals():
+    accounts = make_accounts(NUM_ACCOUNTS)
+
+    _, single = run_pool(1, accounts)
+    _, sharded = run_pool(4, accounts)
+
+    print(f"   1 terminal: {single:.2f}s | 4 terminais: {sharded:.2f}s | speedup {single / sharded:.1f}x")
+    assert single / sharded > 2
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO POOL DE TERMINAIS (FAKE MT5)")
+    print("=" * 80)
+
+    for test in (test_shard_is_stable_and_complete,
+                 test_accounts_run_on_their_terminal,
+                 test_throughput_scales_with_terminals):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,126 @@
+"""
+Teste do timing ledger (timing_ledger.py).
+
+Verifica que cada conta vira uma linha JSONL com as fases (com rotação
+por tamanho), que o fim do ciclo calcula p50/p95/p99 por fase e por
+servidor da corretora (e zera as amostras do ciclo) e que GET /metrics
+devolve os percentis, os acumulados e os gauges do collector.
+
+    python test_timing_ledger.py
+    (ou: python -m pytest test_timing_ledger.py)
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import urllib.error
+import urllib.request
+
+# Ledger padrão fora do repositório (o pytest importa timing_ledger uma vez só)
+TMP_DIR = tempfile.mkdtemp()
+os.environ['TIMING_LEDGER_PATH'] = os.path.join(TMP_DIR, 'timing_ledger.jsonl')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from timing_ledger import MetricsServer, PhaseTimer, TimingLedger
+
+def record_cycle(ledger):
+    """100 contas em dois servidores: login 10..990ms no GMI, 5ms no Doo"""
+    for i in range(100):
+        server = 'GMI3-Real' if i % 2 == 0 else 'DooTechnology-Live'
+        login = (i + 1) / 100 if server == 'GMI3-Real' else 0.005
+        ledger.record(f"acc-{i}", server, {'login': login, 'deals': 0.02}, ok=i != 7)
+
+def test_jsonl_and_cycle_percentiles():
+    path = os.path.join(tempfile.mkdtemp(), 'timing_ledger.jsonl')
+    ledger = TimingLedger('pool', path=path)
+
+    timer = PhaseTimer()
+    with timer.phase('login'):
+        time.sleep(0.01)
+    timer.add('login', 0.5)
+    assert 0.51 <= timer.phases['login'] < 0.6
+
+    record_cycle(ledger)
+    ledger.record(None, None, {'http_send': 0.2}, items=100)
+    ledger.record('acc-x', 'GMI3-Real', {})  # sem fases: ignorado
+    summary = ledger.end_cycle()
+    ledger.close()
+
+    with open(path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 101
+    assert lines[0]['collector'] == 'pool' and lines[0]['cycle'] == 1 and lines[0]['account_id'] == 'acc-0'
+    assert lines[0]['phases'] == {'login': 0.01, 'deals': 0.02} and lines[0]['total'] == 0.03
+    assert lines[7]['ok'] is False and lines[-1]['items'] == 100 and lines[-1]['server'] is None
+
+    # Por fase: as 100 contas juntas; por servidor: cada corretora separada
+    login = summary['phases']['login']
+    assert login['count'] == 100 and login['p50'] == 0.01 and login['p99'] == 0.97
+    assert summary['phases']['http_send']['count'] == 1
+    assert summary['servers']['GMI3-Real']['login']['p50'] == 0.49
+    assert summary['servers']['GMI3-Real']['login']['p95'] == 0.95
+    assert summary['servers']['DooTechnology-Live']['login']['p99'] == 0.005
+    assert 'http_send' not in summary['servers']['GMI3-Real']
+
+    # Próximo ciclo começa vazio; acumulados continuam
+    assert ledger.end_cycle() == {'cycle': 2, 'phases': {}, 'servers': {}}
+    assert ledger.totals['login']['count'] == 100
+
+def test_jsonl_rotates_by_size():
+    path = os.path.join(tempfile.mkdtemp(), 'timing_ledger.jsonl')
+    ledger = TimingLedger('pool', path=path, max_bytes=4096, backups=2)
+    for _ in range(5):
+        record_cycle(ledger)  # ~150 bytes por linha: bem mais que 3 x 4 KB
+    ledger.close()
+
+    # Arquivo atual + 2 rotacionados, nenhum acima do limite; o mais antigo foi descartado
+    files = sorted(os.listdir(os.path.dirname(path)))
+    assert files == ['timing_ledger.jsonl', 'timing_ledger.jsonl.1', 'timing_ledger.jsonl.2']
+    for name in files:
+        full = os.path.join(os.path.dirname(path), name)
+        assert os.path.getsize(full) <= 4096
+        with open(full, encoding='utf-8') as f:
+            assert all(json.loads(line)['collector'] == 'pool' for line in f)
+
+def test_metrics_endpoint():
+    ledger = TimingLedger('metaapi', path=None)
+    record_cycle(ledger)
+    ledger.end_cycle()
+
+    metrics = MetricsServer(ledger, port=0, gauges=lambda: {
+        'outbox_pending': 3, 'scheduler_lag_seconds': {'acc-1': 0.5, 'acc-0': 12.25},
+    })
+    assert metrics.start()
+    try:
+        url = f"http://127.0.0.1:{metrics.port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            body = response.read().decode('utf-8')
+
+        try:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+            assert False, 'esperado 404'
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        metrics.stop()
+
+    assert 'collector_phase_seconds{collector="metaapi",phase="login",quantile="0.5"} 0.010000' in body
+    assert 'collector_phase_seconds_count{collector="metaapi",phase="login"} 100' in body
+    assert ('collector_server_phase_seconds{collector="metaapi",server="GMI3-Real",phase="login",'
+            'quantile="0.95"} 0.950000') in body
+    assert 'collector_cycles_total{collector="metaapi"} 1' in body
+    assert 'collector_timing_records_total{collector="metaapi"} 100' in body
+    assert 'collector_outbox_pending{collector="metaapi"} 3' in body
+    assert ('collector_scheduler_lag_seconds{collector="metaapi",account_id="acc-0"} 12.25\n'
+            'collector_scheduler_lag_seconds{collector="metaapi",account_id="acc-1"} 0.5\n') in body
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🧪 TESTE DO TIMING LEDGER")
+    print("=" * 80)
+
+    for test in (test_jsonl_and_cycle_percentiles, test_jsonl_rotates_by_size, test_metrics_endpoint):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+TIMING LEDGER - TEMPO POR CONTA E POR FASE DA COLETA + /metrics
+============================================================================
+Nenhum collector registrava quanto tempo cada fase leva (init do MT5,
+login, account_info, histórico de deals, gravação no banco, envio HTTP,
+deploy/sync do MetaAPI): NUM_WORKERS e intervalos eram ajustados no escuro.
+
+- PhaseTimer: cronômetro por conta (with timer.phase('login'): ...);
+  o dict timer.phases é picklable e volta junto com o resultado do worker
+- TimingLedger: uma linha JSONL por conta coletada (TIMING_LEDGER_PATH,
+  com rotação por tamanho: TIMING_LEDGER_MAX_BYTES x TIMING_LEDGER_BACKUPS)
+  e, no fim de cada ciclo, p50/p95/p99 por fase e por servidor da corretora
+- MetricsServer: GET /metrics (formato texto do Prometheus) servido por
+  uma thread do próprio processo collector, só se METRICS_PORT for definido
+
+Autor: iDeepX Team
+============================================================================
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Union
+
+from scheduler import percentile
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+# Arquivo JSONL do ledger (vazio = só agregados em memória)
+TIMING_LEDGER_PATH = os.getenv(
+    'TIMING_LEDGER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timing_ledger.jsonl')
+)
+
+# Rotação do JSONL: tamanho máximo (bytes) e arquivos antigos mantidos (.1, .2, ...)
+TIMING_LEDGER_MAX_BYTES = int(os.getenv('TIMING_LEDGER_MAX_BYTES', str(50 * 2**20)))
+TIMING_LEDGER_BACKUPS = int(os.getenv('TIMING_LEDGER_BACKUPS', '3'))
+
+# Porta do endpoint /metrics (0/vazio = desligado, ex: 9108)
+METRICS_PORT = int(os.getenv('METRICS_PORT') or '0')
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# Percentis calculados por ciclo
+PERCENTILES = (50, 95, 99)
+
+class PhaseTimer:
+    """Tempo (s) de cada fase da coleta de uma conta"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        """Soma à fase (fases repetidas, ex: login após reset de IPC)"""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+def phase_summary(samples: List[float]) -> Dict[str, float]:
+    """count + p50/p95/p99 de uma lista de durações"""
+    summary = {'count': len(samples)}
+    for pct in PERCENTILES:
+        summary[f'p{pct}'] = percentile(samples, pct)
+    return summary
+
+class TimingLedger:
+    """Ledger de tempos por conta/fase com agregação por ciclo"""
+
+    def __init__(self, collector: str, path: Optional[str] = TIMING_LEDGER_PATH,
+                 max_bytes: int = TIMING_LEDGER_MAX_BYTES, backups: int = TIMING_LEDGER_BACKUPS):
+        """
+        Args:
+            collector: nome do collector gravado em cada linha (ex: 'pool', 'metaapi')
+            path: arquivo JSONL (None/vazio = não grava em disco)
+            max_bytes: tamanho que dispara a rotação (0 = sem limite)
+            backups: arquivos rotacionados mantidos (path.1 ... path.N)
+        """
+        self.collector = collector
+        self.path = path or None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.cycle = 1
+
+        # Amostras do ciclo atual: fase -> [s] e servidor -> fase -> [s]
+        self.samples: Dict[str, List[float]] = {}
+        self.server_samples: Dict[str, Dict[str, List[float]]] = {}
+
+        # Acumulados desde o início do processo (_count/_sum do /metrics)
+        self.totals: Dict[str, Dict[str, float]] = {}
+        self.records = 0
+        self.last_summary: Dict = {'cycle': 0, 'phases': {}, 'servers': {}}
+
+        # Arquivo aberto no primeiro registro (RotatingFileHandler com delay)
+        self.handler: Optional[RotatingFileHandler] = None
+
+    def close(self):
+        """Fecha o JSONL (registros seguintes ficam só em memória)"""
+        with self.lock:
+            if self.handler is not None:
+                self.handler.close()
+                self.handler = None
+            self.path = None
+
+    def _write(self, line: Dict):
+        """Grava uma linha no JSONL (o handler rotaciona ao passar de max_bytes)"""
+        if self.handler is None:
+            self.handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                               encoding='utf-8', delay=True)
+            self.handler.setFormatter(logging.Formatter('%(message)s'))
+        self.handler.emit(logging.LogRecord('timing_ledger', logging.INFO, __file__, 0,
+                                            json.dumps(line, default=str), None, None))
+
+    def record(self, account_id: Optional[str], server: Optional[str], phases: Dict[str, float],
+               ok: bool = True, **extra):
+        """
+        Registra os tempos de uma conta (uma linha JSONL).
+
+        Args:
+            account_id: conta (None para tempos de lote, ex: envio HTTP)
+            server: servidor da corretora (None = fora do agregado por servidor)
+            phases: fase -> segundos (PhaseTimer.phases)
+            ok: coleta da conta terminou com sucesso
+        """
+        if not phases:
+            return
+
+        line = {
+            'ts': round(time.time(), 3),
+            'collector': self.collector,
+            'cycle': self.cycle,
+            'account_id': account_id,
+            'server': server,
+            'ok': ok,
+            'phases': {name: round(seconds, 6) for name, seconds in phases.items()},
+            'total': round(sum(phases.values()), 6),
+            **extra,
+        }
+
+        with self.lock:
+            self.records += 1
+            for name, seconds in phases.items():
+                self.samples.setdefault(name, []).append(seconds)
+                if server:
+                    self.server_samples.setdefault(server, {}).setdefault(name, []).append(seconds)
+                total = self.totals.setdefault(name, {'count': 0, 'sum': 0.0})
+                total['count'] += 1
+                total['sum'] += seconds
+
+            if self.path:
+                self._write(line)
+
+    def end_cycle(self) -> Dict:
+        """
+        Fecha o ciclo: p50/p95/p99 por fase e por servidor das amostras do ciclo.
+
+        Returns:
+            Dict com cycle, phases {fase: resumo} e servers {servidor: {fase: resumo}}
+        """
+        with self.lock:
+            summary = {
+                'cycle': self.cycle,
+                'phases': {name: phase_summary(values) for name, values in self.samples.items()},
+                'servers': {
+                    server: {name: phase_summary(values) for name, values in phases.items()}
+                    for server, phases in self.server_samples.items()
+                },
+            }
+            self.samples = {}
+            self.server_samples = {}
+            self.cycle += 1
+            self.last_summary = summary
+        return summary
+
+    def log_summary(self, summary: Dict, log: Callable[[str], None] = logger.info):
+        """Uma linha por fase (e por servidor) com os percentis do ciclo"""
+        for name, stats in sorted(summary['phases'].items()):
+            log(f"   ⏱️ {name}: p50={stats['p50'] * 1000:.0f}ms p95={stats['p95'] * 1000:.0f}ms "
+                f"p99={stats['p99'] * 1000:.0f}ms ({stats['count']})")
+        for server, phases in sorted(summary['servers'].items()):
+            log(f"   🏦 {server}: " + ", ".join(
+                f"{name} p95={stats['p95'] * 1000:.0f}ms" for name, stats in sorted(phases.items())
+            ))
+
+    def render_metrics(self, gauges: Optional[Dict[str, Union[float, Dict[str, float]]]] = None) -> str:
+        """
+        Formato texto do Prometheus: percentis do último ciclo + acumulados.
+
+        Args:
+            gauges: nome -> valor; um dict vira um gauge por conta
+                (nome -> {account_id: valor}, label account_id)
+        """
+        with self.lock:
+            summary = self.last_summary
+            totals = {name: dict(total) for name, total in self.totals.items()}
+            records = self.records
+
+        labels = f'collector="{self.collector}"'
+        lines = [
+            '# HELP collector_phase_seconds Duração por fase da coleta (percentis do último ciclo)',
+            '# TYPE collector_phase_seconds summary',
+        ]
+        for name, stats in sorted(summary['phases'].items()):
+            for pct in PERCENTILES:
+                lines.append(f'collector_phase_seconds{{{labels},phase="{name}",quantile="{pct / 100}"}} '
+                             f'{stats[f"p{pct}"]:.6f}')
+        for name, total in sorted(totals.items()):
+            lines.append(f'collector_phase_seconds_count{{{labels},phase="{name}"}} {total["count"]}')
+            lines.append(f'collector_phase_seconds_sum{{{labels},phase="{name}"}} {total["sum"]:.6f}')
+
+        lines += [
+            '# HELP collector_server_phase_seconds Duração por fase e servidor da corretora (último ciclo)',
+            '# TYPE collector_server_phase_seconds gauge',
+        ]
+        for server, phases in sorted(summary['servers'].items()):
+            for name, stats in sorted(phases.items()):
+                for pct in PERCENTILES:
+                    lines.append(f'collector_server_phase_seconds{{{labels},server="{server}",phase="{name}",'
+                                 f'quantile="{pct / 100}"}} {stats[f"p{pct}"]:.6f}')
+
+        lines += [
+            '# TYPE collector_cycles_total counter',
+            f'collector_cycles_total{{{labels}}} {summary["cycle"]}',
+            '# TYPE collector_timing_records_total counter',
+            f'collector_timing_records_total{{{labels}}} {records}',
+        ]
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f'# TYPE collector_{name} gauge')
+            if isinstance(value, dict):
+                for account_id, account_value in sorted(value.items()):
+                    lines.append(f'collector_{name}{{{labels},account_id="{account_id}"}} {account_value}')
+            else:
+                lines.append(f'collector_{name}{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+# ============================================================================
+# ENDPOINT /metrics
+# ============================================================================
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    ledger: TimingLedger = None
+    gauges: Optional[Callable[[], Dict[str, float]]] = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        gauges = type(self).gauges
+        try:
+            values = gauges() if gauges else None
+        except Exception as e:
+            logger.warning(f"⚠️ /metrics: erro ao ler gauges: {e}")
+            values = None
+
+        body = type(self).ledger.render_metrics(values).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer:
+    """GET /metrics em uma thread do processo collector"""
+
+    def __init__(self, ledger: TimingLedger, port: int = METRICS_PORT, host: str = METRICS_HOST,
+                 gauges: Optional[Callable[[], Dict[str, float]]] = None):
+        """
+        Args:
+            port: porta (0 = porta livre qualquer; os collectors só sobem o
+                endpoint se METRICS_PORT != 0)
+            gauges: valores extras lidos a cada GET (ex: {'outbox_pending': 3};
+                dict = um gauge por conta, ver render_metrics)
+        """
+        self.ledger = ledger
+        self.port = port
+        self.host = host
+        self.gauges = gauges
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> bool:
+        """Sobe o endpoint (porta ocupada só gera aviso: a coleta continua)"""
+        if self.server is not None:
+            return True
+
+        gauges = staticmethod(self.gauges) if self.gauges else None
+        handler = type('Handler', (MetricsHandler,), {'ledger': self.ledger, 'gauges': gauges})
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            logger.warning(f"⚠️ /metrics indisponível em {self.host}:{self.port}: {e}")
+            return False
+
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"📈 Métricas em http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None